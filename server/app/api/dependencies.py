@@ -1,17 +1,14 @@
-from typing import Annotated
+from typing import Annotated, AsyncGenerator
 
 from fastapi import Depends, Header, HTTPException
-from repositories.followers import FollowerRepository
-from repositories.likes import LikeRepository
-from repositories.medias import MediaRepository
-from repositories.tweets import TweetRepository
-from repositories.users import UserRepository
 from services.followers import FollowerService
 from services.likes import LikeService
 from services.medias import MediaService
+from services.timelines import TimelineService
 from services.tweets import TweetService
 from services.users import UserService
 from utils.exceptions import ClientHTTPException
+from utils.unitofwork import UnitOfWork
 
 
 async def get_token_header(x_token: Annotated[str, Header()]) -> None:
@@ -24,24 +21,49 @@ async def get_query_token(token: str) -> None:
         raise HTTPException(status_code=400, detail="No **** token provided")
 
 
-def user_service() -> UserService:
-    return UserService(UserRepository)
+async def get_uow() -> AsyncGenerator[UnitOfWork, None]:
+    """
+    Зависимость создает единицу работы с БД на время запроса:
+    все сервисы запроса используют одну сессию БД, изменения
+    фиксируются одним коммитом после успешного выполнения эндпоинта
+    и откатываются при ошибке
+    :return:
+    """
+    async with UnitOfWork() as uow:
+        yield uow
+        await uow.commit()
 
 
-def tweet_service() -> TweetService:
-    return TweetService(TweetRepository)
+def user_service(uow: Annotated[UnitOfWork, Depends(get_uow)]) -> UserService:
+    return UserService(uow.users)
 
 
-def media_service() -> MediaService:
-    return MediaService(MediaRepository)
+def tweet_service(
+    uow: Annotated[UnitOfWork, Depends(get_uow)]
+) -> TweetService:
+    return TweetService(uow.tweets)
 
 
-def follower_service() -> FollowerService:
-    return FollowerService(FollowerRepository)
+def media_service(
+    uow: Annotated[UnitOfWork, Depends(get_uow)]
+) -> MediaService:
+    return MediaService(uow.medias)
 
 
-def like_service() -> LikeService:
-    return LikeService(LikeRepository)
+def follower_service(
+    uow: Annotated[UnitOfWork, Depends(get_uow)]
+) -> FollowerService:
+    return FollowerService(uow.followers)
+
+
+def like_service(uow: Annotated[UnitOfWork, Depends(get_uow)]) -> LikeService:
+    return LikeService(uow.likes)
+
+
+def timeline_service(
+    uow: Annotated[UnitOfWork, Depends(get_uow)]
+) -> TimelineService:
+    return TimelineService(uow.timelines)
 
 
 async def get_user(
@@ -50,9 +72,9 @@ async def get_user(
     ],
     user_service: Annotated[UserService, Depends(user_service)],
 ) -> int:
-    user = await user_service.get_user_by_api_key(api_key)
-    if not user:
+    user_id = await user_service.get_user_id_by_api_key(api_key)
+    if user_id is None:
         raise ClientHTTPException(
             status_code=401, detail="Не авторизированный пользователь."
         )
-    return user.id
+    return user_id
@@ -1,12 +1,32 @@
+import mimetypes
+from datetime import timezone
+from email.utils import format_datetime
 from typing import Annotated
 
 from api.dependencies import get_user, media_service
 from config import setting
-from fastapi import APIRouter, Depends, Path, Response, UploadFile
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    Path,
+    Query,
+    Response,
+    UploadFile,
+    status,
+)
 from schemas.errors import ErrorSchemaResponse
 from schemas.medias import MediaSchemaAddResponse
 from services.medias import MediaService
 from utils.exceptions import ClientHTTPException
+from utils.images import (
+    MEDIA_VARIANT_FORMAT,
+    MEDIA_VARIANT_MEDIA_TYPE,
+    MediaSize,
+)
+from utils.responses import bytes_response, etag_matches, file_response
+from utils.storage import get_variant_key
 
 router = APIRouter(
     prefix=f"{setting.BASE_URI}/medias",
@@ -14,22 +34,30 @@ router = APIRouter(
     tags=["medias"],
 )
 
+# тело медиафайла после загрузки не меняется,
+# поэтому кешировать его можно бессрочно
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 
 @router.post("")
 async def load_files_from_tweet(
     file: UploadFile,
     media_service: Annotated[MediaService, Depends(media_service)],
+    background_tasks: BackgroundTasks,
     user_id=Depends(get_user),
 ) -> MediaSchemaAddResponse:
     """
     Эндпоинт для добавления медиафайлов к твитту
     :param file: файл
     :param media_service: сервис работы с БД для медиа
+    :param background_tasks: фоновые задачи после ответа
     :param user_id: id текущего пользователя
     :return:
     """
     # делаем запрос к БД для добавления медиафайла
-    media_id = await media_service.add_media(file)
+    media_id, file_key = await media_service.add_media(file, user_id)
+    # миниатюры создаем в фоне уже после ответа
+    background_tasks.add_task(media_service.add_media_variants, file_key)
     return {"result": True, "media_id": media_id}
 
 
@@ -39,11 +67,23 @@ async def get_files_from_tweet_by_id(
     id: int = Path(
         ..., title="id медиафайла", description="id медиафайла", gt=0
     ),
+    size: MediaSize = Query(
+        MediaSize.original,
+        title="Размер медиафайла",
+        description="Размер медиафайла: исходный файл или уменьшенная копия",
+    ),
+    if_none_match: str | None = Header(None),
+    range_header: str | None = Header(None, alias="Range"),
+    if_range: str | None = Header(None),
 ) -> bytes:
     """
     Эндпоинт для получения медиафайла по id
     :param id: id медиафайла
     :param media_service: сервис работы с БД для медиа
+    :param size: размер медиафайла (исходный или уменьшенная копия)
+    :param if_none_match: ETag медиафайла в кеше клиента
+    :param range_header: запрашиваемый диапазон байт медиафайла
+    :param if_range: ETag медиафайла для которого запрошен диапазон
     :return:
     """
     # делаем запрос к БД для получения медиафайла
@@ -52,9 +92,76 @@ async def get_files_from_tweet_by_id(
         raise ClientHTTPException(
             status_code=404, detail=f"Медиафайл с id={id} не найден."
         )
-    return Response(
-        content=media.file_body,
-        headers={
-            "Content-Disposition": f"attachment; filename={media.file_name}"
-        },
+    headers = {
+        "Content-Disposition": f"attachment; filename={media.file_name}"
+    }
+    media_type = (
+        mimetypes.guess_type(media.file_name)[0] or "application/octet-stream"
+    )
+    # старый медиафайл, тело которого еще хранится в БД
+    if media.file_key is None:
+        return Response(
+            content=await media_service.get_media_body_by_id(id),
+            headers=headers,
+            media_type=media_type,
+        )
+
+    file_key = media.file_key
+    # отдаем уменьшенную копию если она уже создана,
+    # иначе (копия еще создается или файл не изображение) исходный файл
+    if size != MediaSize.original:
+        variant_key = get_variant_key(media.file_key, size.value)
+        if await media_service.storage.exists(variant_key):
+            file_key = variant_key
+            media_type = MEDIA_VARIANT_MEDIA_TYPE
+            file_name = media.file_name.rsplit(".", 1)[0]
+            headers["Content-Disposition"] = (
+                f"attachment; filename={file_name}.{MEDIA_VARIANT_FORMAT}"
+            )
+
+    # ключ файла - хеш содержимого, поэтому годится как строгий ETag
+    etag = f'"{file_key}"'
+    headers["ETag"] = etag
+    headers["Cache-Control"] = MEDIA_CACHE_CONTROL
+    if media.created_at is not None:
+        headers["Last-Modified"] = format_datetime(
+            media.created_at.astimezone(timezone.utc), usegmt=True
+        )
+    # медиафайл в кеше клиента не изменился
+    if etag_matches(if_none_match, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+
+    # если настроен nginx, то отдачу файла с диска
+    # (в т.ч. диапазонов байт) поручаем ему
+    internal_uri = media_service.storage.get_internal_uri(file_key)
+    if internal_uri is not None:
+        headers["X-Accel-Redirect"] = internal_uri
+        return Response(headers=headers, media_type=media_type)
+    # иначе отдаем файл (или запрошенный диапазон байт) сами;
+    # диапазон для другой версии файла (If-Range) игнорируем
+    # и отдаем файл целиком
+    if if_range is not None and if_range != etag:
+        range_header = None
+    try:
+        body = await media_service.get_media_file(file_key)
+    except FileNotFoundError:
+        raise ClientHTTPException(
+            status_code=404, detail=f"Медиафайл с id={id} не найден."
+        )
+    # небольшой файл отдаем из кэша в памяти
+    if body is not None:
+        return bytes_response(
+            body,
+            headers=headers,
+            media_type=media_type,
+            range_header=range_header,
+        )
+    # большой файл отдаем с диска по частям без чтения в память
+    return await file_response(
+        media_service.storage.get_path(file_key),
+        headers=headers,
+        media_type=media_type,
+        range_header=range_header,
     )
@@ -0,0 +1,20 @@
+from config import setting
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from utils.metrics import metrics
+
+router = APIRouter(
+    prefix=f"{setting.BASE_URI}/metrics",
+    redirect_slashes=False,
+    tags=["metrics"],
+)
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    """
+    Эндпоинт для получения метрик приложения
+    в текстовом формате Prometheus
+    :return:
+    """
+    return metrics.render()
@@ -1,11 +1,13 @@
 from api.default import router as default_router
 from api.medias import router as medias_router
+from api.metrics import router as metrics_router
 from api.tweets import router as tweets_router
 from api.users import router as users_router
 
 all_routers = [
     default_router,
     medias_router,
+    metrics_router,
     tweets_router,
     users_router,
 ]
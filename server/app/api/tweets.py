@@ -1,26 +1,43 @@
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
 from api.dependencies import (
     get_user,
     like_service,
-    media_service,
+    timeline_service,
     tweet_service,
 )
 from config import setting
-from fastapi import APIRouter, Depends, Path, status
+from fastapi import APIRouter, Depends, Path, Query, status
+from fastapi.responses import StreamingResponse
 from schemas.common import SuccessSchemaResponse
 from schemas.errors import ErrorSchemaResponse
-from schemas.likes import LikeSchemaAddModel
 from schemas.tweets import (
+    TweetFeedMode,
+    TweetLikesSchemaResponse,
     TweetSchemaAddModel,
     TweetSchemaAddRequest,
     TweetSchemaAddResponse,
     TweetSchemaResponse,
 )
 from services.likes import LikeService
-from services.medias import MediaService
+from services.timelines import TimelineService
 from services.tweets import TweetService
 from utils.exceptions import ClientHTTPException
+from utils.pagination import decode_cursor, encode_cursor
+from utils.responses import (
+    NDJSON_RESPONSES,
+    FastJSONResponse,
+    json_response,
+    ndjson_response,
+)
+from utils.unitofwork import UnitOfWork
+
+# ключи сортировки, которые кодируются в курсор для каждого режима ленты
+CURSOR_KEYS = {
+    TweetFeedMode.all: ("id",),
+    TweetFeedMode.popular: ("id", "rank"),
+    TweetFeedMode.timeline: ("id",),
+}
 
 router = APIRouter(
     prefix=f"{setting.BASE_URI}/tweets",
@@ -33,48 +50,132 @@ router = APIRouter(
 async def create_tweet(
     tweet: TweetSchemaAddRequest,
     tweet_service: Annotated[TweetService, Depends(tweet_service)],
-    media_service: Annotated[MediaService, Depends(media_service)],
+    timeline_service: Annotated[TimelineService, Depends(timeline_service)],
     user_id=Depends(get_user),
 ) -> TweetSchemaAddResponse:
     """
     Эндпоинт добавления нового твитта
     :param tweet: объект с данными нового твитта
     :param tweet_service: сервис работы с БД для твиттов
-    :param media_service: сервис работы с БД для медиафайлов твитта
+    :param timeline_service: сервис работы с БД для лент пользователей
     :param user_id: id текущего пользователя
     :return:
     """
     new_tweet_schema = TweetSchemaAddModel(
         user_id=user_id, content=tweet.tweet_data
     )
-    # добавляем в таблицу твиттов БД новый твитт
-    tweet_id = await tweet_service.add_tweet(new_tweet_schema)
-
-    # в записи таблицы медиафайлов БД для нового твитта добавляем id твитта
-    await media_service.add_tweet_id_for_medias(
-        tweet.tweet_media_ids, tweet_id
+    # одним запросом к БД добавляем новый твитт и прикрепляем к нему
+    # загруженные пользователем и еще не прикрепленные медиафайлы
+    tweet_id = await tweet_service.add_tweet(
+        new_tweet_schema, tweet.tweet_media_ids
     )
 
+    # добавляем новый твитт в ленты автора и его подписчиков
+    await timeline_service.push_tweet(tweet_id, user_id)
+
     return {"result": True, "tweet_id": tweet_id}
 
 
-@router.get("")
+async def stream_tweets(
+    mode: TweetFeedMode, after: dict[str, int], user_id: int, compact: bool
+) -> AsyncIterator[dict]:
+    """
+    Функция читает ленту твиттов для потокового ответа.
+    Тело потокового ответа отправляется после закрытия зависимостей
+    эндпоинта (и сессии БД запроса), поэтому лента читается
+    в своей единице работы с БД
+    :param mode: режим ленты
+    :param after: позиция твитта, после которого начинается чтение
+    :param user_id: id текущего пользователя
+    :param compact: флаг компактного режима
+    :return: асинхронный итератор объектов с данными твиттов
+    """
+    async with UnitOfWork() as uow:
+        async for tweet in TweetService(uow.tweets).stream_tweets_full_info(
+            after=after, mode=mode, user_id=user_id, compact=compact
+        ):
+            yield tweet
+
+
+@router.get(
+    "",
+    response_model=TweetSchemaResponse,
+    # поля компактного режима не выводятся в полном режиме
+    response_model_exclude_unset=True,
+    responses=NDJSON_RESPONSES,
+)
 async def get_tweets(
     tweet_service: Annotated[TweetService, Depends(tweet_service)],
+    mode: TweetFeedMode = Query(
+        TweetFeedMode.all,
+        title="Режим ленты",
+        description="Режим ленты: all - все твитты от новых к старым, "
+        "popular - твитты читаемых пользователей "
+        "по убыванию кол-ва лайков, timeline - свои твитты и твитты "
+        "читаемых пользователей от новых к старым",
+    ),
+    limit: int = Query(
+        setting.TWEETS_PAGE_LIMIT,
+        title="Кол-во твиттов на странице",
+        description="Кол-во твиттов на странице",
+        gt=0,
+        le=setting.TWEETS_PAGE_MAX_LIMIT,
+    ),
+    cursor: str | None = Query(
+        None,
+        title="Курсор страницы",
+        description="Курсор страницы из поля next_cursor "
+        "предыдущего ответа",
+    ),
+    stream: bool = Query(
+        False,
+        title="Потоковый ответ",
+        description="Отдать ленту целиком (начиная с позиции курсора) "
+        "потоком NDJSON - по твитту в строке, limit не учитывается",
+    ),
+    compact: bool = Query(
+        False,
+        title="Компактный режим",
+        description="Вместо полного списка лайкнувших пользователей "
+        "вывести кол-во лайков, признак лайка текущего пользователя "
+        "и первых лайкнувших пользователей",
+    ),
     user_id=Depends(get_user),
-) -> TweetSchemaResponse:
+) -> FastJSONResponse | StreamingResponse | dict:
     """
-    Эндпоинт получения списка твиттов
+    Эндпоинт получения страницы ленты твиттов
+    (или ленты целиком потоком NDJSON)
     :param tweet_service: сервис работы с БД для твиттов
+    :param mode: режим ленты
+    :param limit: кол-во твиттов на странице
+    :param cursor: курсор страницы
+    :param stream: флаг потокового ответа
+    :param compact: флаг компактного режима
     :param user_id: id текущего пользователя
     :return:
     """
-    # делаем запрос в БД для получения списка твиттов
-    tweets = await tweet_service.get_tweets_full_info()
-    return {
-        "result": True,
-        "tweets": tweets,
-    }
+    position = decode_cursor(cursor, keys=CURSOR_KEYS[mode])
+    if stream:
+        return ndjson_response(stream_tweets(mode, position, user_id, compact))
+    # делаем запрос в БД для получения страницы ленты твиттов
+    tweets, next_position = await tweet_service.get_tweets_full_info(
+        limit=limit,
+        after=position,
+        mode=mode,
+        user_id=user_id,
+        compact=compact,
+    )
+    # страница собрана в БД в структуре ответа,
+    # поэтому повторно ее не проверяем
+    return json_response(
+        {
+            "result": True,
+            "tweets": tweets,
+            "next_cursor": (
+                encode_cursor(next_position) if next_position else None
+            ),
+        }
+    )
 
 
 @router.delete("/{id}", responses={404: {"model": ErrorSchemaResponse}})
@@ -104,14 +205,67 @@ async def delete_tweet_by_id(
     if tweet.user_id != user_id:
         return {"result": True}
     # делаем запрос в БД для удаления твитта
-    result = await tweet_service.delete_tweet_by_id(id)
+    # (записи материализованных лент с этим твиттом
+    # удаляются каскадно по внешнему ключу)
+    result = await tweet_service.delete_tweet_by_id(id, user_id)
     return {"result": result}
 
 
+@router.get(
+    "/{id}/likes",
+    response_model=TweetLikesSchemaResponse,
+    responses={404: {"model": ErrorSchemaResponse}},
+)
+async def get_likes_by_tweet_id(
+    like_service: Annotated[LikeService, Depends(like_service)],
+    id: int = Path(..., title="id твитта", description="id твитта", gt=0),
+    limit: int = Query(
+        setting.LIKES_PAGE_LIMIT,
+        title="Кол-во пользователей на странице",
+        description="Кол-во пользователей на странице",
+        gt=0,
+        le=setting.LIKES_PAGE_MAX_LIMIT,
+    ),
+    cursor: str | None = Query(
+        None,
+        title="Курсор страницы",
+        description="Курсор страницы из поля next_cursor "
+        "предыдущего ответа",
+    ),
+    user_id=Depends(get_user),
+) -> FastJSONResponse | dict:
+    """
+    Эндпоинт получения страницы списка лайкнувших твитт пользователей
+    :param like_service: сервис работы с БД для лайков
+    :param id: id твитта
+    :param limit: кол-во пользователей на странице
+    :param cursor: курсор страницы
+    :param user_id: id текущего пользователя
+    :return:
+    """
+    position = decode_cursor(cursor)
+    # делаем запрос к БД для получения страницы списка
+    found, likes, next_position = await like_service.get_likes_page(
+        id, limit, after_user_id=position.get("id")
+    )
+    if not found:
+        raise ClientHTTPException(
+            status_code=404, detail=f"Твитта с id={id} не найден."
+        )
+    return json_response(
+        {
+            "result": True,
+            "likes": likes,
+            "next_cursor": (
+                encode_cursor(next_position) if next_position else None
+            ),
+        }
+    )
+
+
 @router.post("/{id}/likes", responses={404: {"model": ErrorSchemaResponse}})
 async def like_tweet_by_id(
     like_service: Annotated[LikeService, Depends(like_service)],
-    tweet_service: Annotated[TweetService, Depends(tweet_service)],
     id: int = Path(..., title="id твитта", description="id твитта", gt=0),
     user_id=Depends(get_user),
 ) -> SuccessSchemaResponse:
@@ -119,47 +273,24 @@ async def like_tweet_by_id(
     Эндпоинт для добавления пользователем лайка твитту
     :param id: id твитта
     :param like_service: сервис работы с БД для лайков
-    :param tweet_service: сервис работы с БД для твиттов
     :param user_id: id текущего пользователя
     :return:
     """
-    # делаем проверку на то что твитт с таким id существует в БД
-    # если проверка не пройдена, то ничего не меняем в БД
-    # выводим отрицательный результат на фронтенд
-    tweet = await tweet_service.get_tweet_by_id(id)
-    if tweet is None:
+    # одним запросом к БД проверяем что твитт существует и добавляем лайк,
+    # лайк на свой твитт и повторный лайк БД игнорирует,
+    # в этих случаях выводим положительный результат на фронтенд
+    found, _ = await like_service.like_tweet(tweet_id=id, user_id=user_id)
+    # если твитта нет выводим отрицательный результат на фронтенд
+    if not found:
         raise ClientHTTPException(
             status_code=404, detail=f"Твитта с id={id} не найден."
         )
-    # делаем проверку на то что пользователь еще не ставил лайк на этот твитт
-    # если проверка не пройдена, то ничего не меняем в БД
-    # выводим положительный результат на фронтенд
-    like = await like_service.get_like_by_tweet_id_with_user_id(
-        tweet_id=id, user_id=user_id
-    )
-    if like:
-        return {"result": True}
-
-    # делаем проверку на то что пользователь на свой твитт не ставил лайк
-    # если проверка не пройдена, то ничего не меняем в БД
-    # выводим положительный результат на фронтенд
-    tweet = await tweet_service.get_tweet_by_id_with_user_id(
-        id=id, user_id=user_id
-    )
-    if tweet:
-        return {"result": True}
-
-    # делаем запрос к БД для добавления лайка к твитту
-    # выводим положительный результат на фронтенд
-    new_like_schema = LikeSchemaAddModel(tweet_id=id, user_id=user_id)
-    await like_service.add_like(new_like_schema)
     return {"result": True}
 
 
 @router.delete("/{id}/likes", responses={404: {"model": ErrorSchemaResponse}})
 async def unlike_tweet_by_id(
     like_service: Annotated[LikeService, Depends(like_service)],
-    tweet_service: Annotated[TweetService, Depends(tweet_service)],
     id: int = Path(..., title="id твитта", description="id твитта", gt=0),
     user_id=Depends(get_user),
 ) -> SuccessSchemaResponse:
@@ -167,19 +298,14 @@ async def unlike_tweet_by_id(
     Эндпоинт для удаления пользователем лайка с твитта
     :param id: id твитта
     :param like_service: сервис работы с БД для лайков
-    :param tweet_service: сервис работы с БД для твиттов
     :param user_id: id текущего пользователя
     :return:
     """
-    # делаем проверку на то что твитт с таким id существует в БД
-    # если проверка не пройдена, то ничего не меняем в БД
-    # выводим отрицательный результат на фронтенд
-    tweet = await tweet_service.get_tweet_by_id(id)
-    if tweet is None:
+    # одним запросом к БД проверяем что твитт существует и удаляем лайк
+    found, _ = await like_service.unlike_tweet(tweet_id=id, user_id=user_id)
+    # если твитта нет выводим отрицательный результат на фронтенд
+    if not found:
         raise ClientHTTPException(
             status_code=404, detail=f"Твитта с id={id} не найден."
         )
-
-    # делаем запрос в БД для удаления лайка с твитта
-    await like_service.delete_like(id, user_id)
     return {"result": True}
@@ -1,15 +1,33 @@
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from api.dependencies import follower_service, get_user, user_service
+from api.dependencies import (
+    follower_service,
+    get_user,
+    timeline_service,
+    user_service,
+)
 from config import setting
-from fastapi import APIRouter, Depends, Path
+from fastapi import APIRouter, Depends, Path, Query
+from fastapi.responses import StreamingResponse
 from schemas.common import SuccessSchemaResponse
 from schemas.errors import ErrorSchemaResponse
-from schemas.followers import FollowerSchemaAddModel
-from schemas.users import UserSchemaResponse
+from schemas.users import (
+    UserFollowList,
+    UserSchemaListResponse,
+    UserSchemaResponse,
+)
 from services.followers import FollowerService
+from services.timelines import TimelineService
 from services.users import UserService
 from utils.exceptions import ClientHTTPException
+from utils.pagination import decode_cursor, encode_cursor
+from utils.responses import (
+    NDJSON_RESPONSES,
+    FastJSONResponse,
+    json_response,
+    ndjson_response,
+)
+from utils.unitofwork import UnitOfWork
 
 router = APIRouter(
     prefix=f"{setting.BASE_URI}/users", redirect_slashes=False, tags=["users"]
@@ -18,7 +36,7 @@ router = APIRouter(
 
 async def get_user_info(
     user_id: int, user_service: UserService
-) -> UserSchemaResponse:
+) -> FastJSONResponse | dict:
     """
     Функция для получения информации о пользователе по id
     :param user_id: id пользователя
@@ -34,17 +52,96 @@ async def get_user_info(
             status_code=404,
             detail=f"Пользователь с id={user_id} " f"не найден.",
         )
-    return {
-        "result": True,
-        "user": user,
-    }
+    # позиции следующих страниц списков подписок кодируем в курсоры
+    for follow_list in UserFollowList:
+        next_position = user.pop(f"{follow_list.value}_next_position")
+        user[f"{follow_list.value}_next_cursor"] = (
+            encode_cursor(next_position) if next_position else None
+        )
+    return json_response(
+        {
+            "result": True,
+            "user": user,
+        }
+    )
+
+
+async def stream_follow_list(
+    user_id: int, follow_list: UserFollowList, after_id: int | None
+) -> AsyncIterator[dict]:
+    """
+    Функция читает список подписок для потокового ответа.
+    Тело потокового ответа отправляется после закрытия зависимостей
+    эндпоинта (и сессии БД запроса), поэтому список читается
+    в своей единице работы с БД
+    :param user_id: id пользователя
+    :param follow_list: список подписчиков или читаемых пользователей
+    :param after_id: id пользователя, после которого начинается чтение
+    :return: асинхронный итератор объектов с данными пользователей
+    """
+    async with UnitOfWork() as uow:
+        async for user in FollowerService(uow.followers).stream_follow_list(
+            user_id, follow_list, after_id=after_id
+        ):
+            yield user
 
 
-@router.get("/me")
+async def get_follow_list(
+    user_id: int,
+    follow_list: UserFollowList,
+    limit: int,
+    cursor: str | None,
+    stream: bool,
+    follower_service: FollowerService,
+) -> FastJSONResponse | StreamingResponse | dict:
+    """
+    Функция для получения страницы списка подписчиков
+    или читаемых пользователей по id пользователя
+    (или списка целиком потоком NDJSON)
+    :param user_id: id пользователя
+    :param follow_list: список подписчиков или читаемых пользователей
+    :param limit: кол-во пользователей на странице
+    :param cursor: курсор страницы
+    :param stream: флаг потокового ответа
+    :param follower_service: сервис работы с БД для подписок
+    :return:
+    """
+    position = decode_cursor(cursor)
+    if stream:
+        # пользователя проверяем до начала потокового ответа
+        if not await follower_service.user_exists(user_id):
+            raise ClientHTTPException(
+                status_code=404,
+                detail=f"Пользователь с id={user_id} не найден.",
+            )
+        return ndjson_response(
+            stream_follow_list(user_id, follow_list, position.get("id"))
+        )
+    # делаем запрос к БД для получения страницы списка
+    found, users, next_position = await follower_service.get_follow_page(
+        user_id, follow_list, limit, after_id=position.get("id")
+    )
+    if not found:
+        raise ClientHTTPException(
+            status_code=404,
+            detail=f"Пользователь с id={user_id} " f"не найден.",
+        )
+    return json_response(
+        {
+            "result": True,
+            "users": users,
+            "next_cursor": (
+                encode_cursor(next_position) if next_position else None
+            ),
+        }
+    )
+
+
+@router.get("/me", response_model=UserSchemaResponse)
 async def get_info_about_your_profile(
     user_service: Annotated[UserService, Depends(user_service)],
     user_id=Depends(get_user),
-) -> UserSchemaResponse:
+) -> FastJSONResponse | dict:
     """
     Эндпоинт для получения информации о своем профиле
     :param user_service: сервис работы с БД для пользователей
@@ -54,13 +151,17 @@ async def get_info_about_your_profile(
     return await get_user_info(user_id, user_service)
 
 
-@router.get("/{id}", responses={404: {"model": ErrorSchemaResponse}})
+@router.get(
+    "/{id}",
+    response_model=UserSchemaResponse,
+    responses={404: {"model": ErrorSchemaResponse}},
+)
 async def get_info_about_other_profile_by_id(
     user_service: Annotated[UserService, Depends(user_service)],
     id: int = Path(
         ..., title="id пользователя", description="id пользователя", gt=0
     ),
-) -> UserSchemaResponse:
+) -> FastJSONResponse | dict:
     """
     Эндпоинт для получения информации о произвольном пользователе по id
     :param id: id пользователя
@@ -70,10 +171,99 @@ async def get_info_about_other_profile_by_id(
     return await get_user_info(id, user_service)
 
 
+@router.get(
+    "/{id}/followers",
+    response_model=UserSchemaListResponse,
+    responses={404: {"model": ErrorSchemaResponse}, **NDJSON_RESPONSES},
+)
+async def get_followers_by_id(
+    follower_service: Annotated[FollowerService, Depends(follower_service)],
+    id: int = Path(
+        ..., title="id пользователя", description="id пользователя", gt=0
+    ),
+    limit: int = Query(
+        setting.FOLLOWERS_PAGE_LIMIT,
+        title="Кол-во пользователей на странице",
+        description="Кол-во пользователей на странице",
+        gt=0,
+        le=setting.FOLLOWERS_PAGE_MAX_LIMIT,
+    ),
+    cursor: str | None = Query(
+        None,
+        title="Курсор страницы",
+        description="Курсор страницы из поля next_cursor "
+        "предыдущего ответа",
+    ),
+    stream: bool = Query(
+        False,
+        title="Потоковый ответ",
+        description="Отдать список целиком (начиная с позиции курсора) "
+        "потоком NDJSON - по пользователю в строке, limit не учитывается",
+    ),
+) -> FastJSONResponse | StreamingResponse | dict:
+    """
+    Эндпоинт для получения страницы списка подписчиков пользователя
+    :param follower_service: сервис работы с БД для подписок
+    :param id: id пользователя
+    :param limit: кол-во пользователей на странице
+    :param cursor: курсор страницы
+    :param stream: флаг потокового ответа
+    :return:
+    """
+    return await get_follow_list(
+        id, UserFollowList.followers, limit, cursor, stream, follower_service
+    )
+
+
+@router.get(
+    "/{id}/following",
+    response_model=UserSchemaListResponse,
+    responses={404: {"model": ErrorSchemaResponse}, **NDJSON_RESPONSES},
+)
+async def get_following_by_id(
+    follower_service: Annotated[FollowerService, Depends(follower_service)],
+    id: int = Path(
+        ..., title="id пользователя", description="id пользователя", gt=0
+    ),
+    limit: int = Query(
+        setting.FOLLOWERS_PAGE_LIMIT,
+        title="Кол-во пользователей на странице",
+        description="Кол-во пользователей на странице",
+        gt=0,
+        le=setting.FOLLOWERS_PAGE_MAX_LIMIT,
+    ),
+    cursor: str | None = Query(
+        None,
+        title="Курсор страницы",
+        description="Курсор страницы из поля next_cursor "
+        "предыдущего ответа",
+    ),
+    stream: bool = Query(
+        False,
+        title="Потоковый ответ",
+        description="Отдать список целиком (начиная с позиции курсора) "
+        "потоком NDJSON - по пользователю в строке, limit не учитывается",
+    ),
+) -> FastJSONResponse | StreamingResponse | dict:
+    """
+    Эндпоинт для получения страницы списка пользователей,
+    на которых подписан пользователь
+    :param follower_service: сервис работы с БД для подписок
+    :param id: id пользователя
+    :param limit: кол-во пользователей на странице
+    :param cursor: курсор страницы
+    :param stream: флаг потокового ответа
+    :return:
+    """
+    return await get_follow_list(
+        id, UserFollowList.following, limit, cursor, stream, follower_service
+    )
+
+
 @router.post("/{id}/follow", responses={404: {"model": ErrorSchemaResponse}})
 async def follow_user_by_id(
-    user_service: Annotated[UserService, Depends(user_service)],
     follower_service: Annotated[FollowerService, Depends(follower_service)],
+    timeline_service: Annotated[TimelineService, Depends(timeline_service)],
     id: int = Path(
         ...,
         title="id подписываемого пользователя",
@@ -85,46 +275,34 @@ async def follow_user_by_id(
     """
     Эндпоинт позволяет добавить пользователя в читаемые
     :param id: id пользователя добавляемого в читаемые
-    :param user_service: сервис работы с БД для пользователей
     :param follower_service: сервис работы с БД для
     добавления/удаления пользователей в читаемые
+    :param timeline_service: сервис работы с БД для лент пользователей
     :param user_id: id текущего пользователя
     :return:
     """
-    # делаем проверку на то что пользователь с таким id существует в БД
-    # если проверка не пройдена, то ничего не меняем в БД
-    # выводим отрицательный результат на фронтенд
-    user = await user_service.get_user_by_id(id)
-    if user is None:
+    # одним запросом к БД проверяем что пользователь существует
+    # и добавляем его в читаемые, подписку на себя и повторную
+    # подписку БД игнорирует, в этих случаях ничего не меняем
+    # и выводим положительный результат на фронтенд
+    found, created = await follower_service.follow(
+        user_id_follower=user_id, user_id_following=id
+    )
+    # если пользователя нет выводим отрицательный результат на фронтенд
+    if not found:
         raise ClientHTTPException(
             status_code=404, detail=f"Пользователя с id={id} не найден."
         )
-    # проверка на то что пользователь добавляет не сам себя
-    # если проверка не пройдена, то ничего не меняем в БД
-    # выводим положительный результат на фронтенд
-    if id == user_id:
-        return {"result": True}
-
-    # проверяем добавлен ли уже пользователь в читаемые
-    # если уже добавлен, то ничего не меняем в БД
-    # выводим положительный результат на фронтенд
-    following = await follower_service.get_following(
-        user_id_follower=user_id, user_id_following=id
-    )
-    if following:
-        return {"result": True}
-
-    # делаем запрос к БД для добавления пользователя в читаемые
-    await follower_service.add_following(
-        FollowerSchemaAddModel(user_id_follower=user_id, user_id_following=id)
-    )
+    # добавляем в ленту пользователя последние твитты читаемого
+    if created:
+        await timeline_service.add_following_tweets(user_id, id)
     return {"result": True}
 
 
 @router.delete("/{id}/follow", responses={404: {"model": ErrorSchemaResponse}})
 async def unfollow_user_by_id(
-    user_service: Annotated[UserService, Depends(user_service)],
     follower_service: Annotated[FollowerService, Depends(follower_service)],
+    timeline_service: Annotated[TimelineService, Depends(timeline_service)],
     id: int = Path(
         ...,
         title="id подписанного пользователя",
@@ -136,24 +314,24 @@ async def unfollow_user_by_id(
     """
     Эндпоинт позволяет удалять пользователя из читаемых
     :param id: id пользователя удаляемого из читаемых
-    :param user_service: сервис работы с БД для пользователей
     :param follower_service: сервис работы с БД
     для добавления/удаления пользователей в читаемые
+    :param timeline_service: сервис работы с БД для лент пользователей
     :param user_id: id текущего пользователя
     :return:
     """
-    # делаем проверку на то что пользователь с таким id существует в БД
-    # если проверка не пройдена, то ничего не меняем в БД
-    # выводим отрицательный результат на фронтенд
-    user = await user_service.get_user_by_id(id)
-    if user is None:
+    # одним запросом к БД проверяем что пользователь существует
+    # и удаляем его из читаемых
+    found, deleted = await follower_service.unfollow(
+        user_id_follower=user_id, user_id_following=id
+    )
+    # если пользователя нет выводим отрицательный результат на фронтенд
+    if not found:
         raise ClientHTTPException(
             status_code=404, detail=f"Пользователя с id={id} не найден."
         )
-
-    # делаем запрос к БД для удаления пользователя из читаемых
-    await follower_service.delete_following(
-        user_id_follower=user_id, user_id_following=id
-    )
+    # удаляем из ленты пользователя твитты бывшего читаемого
+    if deleted:
+        await timeline_service.delete_following_tweets(user_id, id)
 
     return {"result": True}
@@ -6,6 +6,8 @@ from pydantic_settings import BaseSettings
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 class Settings(BaseSettings):
     BASE_URI: Optional[str] = os.environ.get("BASE_URI")
@@ -24,6 +26,57 @@ class Settings(BaseSettings):
     DB_PASS_TEST: Optional[str] = os.environ.get("DB_PASS_TEST")
     DB_NAME_TEST: Optional[str] = os.environ.get("DB_NAME_TEST")
 
+    AUTH_CACHE_TTL: float = 60
+    AUTH_CACHE_MAXSIZE: int = 10000
+
+    FAST_JSON_ENABLED: bool = True
+    STREAM_BATCH_SIZE: int = 500
+
+    TWEETS_PAGE_LIMIT: int = 20
+    TWEETS_PAGE_MAX_LIMIT: int = 100
+    TWEET_LIKES_PREVIEW_LIMIT: int = 3
+
+    LIKES_PAGE_LIMIT: int = 20
+    LIKES_PAGE_MAX_LIMIT: int = 100
+
+    FEED_CACHE_MAXSIZE: int = 10000
+    FEED_CACHE_TTL: float = 30
+
+    WRITE_CLOCK_MAXSIZE: int = 10000
+    WRITE_CLOCK_TTL: float = 60
+
+    FOLLOWERS_PAGE_LIMIT: int = 20
+    FOLLOWERS_PAGE_MAX_LIMIT: int = 100
+
+    TIMELINE_FANOUT_ENABLED: bool = False
+    TIMELINE_FANOUT_MAX_FOLLOWERS: int = 10000
+    TIMELINE_BACKFILL_LIMIT: int = 100
+    TIMELINE_BACKFILL_BATCH_SIZE: int = 100
+
+    MEDIA_ROOT: str = os.path.join(BASE_DIR, "media")
+    MEDIA_ACCEL_REDIRECT: Optional[str] = None
+    MEDIA_MAX_SIZE: int = 10 * 1024 * 1024
+    MEDIA_CHUNK_SIZE: int = 1024 * 1024
+    MEDIA_VARIANTS_WORKERS: int = 2
+
+    MEDIA_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    MEDIA_CACHE_MAX_ITEM_SIZE: int = 1024 * 1024
+    MEDIA_CACHE_META_TTL: float = 60
+    MEDIA_CACHE_META_MAXSIZE: int = 10000
+
+    MEDIA_GC_ENABLED: bool = True
+    MEDIA_GC_INTERVAL: float = 600
+    MEDIA_GC_TTL: float = 24 * 60 * 60
+    MEDIA_GC_BATCH_SIZE: int = 100
+
+    LIKES_BATCH_ENABLED: bool = False
+    LIKES_BATCH_INTERVAL: float = 0.005
+    LIKES_BATCH_MAX_SIZE: int = 500
+
+    COUNTERS_RECONCILE_ENABLED: bool = True
+    COUNTERS_RECONCILE_INTERVAL: float = 60 * 60
+    COUNTERS_RECONCILE_BATCH_SIZE: int = 1000
+
     @property
     def database_url_asyncpg(self):
         return (
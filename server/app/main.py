@@ -1,9 +1,10 @@
+import asyncio
 import os
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 import uvicorn
-from api.dependencies import user_service
 from api.routers import all_routers
+from config import setting
 from fastapi import FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError, ResponseValidationError
@@ -11,19 +12,30 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import ValidationError
 from schemas.errors import ErrorSchemaResponse, ErrorSchemaValidation
+from services.users import UserService
 from utils.exceptions import (
     ClientHTTPException,
     CustomHTTPException,
     ServerHTTPException,
 )
 from utils.fake_data import USERS
+from utils.images import shutdown_process_pool
+from utils.like_batcher import like_batcher
+from utils.media_gc import run_media_gc
+from utils.reconcile_counters import run_reconcile_counters
+from utils.unitofwork import UnitOfWork
 
 tags_metadata = [
     {"name": "tweets", "description": "Операции с твитами"},
     {"name": "medias", "description": "Операции с файлами"},
     {"name": "users", "description": "Операции с пользователями"},
+    {"name": "metrics", "description": "Метрики приложения"},
 ]
 
+# запас на заголовки и границы multipart-запроса
+# сверх максимального размера медиафайла
+MEDIA_MULTIPART_OVERHEAD = 64 * 1024
+
 responses = {
     500: {"model": ErrorSchemaResponse},
     422: {"model": ErrorSchemaValidation},
@@ -34,10 +46,32 @@ responses = {
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     os.environ["ENV"] = "MAIN"
-    if await user_service().is_empty():
-        await user_service().add_all(USERS)
+    async with UnitOfWork() as uow:
+        user_service = UserService(uow.users)
+        if await user_service.is_empty():
+            await user_service.add_all(USERS)
+        await uow.commit()
+    # фоновая задача удаления неиспользуемых медиафайлов
+    media_gc_task = None
+    if setting.MEDIA_GC_ENABLED:
+        media_gc_task = asyncio.create_task(run_media_gc())
+    # фоновая задача сверки счетчиков лайков и подписок
+    reconcile_task = None
+    if setting.COUNTERS_RECONCILE_ENABLED:
+        reconcile_task = asyncio.create_task(run_reconcile_counters())
+    # отложенная запись лайков пачками
+    if setting.LIKES_BATCH_ENABLED:
+        like_batcher.start()
     yield
-    pass
+    # записываем в БД накопленные лайки до остановки приложения
+    if setting.LIKES_BATCH_ENABLED:
+        await like_batcher.stop()
+    for task in (media_gc_task, reconcile_task):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    shutdown_process_pool()
 
 
 app = FastAPI(
@@ -75,6 +109,30 @@ async def my_middleware(request: Request, call_next):
     pass
 
 
+@app.middleware("http")
+async def media_upload_size_middleware(request: Request, call_next):
+    # отклоняем слишком большой медиафайл по заголовку Content-Length
+    # до того как тело запроса будет принято и разобрано
+    content_length = request.headers.get("content-length", "")
+    if (
+        request.method == "POST"
+        and request.url.path == f"{setting.BASE_URI}/medias"
+        and content_length.isdigit()
+        and int(content_length)
+        > setting.MEDIA_MAX_SIZE + MEDIA_MULTIPART_OVERHEAD
+    ):
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={
+                "result": False,
+                "error_type": "ClientHTTPException",
+                "error_message": f"Размер медиафайла превышает "
+                f"{setting.MEDIA_MAX_SIZE} байт.",
+            },
+        )
+    return await call_next(request)
+
+
 @app.exception_handler(ServerHTTPException)
 @app.exception_handler(ClientHTTPException)
 async def http_exception_handler(request: Request, exc: CustomHTTPException):
@@ -1,7 +1,9 @@
 from db.db import Base
 from models.followers import *  # noqa
 from models.likes import *  # noqa
+from models.media_blobs import *  # noqa
 from models.medias import *  # noqa
+from models.timelines import *  # noqa
 from models.tweets import *  # noqa
 from models.users import *  # noqa
 
@@ -1,6 +1,13 @@
 from db.db import Base
 from schemas.followers import FollowerSchemaModel
-from sqlalchemy import CheckConstraint, ForeignKey, UniqueConstraint
+from sqlalchemy import (
+    DDL,
+    CheckConstraint,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+    event,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
@@ -36,6 +43,13 @@ class Follower(Base):
         CheckConstraint(
             "user_id_follower != user_id_following", name="_user_follower_neq"
         ),
+        # индекс для постраничного списка подписчиков пользователя
+        # (список читаемых использует индекс ограничения уникальности)
+        Index(
+            "ix_followers_following_follower",
+            "user_id_following",
+            "user_id_follower",
+        ),
     )
 
     def to_read_model(self) -> FollowerSchemaModel:
@@ -44,3 +58,38 @@ class Follower(Base):
             user_id_follower=self.user_id_follower,
             user_id_following=self.user_id_following,
         )
+
+
+# функция и триггер поддерживают кол-во подписчиков и читаемых
+# пользователей в одной транзакции с добавлением и удалением подписки
+USERS_FOLLOW_COUNT_FUNCTION = DDL(
+    """
+CREATE OR REPLACE FUNCTION users_follow_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE users SET followers_count = followers_count + 1
+        WHERE id = NEW.user_id_following;
+        UPDATE users SET following_count = following_count + 1
+        WHERE id = NEW.user_id_follower;
+    ELSE
+        UPDATE users SET followers_count = followers_count - 1
+        WHERE id = OLD.user_id_following;
+        UPDATE users SET following_count = following_count - 1
+        WHERE id = OLD.user_id_follower;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+)
+
+USERS_FOLLOW_COUNT_TRIGGER = DDL(
+    """
+CREATE TRIGGER followers_count
+AFTER INSERT OR DELETE ON followers
+FOR EACH ROW EXECUTE FUNCTION users_follow_count()
+"""
+)
+
+event.listen(Follower.__table__, "after_create", USERS_FOLLOW_COUNT_FUNCTION)
+event.listen(Follower.__table__, "after_create", USERS_FOLLOW_COUNT_TRIGGER)
@@ -1,6 +1,6 @@
 from db.db import Base
 from schemas.likes import LikeSchemaModel
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import DDL, ForeignKey, UniqueConstraint, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 
@@ -35,3 +35,34 @@ class Like(Base):
             tweet_id=self.tweet_id,
             user_id=self.user_id,
         )
+
+
+# функция и триггер поддерживают кол-во лайков твитта
+# в одной транзакции с добавлением и удалением лайка
+TWEETS_LIKES_COUNT_FUNCTION = DDL(
+    """
+CREATE OR REPLACE FUNCTION tweets_likes_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE tweets SET likes_count = likes_count + 1
+        WHERE id = NEW.tweet_id;
+    ELSE
+        UPDATE tweets SET likes_count = likes_count - 1
+        WHERE id = OLD.tweet_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+)
+
+TWEETS_LIKES_COUNT_TRIGGER = DDL(
+    """
+CREATE TRIGGER likes_count
+AFTER INSERT OR DELETE ON likes
+FOR EACH ROW EXECUTE FUNCTION tweets_likes_count()
+"""
+)
+
+event.listen(Like.__table__, "after_create", TWEETS_LIKES_COUNT_FUNCTION)
+event.listen(Like.__table__, "after_create", TWEETS_LIKES_COUNT_TRIGGER)
@@ -0,0 +1,38 @@
+from db.db import Base
+from schemas.media_blobs import MediaBlobSchemaModel
+from sqlalchemy import String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class MediaBlob(Base):
+    """
+    Тело медиафайла в хранилище: одинаковые по содержимому медиафайлы
+    хранятся один раз, ref_count - кол-во ссылающихся на тело записей
+    medias (поддерживается триггером на таблице medias)
+    """
+
+    __tablename__ = "media_blobs"
+
+    id: Mapped[int] = mapped_column(
+        primary_key=True, autoincrement=True, unique=True
+    )
+    key: Mapped[str] = mapped_column(String(64), unique=True)
+    size: Mapped[int] = mapped_column(nullable=True)
+    ref_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # метаданные изображения, вычисляются один раз при загрузке
+    width: Mapped[int] = mapped_column(nullable=True)
+    height: Mapped[int] = mapped_column(nullable=True)
+    mime_type: Mapped[str] = mapped_column(String(255), nullable=True)
+    placeholder = mapped_column(Text, nullable=True)
+
+    def to_read_model(self) -> MediaBlobSchemaModel:
+        return MediaBlobSchemaModel(
+            id=self.id,
+            key=self.key,
+            size=self.size,
+            ref_count=self.ref_count,
+            width=self.width,
+            height=self.height,
+            mime_type=self.mime_type,
+            placeholder=self.placeholder,
+        )
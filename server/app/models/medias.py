@@ -1,6 +1,8 @@
+from datetime import datetime
+
 from db.db import Base
 from schemas.medias import MediaSchemaModel
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import DDL, DateTime, ForeignKey, String, event, func
 from sqlalchemy.dialects.postgresql import BYTEA
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -12,19 +14,69 @@ class Media(Base):
         primary_key=True, autoincrement=True, unique=True
     )
     file_name: Mapped[str] = mapped_column(String(255))
-    file_body = mapped_column(BYTEA)
+    # ключ файла в хранилище медиафайлов (SHA-256 содержимого),
+    # одинаковые медиафайлы ссылаются на одно тело в хранилище
+    file_key: Mapped[str] = mapped_column(
+        ForeignKey("media_blobs.key"), nullable=True
+    )
+    # тело файла в БД осталось только у старых записей, которые еще
+    # не перенесены в хранилище (utils/migrate_media.py), загружается
+    # только явно, обращение к незагруженному телу вызывает исключение
+    file_body = mapped_column(BYTEA, deferred=True, deferred_raiseload=True)
     tweet_id: Mapped[int] = mapped_column(
         ForeignKey("tweets.id", ondelete="cascade"), nullable=True
     )
+    # пользователь загрузивший медиафайл (прикрепить медиафайл к твитту
+    # может только он), у старых записей не заполнен
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="cascade"), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
 
     tweet_media: Mapped["Tweet"] = relationship(  # noqa: F821
-        back_populates="tweet_medias", lazy="selectin"
+        back_populates="tweet_medias", lazy="raise"
     )
 
     def to_read_model(self) -> MediaSchemaModel:
         return MediaSchemaModel(
             id=self.id,
             file_name=self.file_name,
-            file_body=self.file_body,
+            file_key=self.file_key,
             tweet_id=self.tweet_id,
+            user_id=self.user_id,
+            created_at=self.created_at,
         )
+
+
+# функция и триггер поддерживают счетчик ссылок на тела медиафайлов,
+# в т.ч. при каскадном удалении медиафайлов вместе с твиттом
+MEDIA_BLOBS_REF_COUNT_FUNCTION = DDL(
+    """
+CREATE OR REPLACE FUNCTION media_blobs_ref_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.file_key IS NOT NULL THEN
+        UPDATE media_blobs SET ref_count = ref_count - 1
+        WHERE key = OLD.file_key;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.file_key IS NOT NULL THEN
+        UPDATE media_blobs SET ref_count = ref_count + 1
+        WHERE key = NEW.file_key;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+)
+
+MEDIA_BLOBS_REF_COUNT_TRIGGER = DDL(
+    """
+CREATE TRIGGER medias_ref_count
+AFTER INSERT OR DELETE OR UPDATE OF file_key ON medias
+FOR EACH ROW EXECUTE FUNCTION media_blobs_ref_count()
+"""
+)
+
+event.listen(Media.__table__, "after_create", MEDIA_BLOBS_REF_COUNT_FUNCTION)
+event.listen(Media.__table__, "after_create", MEDIA_BLOBS_REF_COUNT_TRIGGER)
@@ -0,0 +1,31 @@
+from db.db import Base
+from schemas.timelines import TimelineSchemaModel
+from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+
+class Timeline(Base):
+    __tablename__ = "timelines"
+
+    id: Mapped[int] = mapped_column(
+        primary_key=True, autoincrement=True, unique=True
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="cascade"), nullable=False
+    )
+    tweet_id: Mapped[int] = mapped_column(
+        ForeignKey("tweets.id", ondelete="cascade"), nullable=False
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "tweet_id", name="_user_tweet_timeline_uc"
+        ),
+    )
+
+    def to_read_model(self) -> TimelineSchemaModel:
+        return TimelineSchemaModel(
+            id=self.id,
+            user_id=self.user_id,
+            tweet_id=self.tweet_id,
+        )
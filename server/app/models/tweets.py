@@ -1,6 +1,6 @@
 from db.db import Base
 from schemas.tweets import TweetSchemaModel
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, false, true
 from sqlalchemy.dialects.postgresql import TEXT
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -15,11 +15,16 @@ class Tweet(Base):
         ForeignKey("users.id", ondelete="cascade")
     )
     content = mapped_column(TEXT, nullable=True)
+    # кол-во лайков, поддерживается триггером (см. models/likes.py)
+    likes_count: Mapped[int] = mapped_column(server_default="0")
+    # твитт разослан в материализованные ленты подписчиков (False -
+    # автор был популярным, твитт добавляется в ленты при чтении)
+    fanned_out: Mapped[bool] = mapped_column(server_default=true())
 
     tweet_medias: Mapped[list["Media"]] = relationship(  # noqa: F821
         back_populates="tweet_media",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        lazy="raise",
     )
 
     tweet_likes: Mapped[list["Like"]] = relationship(  # noqa: F821
@@ -32,6 +37,16 @@ class Tweet(Base):
         back_populates="user_tweets", lazy="selectin"
     )
 
+    __table_args__ = (
+        Index("ix_tweets_user_id_id", "user_id", "id"),
+        Index(
+            "ix_tweets_user_id_id_not_fanned_out",
+            "user_id",
+            "id",
+            postgresql_where=fanned_out == false(),
+        ),
+    )
+
     def to_read_model(self) -> TweetSchemaModel:
         return TweetSchemaModel(
             id=self.id,
@@ -11,6 +11,10 @@ class User(Base):
     )
     api_key: Mapped[str] = mapped_column(unique=True, nullable=False)
     name: Mapped[str] = mapped_column(nullable=False)
+    # кол-во подписчиков и читаемых пользователей,
+    # поддерживаются триггером (см. models/followers.py)
+    followers_count: Mapped[int] = mapped_column(server_default="0")
+    following_count: Mapped[int] = mapped_column(server_default="0")
 
     user_tweets: Mapped[list["Tweet"]] = relationship(  # noqa: F821
         back_populates="user_tweet", cascade="all, delete-orphan"
@@ -24,14 +28,16 @@ class User(Base):
         back_populates="user_follower",
         primaryjoin="User.id==Follower.user_id_follower",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        passive_deletes=True,
+        lazy="raise",
     )
 
     user_list_following: Mapped[list["Follower"]] = relationship(  # noqa: F821
         back_populates="user_following",
         primaryjoin="User.id==Follower.user_id_following",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        passive_deletes=True,
+        lazy="raise",
     )
 
     def to_read_model(self) -> UserSchemaModel:
@@ -1,6 +1,207 @@
+from typing import AsyncIterator
+
 from models.followers import Follower
-from utils.repository import SQLAlchemyRepository
+from models.users import User
+from schemas.users import UserFollowList
+from sqlalchemy import (
+    JSON,
+    ScalarSelect,
+    Select,
+    delete,
+    exists,
+    func,
+    literal,
+    select,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.orm import aliased
+from utils.repository import EMPTY_JSON_ARRAY, SQLAlchemyRepository
+
+
+def select_follow_list(
+    user_id: int,
+    follow_list: UserFollowList,
+    limit: int | None = None,
+    after_id: int | None = None,
+) -> Select:
+    """
+    Функция строит запрос страницы списка подписок пользователя
+    (id и имена пользователей по возрастанию id), страница выбирается
+    по ключу (id пользователя) по индексу без сканирования всего списка
+    :param user_id: id пользователя
+    :param follow_list: список подписчиков или читаемых пользователей
+    :param limit: кол-во пользователей на странице (None - без ограничения)
+    :param after_id: id последнего пользователя предыдущей страницы
+    :return: запрос пользователей страницы
+    """
+    if follow_list == UserFollowList.followers:
+        owner, other = Follower.user_id_following, Follower.user_id_follower
+    else:
+        owner, other = Follower.user_id_follower, Follower.user_id_following
+    page = select(other.label("id")).where(owner == user_id)
+    if after_id is not None:
+        page = page.where(other > after_id)
+    page = page.order_by(other).limit(limit).subquery("page")
+    member = aliased(User, name="member")
+    return (
+        select(member.id, member.name)
+        .select_from(page)
+        .join(member, member.id == page.c.id)
+        .order_by(member.id)
+    )
+
+
+def select_follow_page(
+    user_id: int,
+    follow_list: UserFollowList,
+    limit: int,
+    after_id: int | None = None,
+) -> ScalarSelect:
+    """
+    Функция строит подзапрос страницы списка подписок пользователя
+    в виде json-массива
+    :param user_id: id пользователя
+    :param follow_list: список подписчиков или читаемых пользователей
+    :param limit: кол-во пользователей на странице
+    :param after_id: id последнего пользователя предыдущей страницы
+    :return: скалярный подзапрос с json-массивом пользователей
+    """
+    members = select_follow_list(
+        user_id, follow_list, limit, after_id
+    ).subquery("members")
+    return select(
+        func.coalesce(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        "id", members.c.id, "name", members.c.name
+                    ),
+                    members.c.id,
+                )
+            ),
+            EMPTY_JSON_ARRAY,
+            type_=JSON,
+        )
+    ).scalar_subquery()
 
 
 class FollowerRepository(SQLAlchemyRepository):
     model = Follower
+
+    async def add_following_to_user(
+        self, user_id_follower: int, user_id_following: int
+    ) -> tuple[bool, bool]:
+        """
+        Метод создает подписку одним запросом: проверка существования
+        пользователя, проверка что пользователь не подписывается
+        сам на себя и вставка подписки (без ошибки если она уже есть)
+        :param user_id_follower: id пользователя подписывающего
+        :param user_id_following: id пользователя подписываемого
+        :return: пара (подписываемый пользователь существует,
+        подписка добавлена)
+        """
+        inserted = (
+            insert(Follower)
+            .from_select(
+                ["user_id_follower", "user_id_following"],
+                select(literal(user_id_follower), User.id).where(
+                    User.id == user_id_following,
+                    User.id != user_id_follower,
+                ),
+            )
+            .on_conflict_do_nothing(constraint="_user_follower_uc")
+            .returning(Follower.id)
+            .cte("inserted")
+        )
+        stmt = select(
+            exists().where(User.id == user_id_following),
+            select(func.count()).select_from(inserted).scalar_subquery(),
+        )
+        res = await self.session.execute(stmt)
+        found, count = res.one()
+        return found, count > 0
+
+    async def delete_following_from_user(
+        self, user_id_follower: int, user_id_following: int
+    ) -> tuple[bool, bool]:
+        """
+        Метод удаляет подписку одним запросом вместе с проверкой
+        существования пользователя
+        :param user_id_follower: id пользователя подписывающего
+        :param user_id_following: id пользователя подписываемого
+        :return: пара (подписанный пользователь существует,
+        подписка удалена)
+        """
+        deleted = (
+            delete(Follower)
+            .where(
+                Follower.user_id_follower == user_id_follower,
+                Follower.user_id_following == user_id_following,
+            )
+            .returning(Follower.id)
+            .cte("deleted")
+        )
+        stmt = select(
+            exists().where(User.id == user_id_following),
+            select(func.count()).select_from(deleted).scalar_subquery(),
+        )
+        res = await self.session.execute(stmt)
+        found, count = res.one()
+        return found, count > 0
+
+    async def find_follow_page(
+        self,
+        user_id: int,
+        follow_list: UserFollowList,
+        limit: int,
+        after_id: int | None = None,
+    ) -> tuple[bool, list[dict]]:
+        """
+        Метод получения страницы списка подписок пользователя одним
+        запросом вместе с проверкой существования пользователя
+        :param user_id: id пользователя
+        :param follow_list: список подписчиков или читаемых пользователей
+        :param limit: кол-во пользователей на странице
+        :param after_id: id последнего пользователя предыдущей страницы
+        :return: пара (пользователь существует, список объектов
+        с данными пользователей)
+        """
+        stmt = select(
+            exists().where(User.id == user_id),
+            select_follow_page(user_id, follow_list, limit, after_id),
+        )
+        res = await self.session.execute(stmt)
+        found, users = res.one()
+        return found, users
+
+    async def user_exists(self, user_id: int) -> bool:
+        """
+        Метод проверяет существование пользователя
+        :param user_id: id пользователя
+        :return: True если пользователь существует
+        """
+        res = await self.session.execute(
+            select(exists().where(User.id == user_id))
+        )
+        return res.scalar_one()
+
+    def stream_follow_list(
+        self,
+        user_id: int,
+        follow_list: UserFollowList,
+        batch_size: int,
+        after_id: int | None = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Метод чтения списка подписок пользователя из БД целиком
+        через курсор на стороне БД
+        :param user_id: id пользователя
+        :param follow_list: список подписчиков или читаемых пользователей
+        :param batch_size: кол-во пользователей в пачке чтения
+        :param after_id: id пользователя, после которого начинается чтение
+        :return: асинхронный итератор объектов с данными пользователей
+        """
+        return self.stream(
+            select_follow_list(user_id, follow_list, after_id=after_id),
+            batch_size,
+        )
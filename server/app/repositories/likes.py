@@ -1,6 +1,225 @@
 from models.likes import Like
-from utils.repository import SQLAlchemyRepository
+from models.tweets import Tweet
+from models.users import User
+from sqlalchemy import (
+    JSON,
+    ColumnElement,
+    Integer,
+    ScalarSelect,
+    Select,
+    column,
+    delete,
+    exists,
+    func,
+    literal,
+    select,
+    values,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from sqlalchemy.orm import aliased
+from utils.repository import EMPTY_JSON_ARRAY, SQLAlchemyRepository
+
+
+def select_likes_list(
+    tweet_id: int | ColumnElement[int],
+    limit: int | None = None,
+    after_user_id: int | None = None,
+) -> Select:
+    """
+    Функция строит запрос страницы списка лайкнувших твитт
+    пользователей (по возрастанию id пользователя), страница
+    выбирается по ключу по индексу уникальности лайка
+    без сканирования всех лайков твитта
+    :param tweet_id: id твитта (или столбец id твитта внешнего запроса)
+    :param limit: кол-во пользователей на странице (None - без ограничения)
+    :param after_user_id: id последнего пользователя предыдущей страницы
+    :return: запрос пользователей страницы
+    """
+    # при построении для внешнего запроса твиттов id твитта
+    # берется из внешнего запроса
+    page = (
+        select(Like.user_id)
+        .where(Like.tweet_id == tweet_id)
+        .correlate_except(Like)
+    )
+    if after_user_id is not None:
+        page = page.where(Like.user_id > after_user_id)
+    page = page.order_by(Like.user_id).limit(limit).subquery("liked")
+    liker = aliased(User, name="liker")
+    return (
+        select(liker.id.label("user_id"), liker.name)
+        .select_from(page)
+        .join(liker, liker.id == page.c.user_id)
+        .order_by(liker.id)
+    )
+
+
+def select_likes_page(
+    tweet_id: int | ColumnElement[int],
+    limit: int,
+    after_user_id: int | None = None,
+) -> ScalarSelect:
+    """
+    Функция строит подзапрос страницы списка лайкнувших твитт
+    пользователей в виде json-массива
+    :param tweet_id: id твитта (или столбец id твитта внешнего запроса)
+    :param limit: кол-во пользователей на странице
+    :param after_user_id: id последнего пользователя предыдущей страницы
+    :return: скалярный подзапрос с json-массивом пользователей
+    """
+    likers = select_likes_list(tweet_id, limit, after_user_id).subquery(
+        "likers"
+    )
+    return select(
+        func.coalesce(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        "user_id", likers.c.user_id, "name", likers.c.name
+                    ),
+                    likers.c.user_id,
+                )
+            ),
+            EMPTY_JSON_ARRAY,
+            type_=JSON,
+        )
+    ).scalar_subquery()
 
 
 class LikeRepository(SQLAlchemyRepository):
     model = Like
+
+    async def add_like_to_tweet(
+        self, tweet_id: int, user_id: int
+    ) -> tuple[bool, bool]:
+        """
+        Метод добавляет лайк твитту одним запросом: проверка
+        существования твитта, проверка что твитт не принадлежит
+        пользователю и вставка лайка (без ошибки если лайк уже есть)
+        :param tweet_id: id твитта
+        :param user_id: id пользователя
+        :return: пара (твитт существует, лайк добавлен)
+        """
+        inserted = (
+            insert(Like)
+            .from_select(
+                ["tweet_id", "user_id"],
+                select(Tweet.id, literal(user_id)).where(
+                    Tweet.id == tweet_id, Tweet.user_id != user_id
+                ),
+            )
+            .on_conflict_do_nothing(constraint="user_tweet_uc")
+            .returning(Like.id)
+            .cte("inserted")
+        )
+        stmt = select(
+            exists().where(Tweet.id == tweet_id),
+            select(func.count()).select_from(inserted).scalar_subquery(),
+        )
+        res = await self.session.execute(stmt)
+        found, count = res.one()
+        return found, count > 0
+
+    async def delete_like_from_tweet(
+        self, tweet_id: int, user_id: int
+    ) -> tuple[bool, bool]:
+        """
+        Метод удаляет лайк с твитта одним запросом
+        вместе с проверкой существования твитта
+        :param tweet_id: id твитта
+        :param user_id: id пользователя
+        :return: пара (твитт существует, лайк удален)
+        """
+        deleted = (
+            delete(Like)
+            .where(Like.tweet_id == tweet_id, Like.user_id == user_id)
+            .returning(Like.id)
+            .cte("deleted")
+        )
+        stmt = select(
+            exists().where(Tweet.id == tweet_id),
+            select(func.count()).select_from(deleted).scalar_subquery(),
+        )
+        res = await self.session.execute(stmt)
+        found, count = res.one()
+        return found, count > 0
+
+    async def tweet_exists(self, tweet_id: int) -> bool:
+        """
+        Метод проверяет существование твитта
+        :param tweet_id: id твитта
+        :return: True если твитт существует
+        """
+        res = await self.session.execute(
+            select(exists().where(Tweet.id == tweet_id))
+        )
+        return res.scalar_one()
+
+    async def find_likes_page(
+        self, tweet_id: int, limit: int, after_user_id: int | None = None
+    ) -> tuple[bool, list[dict]]:
+        """
+        Метод получения страницы списка лайкнувших твитт пользователей
+        одним запросом вместе с проверкой существования твитта
+        :param tweet_id: id твитта
+        :param limit: кол-во пользователей на странице
+        :param after_user_id: id последнего пользователя
+        предыдущей страницы
+        :return: пара (твитт существует, список объектов
+        с данными пользователей)
+        """
+        stmt = select(
+            exists().where(Tweet.id == tweet_id),
+            select_likes_page(tweet_id, limit, after_user_id),
+        )
+        res = await self.session.execute(stmt)
+        found, likes = res.one()
+        return found, likes
+
+    async def apply_likes_batch(
+        self, likes: list[tuple[int, int]], unlikes: list[tuple[int, int]]
+    ) -> tuple[int, int]:
+        """
+        Метод применяет пачку накопленных лайков и снятий лайков:
+        лайки добавляются одним многострочным INSERT ... ON CONFLICT
+        (лайки на свои твитты и на удаленные твитты пропускаются),
+        лайки снимаются одним DELETE ... USING
+        :param likes: список пар (id твитта, id пользователя) для лайков
+        :param unlikes: список пар (id твитта, id пользователя)
+        для снятия лайков
+        :return: пара (кол-во добавленных лайков, кол-во снятых лайков)
+        """
+        inserted = deleted = 0
+        if likes:
+            batch = values(
+                column("tweet_id", Integer),
+                column("user_id", Integer),
+                name="batch",
+            ).data(likes)
+            stmt = (
+                insert(Like)
+                .from_select(
+                    ["tweet_id", "user_id"],
+                    select(batch.c.tweet_id, batch.c.user_id).join(
+                        Tweet,
+                        (Tweet.id == batch.c.tweet_id)
+                        & (Tweet.user_id != batch.c.user_id),
+                    ),
+                )
+                .on_conflict_do_nothing(constraint="user_tweet_uc")
+            )
+            res = await self.session.execute(stmt)
+            inserted = res.rowcount
+        if unlikes:
+            batch = values(
+                column("tweet_id", Integer),
+                column("user_id", Integer),
+                name="batch",
+            ).data(unlikes)
+            stmt = delete(Like).where(
+                Like.tweet_id == batch.c.tweet_id,
+                Like.user_id == batch.c.user_id,
+            )
+            res = await self.session.execute(stmt)
+            deleted = res.rowcount
+        return inserted, deleted
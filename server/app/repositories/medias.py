@@ -1,6 +1,176 @@
+from datetime import timedelta
+
+from models.media_blobs import MediaBlob
 from models.medias import Media
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from utils.repository import SQLAlchemyRepository
 
 
 class MediaRepository(SQLAlchemyRepository):
     model = Media
+
+    async def find_blob(self, file_key: str) -> MediaBlob | None:
+        """
+        Метод получения тела медиафайла по ключу файла в хранилище
+        :param file_key: ключ файла в хранилище
+        :return: объект тела медиафайла или None
+        """
+        stmt = select(MediaBlob).where(MediaBlob.key == file_key)
+        res = await self.session.execute(stmt)
+        return res.scalar_one_or_none()
+
+    async def add_blob(
+        self, file_key: str, file_size: int, meta: dict | None = None
+    ) -> None:
+        """
+        Метод добавляет тело медиафайла, если такого
+        по содержимому еще нет (счетчик ссылок ведет триггер)
+        :param file_key: ключ файла в хранилище
+        :param file_size: размер файла в байтах
+        :param meta: метаданные медиафайла (размеры, MIME-тип, заглушка)
+        :return:
+        """
+        stmt = pg_insert(MediaBlob).values(
+            key=file_key, size=file_size, **(meta or {})
+        )
+        # при конфликте обновляем (а не пропускаем) строку, чтобы она была
+        # заблокирована до конца транзакции и не была удалена сборщиком
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MediaBlob.key],
+            set_={"size": stmt.excluded.size},
+        )
+        await self.session.execute(stmt)
+
+    async def add_media(
+        self,
+        file_name: str,
+        file_key: str,
+        file_size: int,
+        meta: dict | None = None,
+        user_id: int | None = None,
+    ) -> int:
+        """
+        Метод добавляет медиафайл, ссылающийся на тело
+        в хранилище (одинаковые тела хранятся один раз)
+        :param file_name: имя медиафайла
+        :param file_key: ключ файла в хранилище
+        :param file_size: размер файла в байтах
+        :param meta: метаданные нового тела медиафайла
+        :param user_id: id пользователя загрузившего медиафайл
+        :return: id нового медиафайла
+        """
+        await self.add_blob(file_key, file_size, meta)
+        stmt = (
+            insert(Media)
+            .values(file_name=file_name, file_key=file_key, user_id=user_id)
+            .returning(Media.id)
+        )
+        res = await self.session.execute(stmt)
+        return res.scalar_one()
+
+    async def find_file_body(self, id: int) -> bytes | None:
+        """
+        Метод получения тела медиафайла, которое еще хранится в БД
+        (в остальных запросах тело файла не загружается)
+        :param id: id медиафайла
+        :return: тело медиафайла или None
+        """
+        stmt = select(Media.file_body).where(Media.id == id)
+        res = await self.session.execute(stmt)
+        return res.scalar_one_or_none()
+
+    async def find_stored_in_db(self, limit: int) -> list[tuple[int, bytes]]:
+        """
+        Метод получения пачки медиафайлов, тела которых
+        еще хранятся в БД (строки блокируются до конца транзакции)
+        :param limit: размер пачки
+        :return: список пар (id медиафайла, тело медиафайла)
+        """
+        stmt = (
+            select(Media.id, Media.file_body)
+            .where(Media.file_key.is_(None), Media.file_body.is_not(None))
+            .order_by(Media.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        res = await self.session.execute(stmt)
+        return [tuple(row) for row in res.all()]
+
+    async def move_to_storage(
+        self,
+        id: int,
+        file_key: str,
+        file_size: int,
+        meta: dict | None = None,
+    ) -> None:
+        """
+        Метод заменяет тело медиафайла в БД ключом файла в хранилище
+        :param id: id медиафайла
+        :param file_key: ключ файла в хранилище
+        :param file_size: размер файла в байтах
+        :param meta: метаданные тела медиафайла
+        :return:
+        """
+        await self.add_blob(file_key, file_size, meta)
+        stmt = (
+            update(Media)
+            .where(Media.id == id)
+            .values(file_key=file_key, file_body=None)
+        )
+        await self.session.execute(stmt)
+
+    async def delete_orphaned(
+        self, older_than: float, limit: int
+    ) -> list[tuple[int, int | None]]:
+        """
+        Метод удаляет пачку медиафайлов, которые так и не были
+        прикреплены к твитту (строки, заблокированные другими
+        транзакциями, пропускаются)
+        :param older_than: минимальный возраст медиафайла в секундах
+        :param limit: размер пачки
+        :return: список пар (id медиафайла, размер тела медиафайла
+        в БД в байтах)
+        """
+        ids = (
+            select(Media.id)
+            .where(
+                Media.tweet_id.is_(None),
+                Media.created_at < func.now() - timedelta(seconds=older_than),
+            )
+            .order_by(Media.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            delete(Media)
+            .where(Media.id.in_(ids.scalar_subquery()))
+            .returning(Media.id, func.octet_length(Media.file_body))
+        )
+        res = await self.session.execute(stmt)
+        return [tuple(row) for row in res.all()]
+
+    async def delete_unreferenced_blobs(
+        self, limit: int
+    ) -> list[tuple[str, int | None]]:
+        """
+        Метод удаляет пачку тел медиафайлов, на которые больше
+        не ссылается ни один медиафайл (строки, заблокированные
+        другими транзакциями, пропускаются)
+        :param limit: размер пачки
+        :return: список пар (ключ файла в хранилище, размер файла)
+        """
+        ids = (
+            select(MediaBlob.id)
+            .where(MediaBlob.ref_count == 0)
+            .order_by(MediaBlob.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            delete(MediaBlob)
+            .where(MediaBlob.id.in_(ids.scalar_subquery()))
+            .returning(MediaBlob.key, MediaBlob.size)
+        )
+        res = await self.session.execute(stmt)
+        return [tuple(row) for row in res.all()]
@@ -0,0 +1,151 @@
+from models.followers import Follower
+from models.timelines import Timeline
+from models.tweets import Tweet
+from models.users import User
+from sqlalchemy import delete, literal, or_, select, true, union_all, update
+from sqlalchemy.dialects.postgresql import insert
+from utils.repository import SQLAlchemyRepository
+
+
+class TimelineRepository(SQLAlchemyRepository):
+    model = Timeline
+
+    async def count_followers(self, user_id: int) -> int:
+        """
+        Метод получает кол-во подписчиков пользователя
+        (из счетчика, без подсчета подписок)
+        :param user_id: id пользователя
+        :return: кол-во подписчиков
+        """
+        stmt = select(User.followers_count).where(User.id == user_id)
+        res = await self.session.execute(stmt)
+        return res.scalar_one_or_none() or 0
+
+    async def add_tweet(
+        self, tweet_id: int, author_id: int, fan_out: bool = True
+    ) -> None:
+        """
+        Метод добавляет твитт в ленту автора и (если fan_out)
+        в ленты всех его подписчиков одним запросом
+        :param tweet_id: id твитта
+        :param author_id: id автора твитта
+        :param fan_out: флаг рассылки твитта в ленты подписчиков
+        :return:
+        """
+        source = select(
+            literal(author_id).label("user_id"),
+            literal(tweet_id).label("tweet_id"),
+        )
+        if not fan_out:
+            # твитт будет добавляться в ленты подписчиков при чтении
+            await self.session.execute(
+                update(Tweet)
+                .where(Tweet.id == tweet_id)
+                .values(fanned_out=False)
+            )
+        else:
+            source = union_all(
+                source,
+                select(Follower.user_id_follower, literal(tweet_id)).where(
+                    Follower.user_id_following == author_id
+                ),
+            )
+        stmt = (
+            insert(Timeline)
+            .from_select(["user_id", "tweet_id"], source)
+            .on_conflict_do_nothing(constraint="_user_tweet_timeline_uc")
+        )
+        await self.session.execute(stmt)
+
+    async def add_author_tweets(
+        self, user_id: int, author_id: int, limit: int
+    ) -> None:
+        """
+        Метод добавляет в ленту пользователя последние разосланные
+        твитты автора (при подписке на автора)
+        :param user_id: id пользователя владельца ленты
+        :param author_id: id автора твиттов
+        :param limit: максимальное кол-во добавляемых твиттов
+        :return:
+        """
+        source = (
+            select(literal(user_id), Tweet.id)
+            .where(Tweet.user_id == author_id, Tweet.fanned_out)
+            .order_by(Tweet.id.desc())
+            .limit(limit)
+        )
+        stmt = (
+            insert(Timeline)
+            .from_select(["user_id", "tweet_id"], source)
+            .on_conflict_do_nothing(constraint="_user_tweet_timeline_uc")
+        )
+        await self.session.execute(stmt)
+
+    async def delete_author_tweets(self, user_id: int, author_id: int) -> bool:
+        """
+        Метод удаляет из ленты пользователя все твитты автора
+        (при отписке от автора)
+        :param user_id: id пользователя владельца ленты
+        :param author_id: id автора твиттов
+        :return: True если записи были удалены, иначе False
+        """
+        stmt = delete(Timeline).where(
+            Timeline.user_id == user_id,
+            Timeline.tweet_id.in_(
+                select(Tweet.id).where(Tweet.user_id == author_id)
+            ),
+        )
+        res = await self.session.execute(stmt)
+        return res.rowcount > 0
+
+    async def backfill(
+        self, after_id: int, limit: int, tweets_limit: int
+    ) -> tuple[int | None, int]:
+        """
+        Метод заполняет ленты пачки пользователей их последними
+        твиттами и последними разосланными твиттами пользователей,
+        на которых они подписаны, одним запросом
+        (при включении материализованных лент на существующих данных)
+        :param after_id: id последнего пользователя предыдущей пачки
+        :param limit: размер пачки
+        :param tweets_limit: максимальное кол-во твиттов каждого автора
+        :return: пара (id последнего пользователя пачки или None если
+        пользователей больше нет, кол-во добавленных записей)
+        """
+        batch = await self.session.scalars(
+            select(User.id)
+            .where(User.id > after_id)
+            .order_by(User.id)
+            .limit(limit)
+        )
+        ids = batch.all()
+        if not ids:
+            return None, 0
+        authors = union_all(
+            select(User.id.label("user_id"), User.id.label("author_id")).where(
+                User.id.in_(ids)
+            ),
+            select(
+                Follower.user_id_follower, Follower.user_id_following
+            ).where(Follower.user_id_follower.in_(ids)),
+        ).subquery("authors")
+        tweets = (
+            select(Tweet.id)
+            .where(
+                Tweet.user_id == authors.c.author_id,
+                or_(
+                    Tweet.fanned_out, authors.c.user_id == authors.c.author_id
+                ),
+            )
+            .order_by(Tweet.id.desc())
+            .limit(tweets_limit)
+            .lateral("tweets")
+        )
+        source = select(authors.c.user_id, tweets.c.id).join(tweets, true())
+        stmt = (
+            insert(Timeline)
+            .from_select(["user_id", "tweet_id"], source)
+            .on_conflict_do_nothing(constraint="_user_tweet_timeline_uc")
+        )
+        res = await self.session.execute(stmt)
+        return ids[-1], res.rowcount
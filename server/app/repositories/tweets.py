@@ -1,6 +1,392 @@
+from typing import AsyncIterator
+
+from config import setting
+from models.followers import Follower
+from models.likes import Like
+from models.media_blobs import MediaBlob
+from models.medias import Media
+from models.timelines import Timeline
 from models.tweets import Tweet
-from utils.repository import SQLAlchemyRepository
+from models.users import User
+from repositories.likes import select_likes_page
+from sqlalchemy import (
+    JSON,
+    Select,
+    exists,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    union,
+    update,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+from utils.repository import EMPTY_JSON_ARRAY, SQLAlchemyRepository
 
 
 class TweetRepository(SQLAlchemyRepository):
     model = Tweet
+
+    def select_feed_all(
+        self, limit: int | None, after_id: int | None = None
+    ) -> Select:
+        """
+        Метод строит запрос страницы ленты всех твиттов (от новых к старым)
+        :param limit: кол-во твиттов на странице (None - без ограничения)
+        :param after_id: id последнего твитта предыдущей страницы
+        :return: запрос id твиттов страницы
+        """
+        page = select(Tweet.id)
+        if after_id is not None:
+            page = page.where(Tweet.id < after_id)
+        return page.order_by(Tweet.id.desc()).limit(limit)
+
+    def select_feed_popular(
+        self,
+        user_id: int,
+        limit: int | None,
+        after: dict[str, int] | None = None,
+    ) -> Select:
+        """
+        Метод строит запрос страницы твиттов пользователей, на которых
+        подписан пользователь, отсортированных по убыванию кол-ва лайков.
+        Фильтрация и сортировка выполняются в БД одним запросом,
+        кол-во лайков берется из счетчика твитта
+        :param user_id: id пользователя для которого строится лента
+        :param limit: кол-во твиттов на странице (None - без ограничения)
+        :param after: позиция (rank - кол-во лайков, id - id твитта)
+        последнего твитта предыдущей страницы
+        :return: запрос id и кол-ва лайков (rank) твиттов страницы
+        """
+        ranked = (
+            select(Tweet.id.label("id"), Tweet.likes_count.label("rank"))
+            .join(Follower, Follower.user_id_following == Tweet.user_id)
+            .where(Follower.user_id_follower == user_id)
+            .subquery("ranked")
+        )
+        page = select(ranked.c.id, ranked.c.rank)
+        if after:
+            page = page.where(
+                tuple_(ranked.c.rank, ranked.c.id)
+                < tuple_(after["rank"], after["id"])
+            )
+        return page.order_by(ranked.c.rank.desc(), ranked.c.id.desc()).limit(
+            limit
+        )
+
+    def select_feed_timeline(
+        self,
+        user_id: int,
+        limit: int | None,
+        after_id: int | None = None,
+        materialized: bool = False,
+    ) -> Select:
+        """
+        Метод строит запрос страницы хронологической ленты пользователя
+        (его твитты и твитты пользователей, на которых он подписан).
+        Если materialized, то лента читается из таблицы timelines,
+        а к ней добавляются твитты, которые не рассылались в ленты
+        подписчиков при записи (автор в момент публикации имел больше
+        TIMELINE_FANOUT_MAX_FOLLOWERS подписчиков).
+        Иначе лента целиком собирается при чтении
+        :param user_id: id пользователя владельца ленты
+        :param limit: кол-во твиттов на странице (None - без ограничения)
+        :param after_id: id последнего твитта предыдущей страницы
+        :param materialized: флаг чтения из материализованной ленты
+        :return: запрос id твиттов страницы
+        """
+        followees = select(Follower.user_id_following).where(
+            Follower.user_id_follower == user_id
+        )
+        if not materialized:
+            authors = followees.union(select(literal(user_id)))
+            branches = [select(Tweet.id).where(Tweet.user_id.in_(authors))]
+        else:
+            # признак рассылки фиксируется при публикации, поэтому твитты
+            # не пропадают из ленты, когда кол-во подписчиков автора
+            # переходит через порог в любую сторону
+            branches = [
+                select(Timeline.tweet_id.label("id")).where(
+                    Timeline.user_id == user_id
+                ),
+                select(Tweet.id).where(
+                    Tweet.user_id.in_(followees), Tweet.fanned_out.is_(False)
+                ),
+            ]
+
+        pages = []
+        for branch in branches:
+            column = branch.selected_columns[0]
+            if after_id is not None:
+                branch = branch.where(column < after_id)
+            pages.append(branch.order_by(column.desc()).limit(limit))
+        merged = (pages[0] if len(pages) == 1 else union(*pages)).subquery(
+            "merged"
+        )
+        return select(merged.c.id).order_by(merged.c.id.desc()).limit(limit)
+
+    async def add_tweet_with_medias(
+        self, user_id: int, content: str, media_ids: list[int]
+    ) -> int:
+        """
+        Метод добавляет твитт и прикрепляет к нему медиафайлы одним
+        запросом: прикрепляются только медиафайлы, загруженные автором
+        твитта и еще не прикрепленные к другому твитту.
+        Владелец медиафайлов, загруженных до появления владельца
+        (user_id не задан), неизвестен, такие медиафайлы может
+        прикрепить любой автор и он становится их владельцем
+        :param user_id: id автора твитта
+        :param content: текст твитта
+        :param media_ids: список id медиафайлов твитта
+        :return: id нового твитта
+        """
+        inserted = (
+            insert(Tweet)
+            .values(user_id=user_id, content=content)
+            .returning(Tweet.id)
+            .cte("inserted")
+        )
+        attached = (
+            update(Media)
+            .where(
+                Media.id.in_(media_ids),
+                or_(Media.user_id == user_id, Media.user_id.is_(None)),
+                Media.tweet_id.is_(None),
+            )
+            .values(
+                tweet_id=select(inserted.c.id).scalar_subquery(),
+                user_id=user_id,
+            )
+            .returning(Media.id)
+            .cte("attached")
+        )
+        stmt = select(
+            inserted.c.id,
+            select(func.count()).select_from(attached).scalar_subquery(),
+        )
+        res = await self.session.execute(stmt)
+        tweet_id, _ = res.one()
+        return tweet_id
+
+    async def find_media_ids(self, tweet_id: int) -> list[int]:
+        """
+        Метод получения id медиафайлов твитта
+        (удаляются каскадно вместе с твиттом)
+        :param tweet_id: id твитта
+        :return: список id медиафайлов
+        """
+        stmt = select(Media.id).where(Media.tweet_id == tweet_id)
+        res = await self.session.execute(stmt)
+        return list(res.scalars().all())
+
+    async def find_followers_among(
+        self, user_id: int, user_ids: list[int]
+    ) -> list[int]:
+        """
+        Метод выбирает из списка пользователей подписчиков пользователя
+        (по индексу подписчиков, без чтения всего списка подписчиков)
+        :param user_id: id пользователя
+        :param user_ids: список id пользователей
+        :return: список id подписчиков
+        """
+        stmt = select(Follower.user_id_follower).where(
+            Follower.user_id_following == user_id,
+            Follower.user_id_follower.in_(user_ids),
+        )
+        res = await self.session.execute(stmt)
+        return list(res.scalars().all())
+
+    async def reconcile_likes_count(
+        self, after_id: int, limit: int
+    ) -> tuple[int | None, int]:
+        """
+        Метод сверяет счетчики лайков пачки твиттов с фактическим
+        кол-вом лайков и исправляет расхождения одним запросом
+        :param after_id: id последнего твитта предыдущей пачки
+        :param limit: размер пачки
+        :return: пара (id последнего твитта пачки или None если
+        твиттов больше нет, кол-во исправленных счетчиков)
+        """
+        # блокируем строки пачки отдельным запросом: пересчет ниже
+        # выполняется следующим запросом транзакции, его снимок данных
+        # (READ COMMITTED) видит все лайки, зафиксированные до блокировки,
+        # а новые лайки ждут конца сверки и не затираются старым значением
+        batch = await self.session.scalars(
+            select(Tweet.id)
+            .where(Tweet.id > after_id)
+            .order_by(Tweet.id)
+            .limit(limit)
+            .with_for_update()
+        )
+        ids = batch.all()
+        if not ids:
+            return None, 0
+        actual = (
+            select(func.count(Like.id))
+            .where(Like.tweet_id == Tweet.id)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(Tweet)
+            .where(Tweet.id.in_(ids), Tweet.likes_count != actual)
+            .values(likes_count=actual)
+            .returning(Tweet.id)
+        )
+        res = await self.session.execute(stmt)
+        return ids[-1], len(res.all())
+
+    async def find_feed(
+        self,
+        page: Select,
+        likes_limit: int | None = None,
+        viewer_id: int | None = None,
+    ) -> list[dict]:
+        """
+        Метод получения страницы ленты из БД одним запросом
+        :param page: запрос id твиттов страницы (и ключей сортировки)
+        :param likes_limit: кол-во лайкнувших пользователей в компактном
+        режиме (None - полный список)
+        :param viewer_id: id пользователя, для которого строится лента
+        :return: список объектов с данными твиттов
+        """
+        res = await self.session.execute(
+            self._select_feed(page, likes_limit, viewer_id)
+        )
+        return [dict(row) for row in res.mappings().all()]
+
+    def stream_feed(
+        self,
+        page: Select,
+        batch_size: int,
+        likes_limit: int | None = None,
+        viewer_id: int | None = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Метод чтения ленты из БД через курсор на стороне БД
+        :param page: запрос id твиттов (и ключей сортировки)
+        :param batch_size: кол-во твиттов в пачке чтения
+        :param likes_limit: кол-во лайкнувших пользователей в компактном
+        режиме (None - полный список)
+        :param viewer_id: id пользователя, для которого строится лента
+        :return: асинхронный итератор объектов с данными твиттов
+        """
+        return self.stream(
+            self._select_feed(page, likes_limit, viewer_id), batch_size
+        )
+
+    def _select_feed(
+        self,
+        page: Select,
+        likes_limit: int | None = None,
+        viewer_id: int | None = None,
+    ) -> Select:
+        """
+        Метод строит запрос, собирающий страницу ленты в БД: к id твиттов
+        страницы через lateral-подзапросы с json_agg добавляются ссылки
+        и метаданные медиафайлов, автор и список лайкнувших пользователей.
+        В компактном режиме (задан likes_limit) вместо полного списка
+        лайкнувших пользователей добавляются первые likes_limit из них,
+        кол-во лайков из счетчика твитта и признак лайка пользователя
+        :param page: запрос id твиттов страницы (и ключей сортировки)
+        :param likes_limit: кол-во лайкнувших пользователей в компактном
+        режиме (None - полный список)
+        :param viewer_id: id пользователя, для которого строится лента
+        :return: запрос данных твиттов
+        """
+        page = page.subquery("page")
+        author = select(
+            func.json_build_object(
+                "id", User.id, "name", User.name, type_=JSON
+            ).label("author")
+        ).where(User.id == Tweet.user_id)
+        media_url = func.concat(f"{setting.BASE_URI}/medias/", Media.id)
+        attachments = (
+            select(
+                func.coalesce(
+                    func.json_agg(aggregate_order_by(media_url, Media.id)),
+                    EMPTY_JSON_ARRAY,
+                    type_=JSON,
+                ).label("attachments"),
+                func.coalesce(
+                    func.json_agg(
+                        aggregate_order_by(
+                            func.json_build_object(
+                                "url",
+                                media_url,
+                                "thumb_url",
+                                func.concat(media_url, "?size=thumb"),
+                                "width",
+                                MediaBlob.width,
+                                "height",
+                                MediaBlob.height,
+                                "mime_type",
+                                MediaBlob.mime_type,
+                                "placeholder",
+                                MediaBlob.placeholder,
+                            ),
+                            Media.id,
+                        )
+                    ),
+                    EMPTY_JSON_ARRAY,
+                    type_=JSON,
+                ).label("attachments_meta"),
+            )
+            .outerjoin(MediaBlob, MediaBlob.key == Media.file_key)
+            .where(Media.tweet_id == Tweet.id)
+        )
+        if likes_limit is not None:
+            likes = select(
+                select_likes_page(Tweet.id, likes_limit).label("likes")
+            )
+        else:
+            likes = (
+                select(
+                    func.coalesce(
+                        func.json_agg(
+                            aggregate_order_by(
+                                func.json_build_object(
+                                    "user_id", User.id, "name", User.name
+                                ),
+                                Like.id,
+                            )
+                        ),
+                        EMPTY_JSON_ARRAY,
+                        type_=JSON,
+                    ).label("likes")
+                )
+                .join(User, User.id == Like.user_id)
+                .where(Like.tweet_id == Tweet.id)
+            )
+        author = author.lateral("author")
+        attachments = attachments.lateral("attachments")
+        likes = likes.lateral("likes")
+
+        order_by = [page.c.id.desc()]
+        if "rank" in page.c:
+            order_by.insert(0, page.c.rank.desc())
+        columns = [
+            *page.c,
+            Tweet.content,
+            attachments.c.attachments,
+            attachments.c.attachments_meta,
+            author.c.author,
+            likes.c.likes,
+        ]
+        if likes_limit is not None:
+            columns += [
+                Tweet.likes_count,
+                exists()
+                .where(Like.tweet_id == Tweet.id, Like.user_id == viewer_id)
+                .label("liked_by_me"),
+            ]
+        return (
+            select(*columns)
+            .select_from(page)
+            .join(Tweet, Tweet.id == page.c.id)
+            .join(author, true())
+            .join(attachments, true())
+            .join(likes, true())
+            .order_by(*order_by)
+        )
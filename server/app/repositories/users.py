@@ -1,6 +1,96 @@
+from models.followers import Follower
 from models.users import User
+from repositories.followers import select_follow_page
+from schemas.users import UserFollowList
+from sqlalchemy import func, or_, select, update
 from utils.repository import SQLAlchemyRepository
 
 
 class UserRepository(SQLAlchemyRepository):
     model = User
+
+    async def find_id_by_api_key(self, api_key: str) -> int | None:
+        """
+        Метод получения id пользователя по api_key
+        (без загрузки связанных подписок)
+        :param api_key: api_key пользователя
+        :return: id пользователя или None
+        """
+        stmt = select(User.id).where(User.api_key == api_key)
+        res = await self.session.execute(stmt)
+        return res.scalar_one_or_none()
+
+    async def find_profile(self, user_id: int, limit: int) -> dict | None:
+        """
+        Метод получения профиля пользователя одним запросом: кол-во
+        подписчиков и читаемых пользователей (из счетчиков) и первые
+        страницы этих списков (без загрузки всех подписок)
+        :param user_id: id пользователя
+        :param limit: кол-во пользователей на первой странице списков
+        :return: объект с данными профиля или None
+        """
+        stmt = select(
+            User.id,
+            User.name,
+            User.followers_count,
+            User.following_count,
+            select_follow_page(user_id, UserFollowList.followers, limit).label(
+                "followers"
+            ),
+            select_follow_page(user_id, UserFollowList.following, limit).label(
+                "following"
+            ),
+        ).where(User.id == user_id)
+        res = await self.session.execute(stmt)
+        row = res.mappings().one_or_none()
+        return dict(row) if row is not None else None
+
+    async def reconcile_follow_counts(
+        self, after_id: int, limit: int
+    ) -> tuple[int | None, int]:
+        """
+        Метод сверяет счетчики подписчиков и читаемых пользователей
+        пачки пользователей с фактическим кол-вом подписок
+        и исправляет расхождения одним запросом
+        :param after_id: id последнего пользователя предыдущей пачки
+        :param limit: размер пачки
+        :return: пара (id последнего пользователя пачки или None если
+        пользователей больше нет, кол-во исправленных пользователей)
+        """
+        # блокируем строки пачки отдельным запросом, чтобы пересчет
+        # следующим запросом транзакции видел все подписки,
+        # зафиксированные до блокировки (см. reconcile_likes_count)
+        batch = await self.session.scalars(
+            select(User.id)
+            .where(User.id > after_id)
+            .order_by(User.id)
+            .limit(limit)
+            .with_for_update()
+        )
+        ids = batch.all()
+        if not ids:
+            return None, 0
+        followers = (
+            select(func.count(Follower.id))
+            .where(Follower.user_id_following == User.id)
+            .scalar_subquery()
+        )
+        following = (
+            select(func.count(Follower.id))
+            .where(Follower.user_id_follower == User.id)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(User)
+            .where(
+                User.id.in_(ids),
+                or_(
+                    User.followers_count != followers,
+                    User.following_count != following,
+                ),
+            )
+            .values(followers_count=followers, following_count=following)
+            .returning(User.id)
+        )
+        res = await self.session.execute(stmt)
+        return ids[-1], len(res.all())
@@ -0,0 +1,42 @@
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class MediaBlobSchemaModel(BaseModel):
+    id: int = Field(
+        ..., title="id тела медиафайла", description="id тела медиафайла", gt=0
+    )
+    key: str = Field(
+        ...,
+        title="Ключ тела медиафайла в хранилище (SHA-256)",
+        description="Ключ тела медиафайла в хранилище (SHA-256)",
+    )
+    size: int | None = Field(
+        None,
+        title="Размер тела медиафайла в байтах",
+        description="Размер тела медиафайла в байтах",
+    )
+    ref_count: int = Field(
+        ...,
+        title="Кол-во медиафайлов ссылающихся на тело",
+        description="Кол-во медиафайлов ссылающихся на тело",
+    )
+    width: int | None = Field(
+        None,
+        title="Ширина изображения в пикселях",
+        description="Ширина изображения в пикселях",
+    )
+    height: int | None = Field(
+        None,
+        title="Высота изображения в пикселях",
+        description="Высота изображения в пикселях",
+    )
+    mime_type: str | None = Field(
+        None, title="MIME-тип медиафайла", description="MIME-тип медиафайла"
+    )
+    placeholder: str | None = Field(
+        None,
+        title="Заглушка изображения (data URI крошечной копии)",
+        description="Заглушка изображения (data URI крошечной копии)",
+    )
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Literal
 
 from pydantic import BaseModel, ConfigDict, Field
@@ -20,23 +21,31 @@ class MediaSchemaAddModel(BaseModel):
         title="Имя медиафайла",
         description="Ммя медиафайла",
     )
-    file_body: bytes = Field(
-        ...,
-        title="Медиафайл",
-        description="Медиафайл",
+    file_key: str | None = Field(
+        None,
+        title="Ключ медиафайла в хранилище",
+        description="Ключ медиафайла в хранилище",
     )
-    tweet_id: int = Field(
+    tweet_id: int | None = Field(
         None,
         title="id твитта которому принадлежит медиафайл",
         description="id твитта которому принадлежит медиафайл",
     )
-
-    model_config = ConfigDict(
-        from_attributes=True, arbitrary_types_allowed=True
+    user_id: int | None = Field(
+        None,
+        title="id пользователя загрузившего медиафайл",
+        description="id пользователя загрузившего медиафайл",
     )
 
+    model_config = ConfigDict(from_attributes=True)
+
 
 class MediaSchemaModel(MediaSchemaAddModel):
     id: int = Field(
         ..., title="id медиафайла", description="id медиафайла", gt=0
     )
+    created_at: datetime | None = Field(
+        None,
+        title="Дата и время загрузки медиафайла",
+        description="Дата и время загрузки медиафайла",
+    )
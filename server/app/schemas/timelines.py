@@ -0,0 +1,24 @@
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class TimelineSchemaAddModel(BaseModel):
+    user_id: int = Field(
+        ...,
+        title="id пользователя владельца ленты",
+        description="id пользователя владельца ленты",
+        gt=0,
+    )
+    tweet_id: int = Field(
+        ...,
+        title="id твитта в ленте",
+        description="id твитта в ленте",
+        gt=0,
+    )
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class TimelineSchemaModel(TimelineSchemaAddModel):
+    id: int = Field(
+        ..., title="id записи ленты", description="id записи ленты", gt=0
+    )
@@ -1,9 +1,23 @@
+from enum import Enum
 from typing import Literal
 
 from pydantic import BaseModel, ConfigDict, Field
 from schemas.users import UserSchemaLike, UserSchemaSimple
 
 
+class TweetFeedMode(str, Enum):
+    """
+    Режимы ленты твиттов
+    """
+
+    # все твитты от новых к старым
+    all = "all"
+    # твитты читаемых пользователей по убыванию кол-ва лайков
+    popular = "popular"
+    # свои твитты и твитты читаемых пользователей от новых к старым
+    timeline = "timeline"
+
+
 class TweetSchemaAddRequest(BaseModel):
     tweet_data: str = Field(
         ...,
@@ -28,6 +42,35 @@ class TweetSchemaAddResponse(BaseModel):
     )
 
 
+class TweetAttachmentSchema(BaseModel):
+    url: str = Field(
+        ..., title="Ссылка на медиафайл", description="Ссылка на медиафайл"
+    )
+    thumb_url: str = Field(
+        ...,
+        title="Ссылка на миниатюру медиафайла",
+        description="Ссылка на миниатюру медиафайла",
+    )
+    width: int | None = Field(
+        None,
+        title="Ширина изображения в пикселях",
+        description="Ширина изображения в пикселях",
+    )
+    height: int | None = Field(
+        None,
+        title="Высота изображения в пикселях",
+        description="Высота изображения в пикселях",
+    )
+    mime_type: str | None = Field(
+        None, title="MIME-тип медиафайла", description="MIME-тип медиафайла"
+    )
+    placeholder: str | None = Field(
+        None,
+        title="Заглушка изображения (data URI крошечной копии)",
+        description="Заглушка изображения (data URI крошечной копии)",
+    )
+
+
 class TweetSchema(BaseModel):
     id: int = Field(..., title="id твитта", description="id твитта", gt=0)
     content: str = Field(
@@ -40,6 +83,12 @@ class TweetSchema(BaseModel):
         title="Список ссылок на медиафайлы твитта",
         description="Список ссылок на медиафайлы твитта",
     )
+    attachments_meta: list[TweetAttachmentSchema] = Field(
+        [],
+        title="Список метаданных медиафайлов твитта",
+        description="Список метаданных медиафайлов твитта "
+        "(в том же порядке что и ссылки в attachments)",
+    )
     author: UserSchemaSimple = Field(
         ...,
         title="Объект с данными автора твитта",
@@ -48,7 +97,21 @@ class TweetSchema(BaseModel):
     likes: list[UserSchemaLike] = Field(
         ...,
         title="Список объектов с данными лайков на твитт",
-        description="Список объектов с данными лайков на твитт",
+        description="Список объектов с данными лайков на твитт "
+        "(в компактном режиме - первые лайкнувшие пользователи, "
+        "полный список - GET /api/tweets/{id}/likes)",
+    )
+    likes_count: int | None = Field(
+        None,
+        title="Кол-во лайков на твитт",
+        description="Кол-во лайков на твитт (только в компактном режиме)",
+        ge=0,
+    )
+    liked_by_me: bool | None = Field(
+        None,
+        title="Признак лайка текущего пользователя",
+        description="Признак лайка текущего пользователя "
+        "(только в компактном режиме)",
     )
 
 
@@ -63,6 +126,32 @@ class TweetSchemaResponse(BaseModel):
         title="Список объектов с данными твиттов",
         description="Список объектов с данными твиттов",
     )
+    next_cursor: str | None = Field(
+        None,
+        title="Курсор следующей страницы",
+        description="Курсор следующей страницы "
+        "(null если страница последняя)",
+    )
+
+
+class TweetLikesSchemaResponse(BaseModel):
+    result: Literal[True] = Field(
+        ...,
+        title="Положительный статус запроса",
+        description="Положительный статус запроса",
+    )
+    likes: list[UserSchemaLike] = Field(
+        ...,
+        title="Список объектов с данными лайков на твитт",
+        description="Список объектов с данными лайков на твитт "
+        "(по возрастанию id пользователя)",
+    )
+    next_cursor: str | None = Field(
+        None,
+        title="Курсор следующей страницы",
+        description="Курсор следующей страницы "
+        "(null если страница последняя)",
+    )
 
 
 class TweetSchemaAddModel(BaseModel):
@@ -1,8 +1,18 @@
+from enum import Enum
 from typing import Literal
 
 from pydantic import BaseModel, ConfigDict, Field
 
 
+class UserFollowList(str, Enum):
+    """
+    Списки подписок пользователя
+    """
+
+    followers = "followers"
+    following = "following"
+
+
 class UserSchemaSimple(BaseModel):
     id: int = Field(
         ..., title="id пользователя", description="id пользователя", gt=0
@@ -42,18 +52,42 @@ class UserSchema(BaseModel):
     )
     followers: list[UserSchemaSimple] = Field(
         ...,
-        title="Список объектов с данными пользователей "
+        title="Первая страница списка пользователей "
         "подписанных на данного пользователя",
-        description="Список объектов с данными пользователей "
+        description="Первая страница списка пользователей "
         "подписанных на данного пользователя",
     )
     following: list[UserSchemaSimple] = Field(
         ...,
-        title="Список объектов с данными пользователей на "
+        title="Первая страница списка пользователей на "
         "которых подписан данный пользователь",
-        description="Список объектов с данными пользователей на "
+        description="Первая страница списка пользователей на "
         "которых подписан данный пользователь",
     )
+    followers_count: int = Field(
+        ...,
+        title="Кол-во подписчиков пользователя",
+        description="Кол-во подписчиков пользователя",
+        ge=0,
+    )
+    following_count: int = Field(
+        ...,
+        title="Кол-во пользователей на которых подписан пользователь",
+        description="Кол-во пользователей на которых подписан пользователь",
+        ge=0,
+    )
+    followers_next_cursor: str | None = Field(
+        None,
+        title="Курсор следующей страницы списка подписчиков",
+        description="Курсор следующей страницы списка подписчиков "
+        "(null если страница последняя)",
+    )
+    following_next_cursor: str | None = Field(
+        None,
+        title="Курсор следующей страницы списка читаемых пользователей",
+        description="Курсор следующей страницы списка читаемых "
+        "пользователей (null если страница последняя)",
+    )
 
 
 class UserSchemaResponse(BaseModel):
@@ -69,6 +103,25 @@ class UserSchemaResponse(BaseModel):
     )
 
 
+class UserSchemaListResponse(BaseModel):
+    result: Literal[True] = Field(
+        ...,
+        title="Положительный статус запроса",
+        description="Положительный статус запроса",
+    )
+    users: list[UserSchemaSimple] = Field(
+        ...,
+        title="Страница списка пользователей",
+        description="Страница списка пользователей",
+    )
+    next_cursor: str | None = Field(
+        None,
+        title="Курсор следующей страницы",
+        description="Курсор следующей страницы "
+        "(null если страница последняя)",
+    )
+
+
 class UserSchemaAddModel(BaseModel):
     name: str = Field(
         ...,
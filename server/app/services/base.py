@@ -8,7 +8,7 @@ class BaseService:
     """
 
     def __init__(self, repo: AbstractRepository):
-        self.repo: AbstractRepository = repo()
+        self.repo: AbstractRepository = repo
 
     async def count(self):
         """
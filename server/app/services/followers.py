@@ -1,6 +1,12 @@
+from typing import AsyncIterator
+
+from config import setting
 from schemas.followers import FollowerSchemaAddModel, FollowerSchemaModel
+from schemas.users import UserFollowList
 from services.base import BaseService
+from services.tweets import get_owner_tags, invalidate_feeds, record_writes
 from utils.exceptions import DatabaseException
+from utils.pagination import get_next_page
 from utils.repository import AbstractRepository
 
 
@@ -13,15 +19,19 @@ class FollowerService(BaseService):
     def __init__(self, follower_repo: AbstractRepository):
         super().__init__(follower_repo)
 
-    async def add_following(self, following: FollowerSchemaAddModel) -> int:
+    async def add_following(
+        self, following: FollowerSchemaAddModel
+    ) -> int | None:
         """
         Метод создает подписку на другого пользователя в БД
         :param following: объект с данными для подписки
         :return: id новой подписки если
-        операция прошла успешно, иначе None
+        операция прошла успешно, иначе None (подписка уже есть)
         """
         try:
-            return await self.repo.add_one(following.model_dump())
+            return await self.repo.add_one_or_ignore(
+                following.model_dump(), constraint="_user_follower_uc"
+            )
         except Exception:
             raise DatabaseException(
                 message=f"Ошибка при добавлении данных подписки на"
@@ -73,3 +83,137 @@ class FollowerService(BaseService):
                 f"пользователя с id={user_id_follower} на"
                 f"пользователя с id={user_id_following} из БД."
             )
+
+    async def follow(
+        self, user_id_follower: int, user_id_following: int
+    ) -> tuple[bool, bool]:
+        """
+        Метод создает подписку на другого пользователя одним запросом к БД
+        (подписка на себя и повторная подписка игнорируются)
+        :param user_id_follower: id пользователя подписывающего
+        :param user_id_following: id пользователя подписываемого
+        :return: пара (пользователь существует, подписка добавлена)
+        """
+        try:
+            found, created = await self.repo.add_following_to_user(
+                user_id_follower, user_id_following
+            )
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при добавлении данных подписки на "
+                f"пользователя с id={user_id_following} в БД."
+            )
+        if created:
+            # меняется состав ленты подписчика
+            invalidate_feeds(self.repo, *get_owner_tags([user_id_follower]))
+            record_writes(
+                self.repo,
+                ("user", user_id_follower),
+                ("profile", user_id_follower),
+                ("profile", user_id_following),
+            )
+        return found, created
+
+    async def unfollow(
+        self, user_id_follower: int, user_id_following: int
+    ) -> tuple[bool, bool]:
+        """
+        Метод удаляет подписку на другого пользователя одним запросом к БД
+        :param user_id_follower: id пользователя подписывающего
+        :param user_id_following: id пользователя подписываемого
+        :return: пара (пользователь существует, подписка удалена)
+        """
+        try:
+            found, deleted = await self.repo.delete_following_from_user(
+                user_id_follower, user_id_following
+            )
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при удалении данных подписки на "
+                f"пользователя с id={user_id_following} из БД."
+            )
+        if deleted:
+            # меняется состав ленты подписчика
+            invalidate_feeds(self.repo, *get_owner_tags([user_id_follower]))
+            record_writes(
+                self.repo,
+                ("user", user_id_follower),
+                ("profile", user_id_follower),
+                ("profile", user_id_following),
+            )
+        return found, deleted
+
+    async def get_follow_page(
+        self,
+        user_id: int,
+        follow_list: UserFollowList,
+        limit: int,
+        after_id: int | None = None,
+    ) -> tuple[bool, list[dict], dict[str, int] | None]:
+        """
+        Метод получения страницы списка подписчиков
+        или читаемых пользователей из БД
+        :param user_id: id пользователя
+        :param follow_list: список подписчиков или читаемых пользователей
+        :param limit: кол-во пользователей на странице
+        :param after_id: id последнего пользователя предыдущей страницы
+        :return: тройка (пользователь существует, список объектов
+        с данными пользователей, позиция следующей страницы
+        или None если страница последняя)
+        """
+        try:
+            # запрашиваем на одну запись больше чтобы
+            # узнать есть ли следующая страница
+            found, users = await self.repo.find_follow_page(
+                user_id, follow_list, limit + 1, after_id=after_id
+            )
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при получении подписок пользователя "
+                f"с id={user_id} из БД."
+            )
+        users, next_position = get_next_page(users, limit)
+        return found, users, next_position
+
+    async def user_exists(self, user_id: int) -> bool:
+        """
+        Метод проверяет существование пользователя в БД
+        :param user_id: id пользователя
+        :return: True если пользователь существует
+        """
+        try:
+            return await self.repo.user_exists(user_id)
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при получении данных пользователя "
+                f"с id={user_id} из БД."
+            )
+
+    async def stream_follow_list(
+        self,
+        user_id: int,
+        follow_list: UserFollowList,
+        after_id: int | None = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Метод чтения списка подписчиков или читаемых пользователей
+        из БД целиком (начиная с позиции) через курсор на стороне БД,
+        пользователи читаются пачками и в память целиком не загружаются
+        :param user_id: id пользователя
+        :param follow_list: список подписчиков или читаемых пользователей
+        :param after_id: id пользователя, после которого начинается чтение
+        :return: асинхронный итератор объектов с данными пользователей
+        """
+        try:
+            async for user in self.repo.stream_follow_list(
+                user_id,
+                follow_list,
+                setting.STREAM_BATCH_SIZE,
+                after_id=after_id,
+            ):
+                yield user
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при чтении подписок пользователя "
+                f"с id={user_id} из БД."
+            )
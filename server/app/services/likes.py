@@ -1,6 +1,10 @@
+from config import setting
 from schemas.likes import LikeSchemaAddModel, LikeSchemaModel
 from services.base import BaseService
+from services.tweets import get_tweet_tags, invalidate_feeds, record_writes
 from utils.exceptions import DatabaseException
+from utils.like_batcher import like_batcher
+from utils.pagination import get_next_page
 from utils.repository import AbstractRepository
 
 
@@ -57,10 +61,12 @@ class LikeService(BaseService):
         """
         Метод добавления лайка к твитту в БД
         :param like: объект с информацией о новом лайке
-        :return: id нового лайка или None если операция не прошла
+        :return: id нового лайка или None если лайк уже был
         """
         try:
-            return await self.repo.add_one(like.model_dump())
+            return await self.repo.add_one_or_ignore(
+                like.model_dump(), constraint="user_tweet_uc"
+            )
         except Exception:
             raise DatabaseException(
                 message="При добавлении данных лайка в БД произошла ошибка."
@@ -82,3 +88,101 @@ class LikeService(BaseService):
             raise DatabaseException(
                 message="При удалении данных лайка из БД произошла ошибка."
             )
+
+    async def get_likes_page(
+        self, tweet_id: int, limit: int, after_user_id: int | None = None
+    ) -> tuple[bool, list[dict], dict[str, int] | None]:
+        """
+        Метод получения страницы списка лайкнувших твитт
+        пользователей из БД
+        :param tweet_id: id твитта
+        :param limit: кол-во пользователей на странице
+        :param after_user_id: id последнего пользователя
+        предыдущей страницы
+        :return: тройка (твитт существует, список объектов
+        с данными пользователей, позиция следующей страницы
+        или None если страница последняя)
+        """
+        try:
+            # запрашиваем на одну запись больше чтобы
+            # узнать есть ли следующая страница
+            found, likes = await self.repo.find_likes_page(
+                tweet_id, limit + 1, after_user_id=after_user_id
+            )
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при получении лайков твитта "
+                f"с id={tweet_id} из БД."
+            )
+        likes, next_position = get_next_page(likes, limit, key="user_id")
+        return found, likes, next_position
+
+    async def like_tweet(
+        self, tweet_id: int, user_id: int
+    ) -> tuple[bool, bool | None]:
+        """
+        Метод ставит лайк твитту одним запросом к БД
+        (лайк на свой твитт и повторный лайк игнорируются),
+        в режиме отложенной записи лайк ставится в очередь
+        :param tweet_id: id твитта
+        :param user_id: id пользователя
+        :return: пара (твитт существует, лайк добавлен
+        или None если лайк поставлен в очередь)
+        """
+        try:
+            if setting.LIKES_BATCH_ENABLED:
+                return await self._submit(tweet_id, user_id, liked=True)
+            found, created = await self.repo.add_like_to_tweet(
+                tweet_id, user_id
+            )
+        except Exception:
+            raise DatabaseException(
+                message="При добавлении данных лайка в БД произошла ошибка."
+            )
+        if created:
+            invalidate_feeds(self.repo, *get_tweet_tags([tweet_id]))
+            record_writes(self.repo, ("user", user_id))
+        return found, created
+
+    async def unlike_tweet(
+        self, tweet_id: int, user_id: int
+    ) -> tuple[bool, bool | None]:
+        """
+        Метод снимает лайк с твитта одним запросом к БД,
+        в режиме отложенной записи снятие лайка ставится в очередь
+        :param tweet_id: id твитта
+        :param user_id: id пользователя
+        :return: пара (твитт существует, лайк удален
+        или None если снятие лайка поставлено в очередь)
+        """
+        try:
+            if setting.LIKES_BATCH_ENABLED:
+                return await self._submit(tweet_id, user_id, liked=False)
+            found, deleted = await self.repo.delete_like_from_tweet(
+                tweet_id, user_id
+            )
+        except Exception:
+            raise DatabaseException(
+                message="При удалении данных лайка из БД произошла ошибка."
+            )
+        if deleted:
+            invalidate_feeds(self.repo, *get_tweet_tags([tweet_id]))
+            record_writes(self.repo, ("user", user_id))
+        return found, deleted
+
+    async def _submit(
+        self, tweet_id: int, user_id: int, liked: bool
+    ) -> tuple[bool, None]:
+        """
+        Метод ставит в очередь отложенной записи намерение поставить
+        или снять лайк (после проверки существования твитта
+        запросом на чтение, без записи в БД)
+        :param tweet_id: id твитта
+        :param user_id: id пользователя
+        :param liked: True - поставить лайк, False - снять
+        :return: пара (твитт существует, None)
+        """
+        found = await self.repo.tweet_exists(tweet_id)
+        if found:
+            like_batcher.submit(tweet_id, user_id, liked)
+        return found, None
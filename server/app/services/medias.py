@@ -1,8 +1,49 @@
-from fastapi import UploadFile
-from schemas.medias import MediaSchemaAddModel, MediaSchemaModel
+import asyncio
+import mimetypes
+from typing import AsyncIterator
+
+from config import setting
+from fastapi import UploadFile, status
+from PIL.Image import DecompressionBombError
+from schemas.medias import MediaSchemaModel
 from services.base import BaseService
-from utils.exceptions import DatabaseException
+from utils.cache import ByteLRUCache, TTLCache
+from utils.exceptions import ClientHTTPException, DatabaseException
+from utils.images import (
+    MEDIA_VARIANTS,
+    probe_image,
+    render_variant,
+    run_in_process_pool,
+)
 from utils.repository import AbstractRepository
+from utils.storage import AbstractMediaStorage, get_variant_key, media_storage
+
+# кэш данных медиафайлов по id (имя и ключ файла после загрузки
+# не меняются, TTL ограничивает время жизни удаленных медиафайлов)
+media_meta_cache = TTLCache(
+    maxsize=setting.MEDIA_CACHE_META_MAXSIZE,
+    ttl=setting.MEDIA_CACHE_META_TTL,
+)
+# кэш тел небольших часто запрашиваемых файлов хранилища по ключу
+# (ключ - хеш содержимого, поэтому записи не устаревают)
+media_body_cache = ByteLRUCache(
+    maxbytes=setting.MEDIA_CACHE_MAX_BYTES,
+    max_item_size=setting.MEDIA_CACHE_MAX_ITEM_SIZE,
+    name="media_cache",
+)
+
+
+def raise_media_too_large():
+    """
+    Функция выдает исключение о превышении
+    максимально допустимого размера медиафайла
+    :return:
+    """
+    raise ClientHTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Размер медиафайла превышает "
+        f"{setting.MEDIA_MAX_SIZE} байт.",
+    )
 
 
 class MediaService(BaseService):
@@ -11,25 +52,119 @@ class MediaService(BaseService):
     для операций с медиа
     """
 
-    def __init__(self, media_repo: AbstractRepository):
+    def __init__(
+        self,
+        media_repo: AbstractRepository,
+        storage: AbstractMediaStorage = media_storage,
+    ):
         super().__init__(media_repo)
+        self.storage = storage
 
-    async def add_media(self, file: UploadFile) -> int:
+    @staticmethod
+    async def _read_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+        """
+        Метод читает медиафайл по частям с проверкой
+        максимально допустимого размера файла
+        :param file: медиафайл
+        :return: асинхронный итератор частей медиафайла
         """
-        Метод позволяет добавить новый медиафайл в БД
+        size = 0
+        while chunk := await file.read(setting.MEDIA_CHUNK_SIZE):
+            size += len(chunk)
+            if size > setting.MEDIA_MAX_SIZE:
+                raise_media_too_large()
+            yield chunk
+
+    async def add_media(
+        self, file: UploadFile, user_id: int | None = None
+    ) -> tuple[int, str]:
+        """
+        Метод позволяет добавить новый медиафайл: тело файла
+        по частям сохраняется в хранилище, в БД записывается его ключ
+        (одинаковые по содержимому тела хранятся один раз)
         :param file: новый медиафайл
-        :return: id нового медиафайла
+        :param user_id: id пользователя загружающего медиафайл
+        :return: пара (id нового медиафайла, ключ файла в хранилище)
         """
+        # размер уже принятого файла известен заранее
+        if file.size is not None and file.size > setting.MEDIA_MAX_SIZE:
+            raise_media_too_large()
         try:
-            new_media_dict = MediaSchemaAddModel(
-                file_name=file.filename, file_body=file.file.read()
-            ).model_dump()
-            return await self.repo.add_one(new_media_dict)
+            async with self.storage.stage(self._read_chunks(file)) as staged:
+                # метаданные вычисляем один раз для каждого нового тела
+                meta = None
+                if await self.repo.find_blob(staged.key) is None:
+                    meta = await self.get_media_meta(
+                        file.filename, staged.path
+                    )
+                media_id = await self.repo.add_media(
+                    file_name=file.filename,
+                    file_key=staged.key,
+                    file_size=staged.size,
+                    meta=meta,
+                    user_id=user_id,
+                )
+                # файл переносится в хранилище только после фиксации
+                # транзакции (на запись о теле медиафайла уже ссылается
+                # медиафайл, поэтому сборщик мусора его не удалит),
+                # при откате файл удаляется и не остается в хранилище
+                # без записи в БД. Если процесс упадет между фиксацией
+                # и переносом, временный файл перенесет сборщик мусора
+                self.repo.on_commit(
+                    lambda: asyncio.to_thread(
+                        self.storage.commit_staged, staged
+                    )
+                )
+                self.repo.on_rollback(
+                    lambda: asyncio.to_thread(
+                        self.storage.discard_staged, staged
+                    )
+                )
+            return media_id, staged.key
+        except ClientHTTPException:
+            raise
         except Exception:
             raise DatabaseException(
                 message="Ошибка при добавлении медиафайла в БД."
             )
 
+    @staticmethod
+    async def get_media_meta(file_name: str, path: str) -> dict[str, any]:
+        """
+        Метод вычисляет в пуле процессов метаданные медиафайла:
+        размеры изображения, MIME-тип и заглушку для ленты
+        :param file_name: имя медиафайла
+        :param path: путь к файлу
+        :return: словарь с метаданными медиафайла
+        """
+        meta = await run_in_process_pool(probe_image, path)
+        # файл не является изображением
+        if meta is None:
+            meta = {"mime_type": mimetypes.guess_type(file_name)[0]}
+        return meta
+
+    async def add_media_variants(self, file_key: str) -> None:
+        """
+        Метод создает уменьшенные копии изображения (миниатюры) в пуле
+        процессов и сохраняет их в хранилище рядом с исходным файлом,
+        вызывается в фоне после загрузки медиафайла
+        :param file_key: ключ исходного файла в хранилище
+        :return:
+        """
+        for size, max_side in MEDIA_VARIANTS.items():
+            variant = size.value
+            # такой же файл уже загружали, копия уже есть
+            if await self.storage.exists(get_variant_key(file_key, variant)):
+                continue
+            try:
+                data = await run_in_process_pool(
+                    render_variant, self.storage.get_path(file_key), max_side
+                )
+            except (OSError, ValueError, DecompressionBombError):
+                # файл не является изображением, отдается только исходный
+                return
+            await self.storage.save_variant(file_key, variant, data)
+
     async def get_media_by_id(self, id: int) -> MediaSchemaModel | None:
         """
         Метод позволяет получить данные медиафайла из БД по id
@@ -37,29 +172,64 @@ class MediaService(BaseService):
         :return: объект с данными медиафайла или
         None если медиафайла в БД нет
         """
+        media = media_meta_cache.get(id)
+        if media is not None:
+            return media
         try:
             media = await self.repo.find_one_or_none(id=id)
-            if media:
-                return media.to_read_model()
-            return None
         except Exception:
             raise DatabaseException(
                 message=f"Ошибка при получении медиафайла с id={id} из БД."
             )
+        if media is None:
+            return None
+        media = media.to_read_model()
+        media_meta_cache.set(id, media)
+        return media
 
-    async def add_tweet_id_for_medias(
-        self, ids: list[int], tweet_id: int
-    ) -> bool:
+    async def get_media_file(self, file_key: str) -> bytes | None:
         """
-        Метод позволяет добавить списку медиафайлов
-        в БД id твитта которому они принадлежат
-        :param ids: список id медиафайлов
-        :param tweet_id: id твитта
-        :return: True если операция успешна, иначе False
+        Метод позволяет получить тело небольшого файла из хранилища
+        через кэш в памяти процесса, большие файлы в кэш не попадают
+        и отдаются с диска по частям
+        :param file_key: ключ файла в хранилище
+        :return: тело файла или None если файл слишком большой для кэша
+        """
+        body = media_body_cache.get(file_key)
+        if body is not None:
+            return body
+        if not media_body_cache.admits(await self.storage.get_size(file_key)):
+            return None
+        body = await self.storage.read(file_key)
+        media_body_cache.set(file_key, body)
+        return body
+
+    @staticmethod
+    def invalidate_cache(ids: list[int] | None = None) -> None:
+        """
+        Метод удаляет данные медиафайлов из кэша
+        (при удалении медиафайлов)
+        :param ids: список id медиафайлов,
+        если не передан - кэши очищаются полностью
+        :return:
+        """
+        if ids is None:
+            media_meta_cache.clear()
+            media_body_cache.clear()
+            return
+        for id in ids:
+            media_meta_cache.delete(id)
+
+    async def get_media_body_by_id(self, id: int) -> bytes | None:
+        """
+        Метод позволяет получить тело медиафайла,
+        которое еще не перенесено из БД в хранилище
+        :param id: id медиафайла
+        :return: тело медиафайла или None
         """
         try:
-            return await self.repo.update_all_by_ids(ids, tweet_id=tweet_id)
+            return await self.repo.find_file_body(id)
         except Exception:
             raise DatabaseException(
-                message="Ошибка при добавлении id твита в медиафайлы в БД."
+                message=f"Ошибка при получении медиафайла с id={id} из БД."
             )
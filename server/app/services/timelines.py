@@ -0,0 +1,103 @@
+from config import setting
+from services.base import BaseService
+from utils.exceptions import DatabaseException
+from utils.repository import AbstractRepository
+
+
+class TimelineService(BaseService):
+    """
+    Класс предоставляет сервис работы с БД для материализованных
+    лент пользователей (fan-out-on-write).
+    Твитты авторов, у которых в момент публикации подписчиков больше
+    TIMELINE_FANOUT_MAX_FOLLOWERS, в ленты подписчиков не рассылаются,
+    помечаются (Tweet.fanned_out) и добавляются в ленту при чтении
+    (fan-out-on-read). Ленты для уже существующих данных заполняются
+    командой utils.backfill_timelines
+    """
+
+    def __init__(self, timeline_repo: AbstractRepository):
+        super().__init__(timeline_repo)
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """
+        Метод проверяет включены ли материализованные ленты
+        :return: True если включены, иначе False
+        """
+        return setting.TIMELINE_FANOUT_ENABLED
+
+    async def is_fan_out_author(self, author_id: int) -> bool:
+        """
+        Метод проверяет рассылаются ли твитты автора
+        в ленты его подписчиков при записи
+        :param author_id: id автора
+        :return: True если рассылаются, иначе False
+        """
+        followers_count = await self.repo.count_followers(author_id)
+        return followers_count <= setting.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+    async def push_tweet(self, tweet_id: int, author_id: int) -> None:
+        """
+        Метод добавляет новый твитт в ленты автора и его подписчиков
+        :param tweet_id: id твитта
+        :param author_id: id автора твитта
+        :return:
+        """
+        if not self.is_enabled():
+            return
+        try:
+            await self.repo.add_tweet(
+                tweet_id,
+                author_id,
+                fan_out=await self.is_fan_out_author(author_id),
+            )
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при добавлении твитта с id={tweet_id} "
+                f"в ленты пользователей в БД."
+            )
+
+    async def add_following_tweets(
+        self, user_id: int, user_id_following: int
+    ) -> None:
+        """
+        Метод добавляет в ленту пользователя последние разосланные
+        твитты пользователя, на которого он подписался
+        (неразосланные твитты добавляются в ленту при чтении)
+        :param user_id: id пользователя подписывающего
+        :param user_id_following: id пользователя подписываемого
+        :return:
+        """
+        if not self.is_enabled():
+            return
+        try:
+            await self.repo.add_author_tweets(
+                user_id,
+                user_id_following,
+                limit=setting.TIMELINE_BACKFILL_LIMIT,
+            )
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при добавлении твиттов пользователя "
+                f"с id={user_id_following} в ленту в БД."
+            )
+
+    async def delete_following_tweets(
+        self, user_id: int, user_id_following: int
+    ) -> None:
+        """
+        Метод удаляет из ленты пользователя твитты
+        пользователя, от которого он отписался
+        :param user_id: id пользователя подписывающего
+        :param user_id_following: id пользователя подписываемого
+        :return:
+        """
+        if not self.is_enabled():
+            return
+        try:
+            await self.repo.delete_author_tweets(user_id, user_id_following)
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при удалении твиттов пользователя "
+                f"с id={user_id_following} из ленты в БД."
+            )
@@ -1,8 +1,79 @@
+from typing import AsyncIterator
+
 from config import setting
-from schemas.tweets import TweetSchema, TweetSchemaAddModel, TweetSchemaModel
+from schemas.tweets import TweetFeedMode, TweetSchemaAddModel, TweetSchemaModel
 from services.base import BaseService
+from services.medias import MediaService
+from sqlalchemy import Select
+from utils.cache import TaggedTTLCache
 from utils.exceptions import DatabaseException
 from utils.repository import AbstractRepository
+from utils.single_flight import SingleFlight, write_clock
+
+# кэш страниц лент твиттов по (режим ленты, владелец ленты, позиция
+# страницы, размер страницы), записи помечаются тегами режима, ленты
+# и твиттов страницы для точечного удаления при изменениях
+feed_cache = TaggedTTLCache(
+    maxsize=setting.FEED_CACHE_MAXSIZE,
+    ttl=setting.FEED_CACHE_TTL,
+    name="feed_cache",
+)
+feed_flight = SingleFlight(name="feed_single_flight")
+
+
+def invalidate_feeds(repo: AbstractRepository, *tags: tuple) -> None:
+    """
+    Функция удаляет из кэша страницы лент с любым из тегов сразу
+    и повторно после фиксации транзакции, чтобы в кэше не осталось
+    страниц, прочитанных параллельными запросами до фиксации
+    :param repo: репозиторий, в транзакции которого идут изменения
+    :param tags: теги страниц лент
+    :return:
+    """
+    feed_cache.invalidate(*tags)
+    repo.on_commit(lambda: feed_cache.invalidate(*tags))
+
+
+def record_writes(repo: AbstractRepository, *keys: tuple) -> None:
+    """
+    Функция отмечает запись по ключам после фиксации транзакции,
+    чтобы чтения после нее не получили результат объединенного
+    запроса, начатого до записи
+    :param repo: репозиторий, в транзакции которого идут изменения
+    :param keys: ключи записи (("user", id автора записи),
+    ("profile", id пользователя, профиль которого меняется))
+    :return:
+    """
+    repo.on_commit(lambda: write_clock.touch(*keys))
+
+
+def get_tweet_tags(tweet_ids: list[int], ranked: bool = True) -> list[tuple]:
+    """
+    Функция возвращает теги страниц лент, которые меняются при изменении
+    лайков твиттов: страницы с этими твиттами и, если меняется порядок
+    твиттов, все страницы ленты популярных твиттов
+    :param tweet_ids: список id твиттов
+    :param ranked: флаг изменения кол-ва лайков твиттов
+    :return: список тегов
+    """
+    tags = [("tweet", tweet_id) for tweet_id in tweet_ids]
+    if ranked:
+        tags.append(("mode", TweetFeedMode.popular.value))
+    return tags
+
+
+def get_owner_tags(user_ids: list[int]) -> list[tuple]:
+    """
+    Функция возвращает теги персональных лент пользователей
+    (меняются при изменении подписок и новых твиттах читаемых)
+    :param user_ids: список id пользователей
+    :return: список тегов
+    """
+    return [
+        ("feed", mode.value, user_id)
+        for user_id in user_ids
+        for mode in (TweetFeedMode.popular, TweetFeedMode.timeline)
+    ]
 
 
 class TweetService(BaseService):
@@ -13,60 +84,235 @@ class TweetService(BaseService):
     def __init__(self, tweet_repo: AbstractRepository):
         super().__init__(tweet_repo)
 
-    async def add_tweet(self, tweet: TweetSchemaAddModel) -> int | None:
+    async def add_tweet(
+        self, tweet: TweetSchemaAddModel, media_ids: list[int] | None = None
+    ) -> int | None:
         """
-        Метод добавления твитта в БД
+        Метод добавления твитта в БД вместе с прикреплением
+        медиафайлов (одним запросом)
         :param tweet: объект с данными твитта
+        :param media_ids: список id медиафайлов твитта
         :return: id нового твитта
         """
         try:
-            return await self.repo.add_one(tweet.model_dump())
+            tweet_id = await self.repo.add_tweet_with_medias(
+                tweet.user_id, tweet.content, media_ids or []
+            )
+            # новый твитт попадает в общую ленту и в ленты автора
+            # и его подписчиков (из тех, чьи ленты есть в кэше)
+            version = feed_cache.version
+            owners = [
+                tag[2] for tag in feed_cache.tags("feed") if tag[2] is not None
+            ]
+            followers = (
+                await self.repo.find_followers_among(tweet.user_id, owners)
+                if owners
+                else []
+            )
         except Exception:
             raise DatabaseException(
                 message="Ошибка при добавлении твитта в БД."
             )
+        invalidate_feeds(
+            self.repo,
+            ("mode", TweetFeedMode.all.value),
+            *get_owner_tags([tweet.user_id, *followers]),
+        )
+        record_writes(self.repo, ("user", tweet.user_id))
+        # ленты, попавшие в кэш после выбора подписчиков или еще
+        # читаемые, могли быть прочитаны до фиксации твитта, а подписаны
+        # ли их владельцы на автора неизвестно, поэтому после фиксации
+        # удаляем их все
+        self.repo.on_commit(
+            lambda: feed_cache.invalidate_kind("feed", since=version)
+        )
+        return tweet_id
+
+    async def get_tweets_full_info(
+        self,
+        limit: int,
+        after: dict[str, int] | None = None,
+        mode: TweetFeedMode = TweetFeedMode.all,
+        user_id: int | None = None,
+        compact: bool = False,
+    ) -> tuple[list[dict], dict[str, int] | None]:
+        """
+        Метод получения страницы ленты твиттов из БД через кэш
+        (одинаковые параллельные запросы объединяются).
+        Страница целиком (ссылки на медиафайлы, автор, лайки)
+        собирается в БД одним запросом
+        :param limit: кол-во твиттов на странице
+        :param after: позиция последнего твитта предыдущей страницы
+        :param mode: режим ленты (all - все твитты от новых к старым,
+        popular - твитты читаемых пользователей по убыванию популярности,
+        timeline - свои твитты и твитты читаемых пользователей
+        от новых к старым)
+        :param user_id: id пользователя для которого строится лента
+        :param compact: флаг компактного режима (вместо полного списка
+        лайкнувших пользователей - кол-во лайков, признак лайка
+        пользователя и первые лайкнувшие пользователи)
+        :return: список объектов в данными твитта и позиция
+        следующей страницы (None если страница последняя)
+        """
+        after = after or {}
+        # общая лента одинакова для всех пользователей,
+        # а в компактном режиме зависит от признака лайка пользователя
+        owner = None if mode == TweetFeedMode.all else user_id
+        viewer = user_id if compact else None
+        key = (
+            mode.value,
+            owner,
+            tuple(sorted(after.items())),
+            limit,
+            compact,
+            viewer,
+        )
+        page = feed_cache.get(key)
+        if page is not None:
+            return page
+        # при промахе кэша одинаковые параллельные запросы
+        # ждут одного запроса к БД, если он начат после последней
+        # записи пользователя (иначе пользователь не увидит свою запись)
+        return await feed_flight.run(
+            key,
+            lambda: self._find_feed_page(
+                key, limit, after, mode, user_id, compact
+            ),
+            after=(
+                write_clock.last(("user", user_id))
+                if user_id is not None
+                else None
+            ),
+        )
 
-    async def get_tweets_full_info(self) -> list[TweetSchema]:
+    async def _find_feed_page(
+        self,
+        key: tuple,
+        limit: int,
+        after: dict[str, int],
+        mode: TweetFeedMode,
+        user_id: int | None,
+        compact: bool,
+    ) -> tuple[list[dict], dict[str, int] | None]:
         """
-        Метод получения списка твиттов из БД
-        :return: список объектов в данными твитта
+        Метод получения страницы ленты твиттов из БД
+        с сохранением ее в кэш
+        :param key: ключ страницы в кэше
+        :param limit: кол-во твиттов на странице
+        :param after: позиция последнего твитта предыдущей страницы
+        :param mode: режим ленты
+        :param user_id: id пользователя для которого строится лента
+        :param compact: флаг компактного режима
+        :return: список объектов в данными твитта и позиция
+        следующей страницы (None если страница последняя)
         """
+        # страница не сохранится в кэш, если ее успеют изменить
+        # (удалить из кэша) пока она читается из БД
+        version = feed_cache.version
         try:
-            tweet_models = await self.repo.find_all()
-
-            tweets = []
-            for tweet in tweet_models:
-                attachments = []
-                for media in tweet.tweet_medias:
-                    attachments.append(f"{setting.BASE_URI}/medias/{media.id}")
-                likes = []
-                for like in tweet.tweet_likes:
-                    likes.append(
-                        {
-                            "user_id": like.user_like.id,
-                            "name": like.user_like.name,
-                        }
-                    )
-                tweets.append(
-                    TweetSchema.model_validate(
-                        {
-                            "id": tweet.id,
-                            "content": tweet.content,
-                            "attachments": attachments,
-                            "author": {
-                                "id": tweet.user_tweet.id,
-                                "name": tweet.user_tweet.name,
-                            },
-                            "likes": likes,
-                        }
-                    )
-                )
-
-            return tweets
+            # запрашиваем на одну запись больше чтобы
+            # узнать есть ли следующая страница
+            tweets = await self.repo.find_feed(
+                self._select_feed_page(mode, limit + 1, after, user_id),
+                **self._get_likes_view(user_id, compact),
+            )
+
+            next_position = None
+            if len(tweets) > limit:
+                tweets = tweets[:limit]
+                next_position = {"id": tweets[-1]["id"]}
+                if "rank" in tweets[-1]:
+                    next_position["rank"] = tweets[-1]["rank"]
+            for tweet in tweets:
+                tweet.pop("rank", None)
         except Exception:
             raise DatabaseException(
                 message="Ошибка при получении списка твиттов из БД."
             )
+        owner = None if mode == TweetFeedMode.all else user_id
+        feed_cache.set(
+            key,
+            (tweets, next_position),
+            tags=(
+                ("mode", mode.value),
+                ("feed", mode.value, owner),
+                *(("tweet", tweet["id"]) for tweet in tweets),
+            ),
+            since=version,
+        )
+        return tweets, next_position
+
+    async def stream_tweets_full_info(
+        self,
+        after: dict[str, int] | None = None,
+        mode: TweetFeedMode = TweetFeedMode.all,
+        user_id: int | None = None,
+        compact: bool = False,
+    ) -> AsyncIterator[dict]:
+        """
+        Метод чтения ленты твиттов из БД целиком (начиная с позиции)
+        через курсор на стороне БД, твитты читаются пачками
+        и в память целиком не загружаются
+        :param after: позиция твитта, после которого начинается чтение
+        :param mode: режим ленты
+        :param user_id: id пользователя для которого строится лента
+        :param compact: флаг компактного режима
+        :return: асинхронный итератор объектов с данными твиттов
+        """
+        page = self._select_feed_page(mode, None, after or {}, user_id)
+        try:
+            async for tweet in self.repo.stream_feed(
+                page,
+                setting.STREAM_BATCH_SIZE,
+                **self._get_likes_view(user_id, compact),
+            ):
+                tweet.pop("rank", None)
+                yield tweet
+        except Exception:
+            raise DatabaseException(
+                message="Ошибка при чтении ленты твиттов из БД."
+            )
+
+    @staticmethod
+    def _get_likes_view(user_id: int | None, compact: bool) -> dict:
+        """
+        Метод возвращает параметры запроса ленты для вывода лайков
+        :param user_id: id пользователя для которого строится лента
+        :param compact: флаг компактного режима
+        :return: параметры запроса ленты
+        """
+        if not compact:
+            return {}
+        return {
+            "likes_limit": setting.TWEET_LIKES_PREVIEW_LIMIT,
+            "viewer_id": user_id,
+        }
+
+    def _select_feed_page(
+        self,
+        mode: TweetFeedMode,
+        limit: int | None,
+        after: dict[str, int],
+        user_id: int | None,
+    ) -> Select:
+        """
+        Метод выбирает запрос страницы ленты по режиму ленты
+        :param mode: режим ленты
+        :param limit: кол-во твиттов на странице (None - без ограничения)
+        :param after: позиция последнего твитта предыдущей страницы
+        :param user_id: id пользователя для которого строится лента
+        :return: запрос id твиттов страницы
+        """
+        if mode == TweetFeedMode.popular:
+            return self.repo.select_feed_popular(user_id, limit, after=after)
+        if mode == TweetFeedMode.timeline:
+            return self.repo.select_feed_timeline(
+                user_id,
+                limit,
+                after_id=after.get("id"),
+                materialized=setting.TIMELINE_FANOUT_ENABLED,
+            )
+        return self.repo.select_feed_all(limit, after_id=after.get("id"))
 
     async def get_tweet_by_id(self, id: int) -> TweetSchemaModel | None:
         """
@@ -104,15 +350,33 @@ class TweetService(BaseService):
                 f"и user_id={user_id} из БД."
             )
 
-    async def delete_tweet_by_id(self, id: int) -> bool:
+    async def delete_tweet_by_id(
+        self, id: int, user_id: int | None = None
+    ) -> bool:
         """
         Метод удаления твитта по id
         :param id: id твитта
+        :param user_id: id пользователя удаляющего твитт
         :return: если удаление произошло то True, иначе False
         """
         try:
-            return await self.repo.delete_all(id=id)
+            media_ids = await self.repo.find_media_ids(id)
+            result = await self.repo.delete_all(id=id)
         except Exception:
             raise DatabaseException(
                 message=f"Ошибка при удалении твитта с id={id} из БД."
             )
+        invalidate_feeds(self.repo, *get_tweet_tags([id], ranked=False))
+        # медиафайлы твитта удаляются каскадно вместе с ним
+        self.repo.on_commit(lambda: MediaService.invalidate_cache(media_ids))
+        if user_id is not None:
+            record_writes(self.repo, ("user", user_id))
+        return result
+
+    @staticmethod
+    def invalidate_cache() -> None:
+        """
+        Метод полностью очищает кэш страниц лент
+        :return:
+        """
+        feed_cache.clear()
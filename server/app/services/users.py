@@ -1,7 +1,18 @@
-from schemas.users import UserSchema, UserSchemaModel
+from config import setting
+from schemas.users import UserFollowList, UserSchemaModel
 from services.base import BaseService
+from utils.cache import TTLCache
 from utils.exceptions import DatabaseException
+from utils.pagination import get_next_page
 from utils.repository import AbstractRepository
+from utils.single_flight import SingleFlight, write_clock
+
+# кэш соответствия api_key -> id пользователя
+api_key_cache = TTLCache(
+    maxsize=setting.AUTH_CACHE_MAXSIZE, ttl=setting.AUTH_CACHE_TTL
+)
+# объединение одинаковых параллельных запросов профиля пользователя
+profile_flight = SingleFlight(name="profile_single_flight")
 
 
 class UserService(BaseService):
@@ -34,6 +45,42 @@ class UserService(BaseService):
                 f"с api_key={api_key} из БД."
             )
 
+    async def get_user_id_by_api_key(self, api_key: str) -> int | None:
+        """
+        Метод получения id пользователя по api_key.
+        Результат кэшируется в памяти процесса, поэтому
+        повторная аутентификация не обращается к БД
+        :param api_key: api_key пользователя
+        :return: id пользователя в случае успешной операции, иначе None
+        """
+        user_id = api_key_cache.get(api_key)
+        if user_id is not None:
+            return user_id
+        try:
+            user_id = await self.repo.find_id_by_api_key(api_key)
+        except Exception:
+            raise DatabaseException(
+                message=f"Ошибка при получении данных пользователя "
+                f"с api_key={api_key} из БД."
+            )
+        if user_id is not None:
+            api_key_cache.set(api_key, user_id)
+        return user_id
+
+    @staticmethod
+    def invalidate_api_key(api_key: str | None = None) -> None:
+        """
+        Метод удаляет api_key из кэша аутентификации
+        (при изменении или удалении пользователя)
+        :param api_key: api_key пользователя,
+        если не передан - кэш очищается полностью
+        :return:
+        """
+        if api_key is None:
+            api_key_cache.clear()
+        else:
+            api_key_cache.delete(api_key)
+
     async def get_user_by_id(self, id: str) -> UserSchemaModel | None:
         """
         Метод получения информации о пользователе
@@ -53,44 +100,43 @@ class UserService(BaseService):
                 f"с id={id} из БД."
             )
 
-    async def get_user_full_info_by_id(self, id: int) -> UserSchema | None:
+    async def get_user_full_info_by_id(
+        self, id: int, limit: int = setting.FOLLOWERS_PAGE_LIMIT
+    ) -> dict | None:
         """
         Метод получения полной информации
-        о пользователе из БД по id
+        о пользователе из БД по id: кол-во подписчиков и читаемых
+        пользователей и первые страницы этих списков
+        (одинаковые параллельные запросы объединяются)
         :param id: id пользователя
+        :param limit: кол-во пользователей на первой странице списков
         :return: объект с полной информацией о пользователе
-        в случае успешной операции, иначе None
+        (с позициями следующих страниц списков) в случае
+        успешной операции, иначе None
         """
         try:
-            user = await self.repo.find_one_or_none(id=id)
-            if user:
-                list_user_following = []
-                for row_user_following in user.user_list_follower:
-                    list_user_following.append(
-                        {
-                            "id": row_user_following.user_following.id,
-                            "name": row_user_following.user_following.name,
-                        }
-                    )
-                list_user_follower = []
-                for row_user_follower in user.user_list_following:
-                    list_user_follower.append(
-                        {
-                            "id": row_user_follower.user_follower.id,
-                            "name": row_user_follower.user_follower.name,
-                        }
-                    )
-                return UserSchema.model_validate(
-                    {
-                        "id": user.id,
-                        "name": user.name,
-                        "followers": list_user_follower,
-                        "following": list_user_following,
-                    }
-                )
-            return None
+            # запрашиваем на одну запись больше чтобы
+            # узнать есть ли следующая страница,
+            # одинаковые параллельные запросы ждут одного запроса к БД,
+            # если он начат после последнего изменения подписок профиля
+            user = await profile_flight.run(
+                (id, limit),
+                lambda: self.repo.find_profile(id, limit + 1),
+                after=write_clock.last(("profile", id)),
+            )
         except Exception:
             raise DatabaseException(
                 message=f"Ошибка при получении данных пользователя "
                 f"с id={id} из БД."
             )
+        if user is None:
+            return None
+        # результат общий для объединенных запросов, поэтому копируем
+        user = dict(user)
+        for follow_list in UserFollowList:
+            users, next_position = get_next_page(
+                user[follow_list.value], limit
+            )
+            user[follow_list.value] = users
+            user[f"{follow_list.value}_next_position"] = next_position
+        return user
@@ -0,0 +1,31 @@
+import asyncio
+
+from config import setting
+from utils.unitofwork import UnitOfWork
+
+
+async def backfill_timelines(batch_size: int | None = None) -> int:
+    """
+    Функция заполняет материализованные ленты всех пользователей
+    (при включении TIMELINE_FANOUT_ENABLED на существующих данных).
+    Заполнение идет пачками по id пользователей, каждая пачка в своей
+    короткой транзакции, повторный запуск не создает дублей
+    :param batch_size: размер пачки
+    :return: кол-во добавленных записей
+    """
+    batch_size = batch_size or setting.TIMELINE_BACKFILL_BATCH_SIZE
+    count = 0
+    after_id = 0
+    while after_id is not None:
+        async with UnitOfWork() as uow:
+            after_id, added = await uow.timelines.backfill(
+                after_id, batch_size, setting.TIMELINE_BACKFILL_LIMIT
+            )
+            await uow.commit()
+        count += added
+    return count
+
+
+if __name__ == "__main__":
+    # запуск из папки app: python -m utils.backfill_timelines
+    print(f"Добавлено записей: {asyncio.run(backfill_timelines())}")
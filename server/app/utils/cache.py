@@ -0,0 +1,329 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from utils.metrics import metrics
+
+
+class TTLCache:
+    """
+    Кэш в памяти процесса с ограничением кол-ва записей
+    (вытесняются давно не использованные - LRU)
+    и временем жизни записей (TTL)
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str | None = None):
+        """
+        :param maxsize: максимальное кол-во записей
+        :param ttl: время жизни записи в секундах
+        :param name: префикс имен метрик кэша (None - без метрик)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = self.misses = None
+        if name is not None:
+            self.hits = metrics.counter(
+                f"{name}_hits_total", "Кол-во попаданий в кэш"
+            )
+            self.misses = metrics.counter(
+                f"{name}_misses_total", "Кол-во промахов кэша"
+            )
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Метод получения значения из кэша
+        :param key: ключ
+        :param default: значение если ключа нет в кэше или время
+        жизни записи истекло
+        :return: значение из кэша
+        """
+        item = self._data.get(key)
+        if item is not None and item[0] <= time.monotonic():
+            self._remove(key)
+            item = None
+        if item is None:
+            if self.misses is not None:
+                self.misses.inc()
+            return default
+        self._data.move_to_end(key)
+        if self.hits is not None:
+            self.hits.inc()
+        return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Метод добавления значения в кэш
+        :param key: ключ
+        :param value: значение
+        :return:
+        """
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._remove(next(iter(self._data)))
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Метод удаления значения из кэша
+        :param key: ключ
+        :return:
+        """
+        self._remove(key)
+
+    def clear(self) -> None:
+        """
+        Метод очистки кэша
+        :return:
+        """
+        self._data.clear()
+
+    def _remove(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TaggedTTLCache(TTLCache):
+    """
+    Кэш с ограничением кол-ва записей и TTL, записи которого помечаются
+    тегами, что позволяет точечно удалять все записи с данным тегом.
+    Значение, прочитанное до удаления любого из его тегов, в кэш
+    не сохраняется: чтение начинается с запоминания версии кэша
+    (version), которая передается в set
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str | None = None):
+        super().__init__(maxsize, ttl, name)
+        self._tags: dict[Hashable, set[Hashable]] = {}
+        self._key_tags: dict[Hashable, tuple[Hashable, ...]] = {}
+        # версия кэша (растет при каждом добавлении и удалении записей)
+        self.version = 0
+        # теги-кортежи по виду (первому элементу) с версией кэша, в которой
+        # тег появился в кэше, в порядке появления тегов
+        self._kinds: dict[Hashable, dict[tuple, int]] = {}
+        # версии последнего удаления тегов (не более maxsize последних
+        # тегов) и видов тегов, для более старых удалений - общая версия
+        self._invalidated: OrderedDict[Hashable, int] = OrderedDict()
+        self._kinds_invalidated: dict[Hashable, int] = {}
+        self._invalidated_floor = 0
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        tags: tuple[Hashable, ...] = (),
+        since: int | None = None,
+    ) -> None:
+        """
+        Метод добавления значения в кэш
+        :param key: ключ
+        :param value: значение
+        :param tags: теги записи
+        :param since: версия кэша на начало чтения значения (значение
+        не сохраняется, если после нее удалялся любой из тегов записи)
+        :return:
+        """
+        if since is not None and self._is_stale(tags, since):
+            return
+        self._remove(key)
+        self.version += 1
+        self._key_tags[key] = tags
+        for tag in tags:
+            if tag not in self._tags and isinstance(tag, tuple):
+                self._kinds.setdefault(tag[0], {})[tag] = self.version
+            self._tags.setdefault(tag, set()).add(key)
+        super().set(key, value)
+
+    def invalidate(self, *tags: Hashable) -> None:
+        """
+        Метод удаления из кэша всех записей с любым из тегов
+        (в т.ч. еще читаемых записей)
+        :param tags: теги
+        :return:
+        """
+        self.version += 1
+        for tag in tags:
+            self._invalidated[tag] = self.version
+            self._invalidated.move_to_end(tag)
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+        while len(self._invalidated) > self.maxsize:
+            _, self._invalidated_floor = self._invalidated.popitem(last=False)
+
+    def invalidate_kind(self, kind: Hashable, since: int = 0) -> None:
+        """
+        Метод удаления из кэша записей с тегами вида kind, появившимися
+        после версии since, и всех еще читаемых записей с тегами вида kind
+        :param kind: вид тегов
+        :param since: версия кэша
+        :return:
+        """
+        self.invalidate(*self.tags(kind, since))
+        self._kinds_invalidated[kind] = self.version
+
+    def tags(self, kind: Hashable, since: int = 0) -> list[tuple]:
+        """
+        Метод возвращает теги-кортежи вида kind (первый элемент тега)
+        записей, которые есть в кэше, без перебора всех тегов кэша
+        :param kind: вид тегов
+        :param since: версия кэша, теги появившиеся в кэше
+        до нее (включительно) не возвращаются
+        :return: список тегов
+        """
+        tags = []
+        kind_tags = self._kinds.get(kind, {})
+        # теги хранятся в порядке появления, поэтому
+        # просматриваются только появившиеся после since
+        for tag in reversed(kind_tags):
+            if kind_tags[tag] <= since:
+                break
+            tags.append(tag)
+        return tags
+
+    def clear(self) -> None:
+        """
+        Метод очистки кэша (еще читаемые записи тоже не сохраняются)
+        :return:
+        """
+        super().clear()
+        self._tags.clear()
+        self._key_tags.clear()
+        self._kinds.clear()
+        self._invalidated.clear()
+        self._kinds_invalidated.clear()
+        self.version += 1
+        self._invalidated_floor = self.version
+
+    def _is_stale(self, tags: tuple[Hashable, ...], since: int) -> bool:
+        if since < self._invalidated_floor:
+            return True
+        for tag in tags:
+            if self._invalidated.get(tag, 0) > since:
+                return True
+            if (
+                isinstance(tag, tuple)
+                and self._kinds_invalidated.get(tag[0], 0) > since
+            ):
+                return True
+        return False
+
+    def _remove(self, key: Hashable) -> None:
+        super()._remove(key)
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tags[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+                if isinstance(tag, tuple):
+                    self._kinds[tag[0]].pop(tag, None)
+
+
+class ByteLRUCache:
+    """
+    Кэш в памяти процесса с ограничением суммарного размера значений
+    в байтах (вытесняются давно не использованные - LRU), значения
+    больше max_item_size в кэш не допускаются, чтобы один большой
+    файл не вытеснял множество маленьких
+    """
+
+    def __init__(
+        self,
+        maxbytes: int,
+        max_item_size: int,
+        name: str | None = None,
+    ):
+        """
+        :param maxbytes: максимальный суммарный размер значений в байтах
+        :param max_item_size: максимальный размер одного значения в байтах
+        :param name: префикс имен метрик кэша (None - без метрик)
+        """
+        self.maxbytes = maxbytes
+        self.max_item_size = max_item_size
+        self.size = 0
+        self._data: OrderedDict[Hashable, bytes] = OrderedDict()
+        self.hits = self.misses = self.evictions = self.bytes = None
+        if name is not None:
+            self.hits = metrics.counter(
+                f"{name}_hits_total", "Кол-во попаданий в кэш"
+            )
+            self.misses = metrics.counter(
+                f"{name}_misses_total", "Кол-во промахов кэша"
+            )
+            self.evictions = metrics.counter(
+                f"{name}_evictions_total", "Кол-во вытесненных из кэша записей"
+            )
+            self.bytes = metrics.gauge(
+                f"{name}_bytes", "Суммарный размер записей кэша в байтах"
+            )
+
+    def admits(self, size: int) -> bool:
+        """
+        Метод проверяет, может ли значение такого размера попасть в кэш
+        :param size: размер значения в байтах
+        :return: True если значение допускается в кэш
+        """
+        return size <= min(self.max_item_size, self.maxbytes)
+
+    def get(self, key: Hashable) -> bytes | None:
+        """
+        Метод получения значения из кэша
+        :param key: ключ
+        :return: значение из кэша или None
+        """
+        value = self._data.get(key)
+        if value is None:
+            if self.misses is not None:
+                self.misses.inc()
+            return None
+        self._data.move_to_end(key)
+        if self.hits is not None:
+            self.hits.inc()
+        return value
+
+    def set(self, key: Hashable, value: bytes) -> None:
+        """
+        Метод добавления значения в кэш
+        :param key: ключ
+        :param value: значение
+        :return:
+        """
+        if not self.admits(len(value)):
+            return
+        self.delete(key)
+        self._data[key] = value
+        self.size += len(value)
+        while self.size > self.maxbytes:
+            _, evicted = self._data.popitem(last=False)
+            self.size -= len(evicted)
+            if self.evictions is not None:
+                self.evictions.inc()
+        self._update_bytes()
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Метод удаления значения из кэша
+        :param key: ключ
+        :return:
+        """
+        value = self._data.pop(key, None)
+        if value is not None:
+            self.size -= len(value)
+            self._update_bytes()
+
+    def clear(self) -> None:
+        """
+        Метод очистки кэша
+        :return:
+        """
+        self._data.clear()
+        self.size = 0
+        self._update_bytes()
+
+    def _update_bytes(self) -> None:
+        if self.bytes is not None:
+            self.bytes.set(self.size)
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,117 @@
+import asyncio
+import base64
+import io
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+
+from config import setting
+from PIL import Image, ImageOps
+
+
+class MediaSize(str, Enum):
+    # исходный загруженный файл
+    original = "original"
+    # миниатюра для ленты
+    thumb = "thumb"
+    # уменьшенная копия для просмотра
+    medium = "medium"
+
+
+# максимальная сторона изображения для каждого варианта
+MEDIA_VARIANTS = {
+    MediaSize.thumb: 320,
+    MediaSize.medium: 1024,
+}
+MEDIA_VARIANT_FORMAT = "webp"
+MEDIA_VARIANT_MEDIA_TYPE = "image/webp"
+
+# максимальная сторона крошечной копии изображения для заглушки
+MEDIA_PLACEHOLDER_SIZE = 16
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def probe_image(path: str) -> dict[str, any] | None:
+    """
+    Функция определяет размеры и MIME-тип изображения и создает
+    заглушку - размытую крошечную копию изображения в виде data URI,
+    которую клиент показывает пока загружается изображение
+    (выполняется в отдельном процессе)
+    :param path: путь к изображению
+    :return: словарь с метаданными изображения
+    или None если файл не является изображением
+    """
+    try:
+        with Image.open(path) as image:
+            mime_type = Image.MIME.get(image.format)
+            image = ImageOps.exif_transpose(image)
+            width, height = image.size
+            image.thumbnail((MEDIA_PLACEHOLDER_SIZE, MEDIA_PLACEHOLDER_SIZE))
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            byte_array = io.BytesIO()
+            image.save(byte_array, format=MEDIA_VARIANT_FORMAT, quality=30)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    placeholder = base64.b64encode(byte_array.getvalue()).decode()
+    return {
+        "width": width,
+        "height": height,
+        "mime_type": mime_type,
+        "placeholder": f"data:{MEDIA_VARIANT_MEDIA_TYPE};base64,{placeholder}",
+    }
+
+
+def render_variant(path: str, max_side: int) -> bytes:
+    """
+    Функция создает уменьшенную копию изображения в формате WebP
+    (выполняется в отдельном процессе)
+    :param path: путь к исходному изображению
+    :param max_side: максимальная сторона копии в пикселях
+    :return: тело копии изображения
+    """
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        byte_array = io.BytesIO()
+        image.save(byte_array, format=MEDIA_VARIANT_FORMAT, quality=80)
+        return byte_array.getvalue()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Функция возвращает пул процессов для обработки
+    изображений (создается при первом обращении)
+    :return: пул процессов
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=setting.MEDIA_VARIANTS_WORKERS
+        )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """
+    Функция останавливает пул процессов для обработки изображений
+    :return:
+    """
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+
+async def run_in_process_pool(func, *args):
+    """
+    Функция выполняет функцию в пуле процессов,
+    не блокируя цикл событий
+    :param func: функция
+    :param args: аргументы функции
+    :return: результат функции
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
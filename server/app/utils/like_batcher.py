@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from contextlib import suppress
+
+from config import setting
+from services.tweets import feed_cache, get_tweet_tags
+from utils.metrics import metrics
+from utils.unitofwork import UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+likes_batch_size = metrics.histogram(
+    "likes_batch_size",
+    "Размер пачек лайков, записываемых в БД одним запросом",
+    buckets=(1, 5, 10, 50, 100, 500, 1000),
+)
+likes_batch_errors = metrics.counter(
+    "likes_batch_errors_total",
+    "Кол-во пачек лайков, которые не удалось записать в БД",
+)
+
+
+class LikeBatcher:
+    """
+    Класс отложенной записи лайков: намерения поставить или снять лайк
+    копятся в памяти процесса и записываются в БД пачкой
+    раз в interval секунд или при накоплении max_size намерений.
+    Лайки, еще не записанные в БД, теряются при аварийной остановке
+    процесса (interval - окно потери данных)
+    """
+
+    def __init__(self, interval: float, max_size: int):
+        """
+        :param interval: максимальное время в секундах от намерения
+        до записи в БД
+        :param max_size: кол-во намерений, при котором пачка
+        записывается не дожидаясь интервала
+        """
+        self.interval = interval
+        self.max_size = max_size
+        # последнее намерение для пары (id твитта, id пользователя):
+        # True - поставить лайк, False - снять
+        self._pending: dict[tuple[int, int], bool] = {}
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def submit(self, tweet_id: int, user_id: int, liked: bool) -> None:
+        """
+        Метод ставит в очередь намерение поставить или снять лайк
+        :param tweet_id: id твитта
+        :param user_id: id пользователя
+        :param liked: True - поставить лайк, False - снять
+        :return:
+        """
+        self._pending[(tweet_id, user_id)] = liked
+        if len(self._pending) >= self.max_size:
+            self._full.set()
+
+    async def flush(self) -> int:
+        """
+        Метод записывает накопленные намерения в БД одной транзакцией,
+        при ошибке намерения остаются в очереди
+        :return: кол-во записанных намерений
+        """
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        self._full.clear()
+        # сортировка задает одинаковый порядок блокировок строк
+        # в разных процессах
+        likes = sorted(key for key, liked in pending.items() if liked)
+        unlikes = sorted(key for key, liked in pending.items() if not liked)
+        tags = get_tweet_tags(sorted({tweet_id for tweet_id, _ in pending}))
+        try:
+            async with UnitOfWork() as uow:
+                await uow.likes.apply_likes_batch(likes, unlikes)
+                uow.likes.on_commit(lambda: feed_cache.invalidate(*tags))
+                await uow.commit()
+        except BaseException:
+            # незаписанную пачку возвращаем в очередь для следующей
+            # попытки, не затирая более новые намерения для тех же пар
+            for key, liked in pending.items():
+                self._pending.setdefault(key, liked)
+            raise
+        likes_batch_size.observe(len(pending))
+        return len(pending)
+
+    async def _run(self) -> None:
+        """
+        Метод периодически записывает накопленные намерения в БД
+        :return:
+        """
+        while not self._stopping:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            try:
+                await self.flush()
+            except Exception:  # noqa
+                # любая ошибка записи пачки не должна останавливать запись
+                likes_batch_errors.inc()
+                logger.exception("Ошибка при записи пачки лайков в БД.")
+
+    def start(self) -> None:
+        """
+        Метод запускает фоновую задачу записи лайков
+        (вызывается при старте приложения)
+        :return:
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Метод останавливает фоновую задачу и записывает в БД
+        оставшиеся намерения (вызывается при остановке приложения)
+        :return:
+        """
+        if self._task is not None:
+            # задачу не отменяем, чтобы не прервать запись пачки,
+            # а просим ее завершиться после текущей записи
+            self._stopping = True
+            self._full.set()
+            await self._task
+            self._task = None
+            self._stopping = False
+        await self.flush()
+
+
+like_batcher = LikeBatcher(
+    interval=setting.LIKES_BATCH_INTERVAL,
+    max_size=setting.LIKES_BATCH_MAX_SIZE,
+)
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+
+from config import setting
+from services.medias import MediaService
+from sqlalchemy.exc import SQLAlchemyError
+from utils.images import MEDIA_VARIANTS
+from utils.metrics import metrics
+from utils.storage import AbstractMediaStorage, get_variant_key, media_storage
+from utils.unitofwork import UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+media_gc_runs = metrics.counter(
+    "media_gc_runs_total", "Кол-во запусков сборщика медиафайлов"
+)
+media_gc_deleted_medias = metrics.counter(
+    "media_gc_deleted_medias_total",
+    "Кол-во удаленных неприкрепленных к твиттам медиафайлов",
+)
+media_gc_deleted_blobs = metrics.counter(
+    "media_gc_deleted_blobs_total",
+    "Кол-во удаленных из хранилища тел медиафайлов",
+)
+media_gc_recovered_files = metrics.counter(
+    "media_gc_recovered_files_total",
+    "Кол-во перенесенных сборщиком в хранилище временных файлов",
+)
+media_gc_reclaimed_bytes = metrics.counter(
+    "media_gc_reclaimed_bytes_total",
+    "Кол-во освобожденных сборщиком медиафайлов байт",
+)
+
+
+async def collect_orphaned_media(
+    storage: AbstractMediaStorage = media_storage,
+    ttl: float | None = None,
+    batch_size: int | None = None,
+) -> int:
+    """
+    Функция удаляет медиафайлы, не прикрепленные к твиттам дольше TTL,
+    и тела медиафайлов, на которые больше никто не ссылается,
+    а также сверяет с БД временные файлы хранилища старше TTL.
+    Удаление идет пачками, каждая пачка в своей короткой транзакции,
+    заблокированные строки пропускаются, поэтому таблицы
+    не блокируются надолго
+    :param storage: хранилище медиафайлов
+    :param ttl: время в секундах, после которого неприкрепленный
+    медиафайл (или временный файл) удаляется
+    :param batch_size: размер пачки
+    :return: кол-во освобожденных байт
+    """
+    ttl = setting.MEDIA_GC_TTL if ttl is None else ttl
+    batch_size = batch_size or setting.MEDIA_GC_BATCH_SIZE
+    reclaimed_bytes = 0
+
+    # временный файл, запись о теле которого зафиксирована в БД,
+    # остается, если процесс упал между фиксацией транзакции и переносом
+    # файла: переносим его в хранилище, остальные временные файлы
+    # (недописанные или от откаченных транзакций) удаляем
+    for staged in await storage.find_stale_staged(ttl):
+        async with UnitOfWork() as uow:
+            blob = await uow.medias.find_blob(staged.key)
+        if blob is None:
+            await asyncio.to_thread(storage.discard_staged, staged)
+        else:
+            await asyncio.to_thread(storage.commit_staged, staged)
+            media_gc_recovered_files.inc()
+
+    # удаляем медиафайлы (счетчики ссылок на тела уменьшает триггер)
+    while True:
+        async with UnitOfWork() as uow:
+            medias = await uow.medias.delete_orphaned(ttl, batch_size)
+            await uow.commit()
+        # у старых медиафайлов тело хранилось в БД
+        size = sum(file_size or 0 for _, file_size in medias)
+        reclaimed_bytes += size
+        media_gc_deleted_medias.inc(len(medias))
+        MediaService.invalidate_cache([id for id, _ in medias])
+        media_gc_reclaimed_bytes.inc(size)
+        if len(medias) < batch_size:
+            break
+
+    # удаляем тела медиафайлов без ссылок вместе с их копиями,
+    # файлы удаляются до фиксации транзакции, пока строки заблокированы
+    while True:
+        async with UnitOfWork() as uow:
+            blobs = await uow.medias.delete_unreferenced_blobs(batch_size)
+            for file_key, _ in blobs:
+                await storage.delete(file_key)
+                for size in MEDIA_VARIANTS:
+                    await storage.delete(get_variant_key(file_key, size.value))
+            await uow.commit()
+        size = sum(file_size or 0 for _, file_size in blobs)
+        reclaimed_bytes += size
+        media_gc_deleted_blobs.inc(len(blobs))
+        media_gc_reclaimed_bytes.inc(size)
+        if len(blobs) < batch_size:
+            break
+
+    media_gc_runs.inc()
+    return reclaimed_bytes
+
+
+async def run_media_gc(interval: float | None = None) -> None:
+    """
+    Функция периодически запускает сборщик медиафайлов
+    (запускается фоновой задачей при старте приложения)
+    :param interval: интервал между запусками в секундах
+    :return:
+    """
+    interval = interval or setting.MEDIA_GC_INTERVAL
+    while True:
+        try:
+            await collect_orphaned_media()
+        except (SQLAlchemyError, OSError):
+            # ошибка одного запуска не должна останавливать сборщик
+            logger.exception("Ошибка при сборке неиспользуемых медиафайлов.")
+        await asyncio.sleep(interval)
@@ -0,0 +1,155 @@
+import threading
+
+
+class Metric:
+    """
+    Базовый класс метрики приложения (значение хранится в памяти
+    процесса, у каждого воркера свои значения)
+    """
+
+    type: str = "untyped"
+
+    def __init__(self, name: str, description: str):
+        """
+        :param name: имя метрики
+        :param description: описание метрики
+        """
+        self.name = name
+        self.description = description
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def render(self) -> str:
+        """
+        Метод возвращает метрику в текстовом формате Prometheus
+        :return: текст метрики
+        """
+        return (
+            f"# HELP {self.name} {self.description}\n"
+            f"# TYPE {self.name} {self.type}\n"
+            f"{self.name} {self.value}\n"
+        )
+
+
+class Counter(Metric):
+    """
+    Класс счетчика - метрики, значение которой только растет
+    """
+
+    type = "counter"
+
+    def inc(self, value: int | float = 1) -> None:
+        with self._lock:
+            self.value += value
+
+
+class Gauge(Metric):
+    """
+    Класс метрики с произвольно меняющимся значением
+    """
+
+    type = "gauge"
+
+    def set(self, value: int | float) -> None:
+        with self._lock:
+            self.value = value
+
+
+class Histogram(Metric):
+    """
+    Класс гистограммы - распределения наблюдаемых значений по корзинам
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self, name: str, description: str, buckets: tuple[float, ...]
+    ):
+        """
+        :param name: имя метрики
+        :param description: описание метрики
+        :param buckets: верхние границы корзин по возрастанию
+        """
+        super().__init__(name, description)
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+
+    def observe(self, value: int | float) -> None:
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.bucket_counts[i] += 1
+            self.count += 1
+            self.value += value
+
+    def render(self) -> str:
+        """
+        Метод возвращает метрику в текстовом формате Prometheus
+        :return: текст метрики
+        """
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.value}")
+        lines.append(f"{self.name}_count {self.count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsRegistry:
+    """
+    Класс реестра метрик приложения
+    """
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def counter(self, name: str, description: str) -> Counter:
+        """
+        Метод создает и регистрирует счетчик
+        :param name: имя метрики
+        :param description: описание метрики
+        :return: счетчик
+        """
+        return self._register(Counter(name, description))
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        """
+        Метод создает и регистрирует метрику с произвольным значением
+        :param name: имя метрики
+        :param description: описание метрики
+        :return: метрика
+        """
+        return self._register(Gauge(name, description))
+
+    def histogram(
+        self, name: str, description: str, buckets: tuple[float, ...]
+    ) -> Histogram:
+        """
+        Метод создает и регистрирует гистограмму
+        :param name: имя метрики
+        :param description: описание метрики
+        :param buckets: верхние границы корзин по возрастанию
+        :return: гистограмма
+        """
+        return self._register(Histogram(name, description, buckets))
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        Метод возвращает все метрики в текстовом формате Prometheus
+        :return: текст метрик
+        """
+        return "".join(metric.render() for metric in self.metrics.values())
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,37 @@
+import asyncio
+
+from utils.images import probe_image, run_in_process_pool
+from utils.storage import AbstractMediaStorage, media_storage
+from utils.unitofwork import UnitOfWork
+
+
+async def migrate_media_bodies(
+    storage: AbstractMediaStorage = media_storage, batch_size: int = 100
+) -> int:
+    """
+    Функция переносит тела медиафайлов из БД (BYTEA) в хранилище
+    медиафайлов пачками, каждая пачка в своей транзакции,
+    поэтому перенос можно прервать и запустить повторно
+    :param storage: хранилище медиафайлов
+    :param batch_size: размер пачки
+    :return: кол-во перенесенных медиафайлов
+    """
+    count = 0
+    while True:
+        async with UnitOfWork() as uow:
+            medias = await uow.medias.find_stored_in_db(batch_size)
+            if not medias:
+                return count
+            for id, file_body in medias:
+                file_key, file_size = await storage.save(file_body)
+                meta = await run_in_process_pool(
+                    probe_image, storage.get_path(file_key)
+                )
+                await uow.medias.move_to_storage(id, file_key, file_size, meta)
+            await uow.commit()
+            count += len(medias)
+
+
+if __name__ == "__main__":
+    # запуск из папки app: python -m utils.migrate_media
+    print(f"Перенесено медиафайлов: {asyncio.run(migrate_media_bodies())}")
@@ -0,0 +1,71 @@
+import base64
+import json
+
+from utils.exceptions import ClientHTTPException
+
+# ключи сортировки (id и счетчики) хранятся в столбцах типа integer,
+# значения вне его диапазона БД не примет
+MAX_CURSOR_VALUE = 2**31 - 1
+
+
+def encode_cursor(position: dict[str, int]) -> str:
+    """
+    Функция кодирует позицию страницы (значения ключей сортировки
+    последней записи) в непрозрачный курсор
+    :param position: словарь со значениями ключей сортировки
+    :return: строка курсора
+    """
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str | None, keys: tuple[str, ...] = ("id",)
+) -> dict[str, int]:
+    """
+    Функция декодирует курсор в позицию страницы
+    :param cursor: строка курсора
+    :param keys: ключи сортировки, которые должны быть в курсоре
+    :return: словарь со значениями ключей сортировки,
+    пустой словарь если курсор не передан
+    """
+    if not cursor:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except ValueError:
+        position = None
+    if (
+        not isinstance(position, dict)
+        or set(position) != set(keys)
+        or not all(
+            isinstance(value, int)
+            and not isinstance(value, bool)
+            and 0 <= value <= MAX_CURSOR_VALUE
+            for value in position.values()
+        )
+    ):
+        raise ClientHTTPException(
+            status_code=400, detail="Некорректный курсор пагинации."
+        )
+    return position
+
+
+def get_next_page(
+    items: list[dict], limit: int, key: str = "id"
+) -> tuple[list[dict], dict[str, int] | None]:
+    """
+    Функция обрезает страницу, запрошенную с одной лишней записью,
+    до размера страницы и вычисляет позицию следующей страницы
+    :param items: список записей (на одну больше размера страницы
+    если есть следующая страница)
+    :param limit: размер страницы
+    :param key: поле записи, по которому выбираются страницы
+    :return: пара (записи страницы, позиция следующей страницы
+    или None если страница последняя)
+    """
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, {"id": items[-1][key]}
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+
+from config import setting
+from utils.metrics import metrics
+from utils.unitofwork import UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+counters_reconcile_runs = metrics.counter(
+    "counters_reconcile_runs_total", "Кол-во запусков сверки счетчиков"
+)
+counters_repaired = metrics.counter(
+    "counters_repaired_total",
+    "Кол-во исправленных при сверке записей со счетчиками",
+)
+
+
+async def reconcile_counters(batch_size: int | None = None) -> int:
+    """
+    Функция сверяет счетчики лайков твиттов и подписок пользователей
+    с фактическим кол-вом записей и исправляет расхождения.
+    Сверка идет пачками по id, каждая пачка в своей короткой
+    транзакции, поэтому сверку можно прервать и запустить повторно
+    :param batch_size: размер пачки
+    :return: кол-во исправленных записей
+    """
+    batch_size = batch_size or setting.COUNTERS_RECONCILE_BATCH_SIZE
+    count = 0
+    for get_reconcile in (
+        lambda uow: uow.tweets.reconcile_likes_count,
+        lambda uow: uow.users.reconcile_follow_counts,
+    ):
+        after_id = 0
+        while after_id is not None:
+            async with UnitOfWork() as uow:
+                after_id, repaired = await get_reconcile(uow)(
+                    after_id, batch_size
+                )
+                await uow.commit()
+            count += repaired
+            counters_repaired.inc(repaired)
+    counters_reconcile_runs.inc()
+    return count
+
+
+async def run_reconcile_counters(interval: float | None = None) -> None:
+    """
+    Функция периодически запускает сверку счетчиков
+    (запускается фоновой задачей при старте приложения)
+    :param interval: интервал между запусками в секундах
+    :return:
+    """
+    interval = interval or setting.COUNTERS_RECONCILE_INTERVAL
+    while True:
+        try:
+            await reconcile_counters()
+        except Exception:  # noqa
+            # любая ошибка одного запуска не должна останавливать сверку
+            logger.exception("Ошибка при сверке счетчиков.")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    # запуск из папки app: python -m utils.reconcile_counters
+    print(f"Исправлено записей: {asyncio.run(reconcile_counters())}")
@@ -1,11 +1,24 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Callable, Optional
 
-from db.db import async_session_maker
 from pydantic import BaseModel
-from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy import (
+    JSON,
+    Select,
+    delete,
+    func,
+    insert,
+    literal_column,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 
+# пустой json-массив для агрегатов json_agg без строк
+EMPTY_JSON_ARRAY = literal_column("'[]'::json", type_=JSON)
+
 
 class AbstractRepository(ABC):
 
@@ -13,6 +26,10 @@ class AbstractRepository(ABC):
     async def add_one(self, data: dict):
         raise NotImplementedError
 
+    @abstractmethod
+    async def add_one_or_ignore(self, data: dict, constraint: str):
+        raise NotImplementedError
+
     @abstractmethod
     async def update_all_by_ids(self, ids: int, **kwargs):
         raise NotImplementedError
@@ -21,6 +38,10 @@ class AbstractRepository(ABC):
     async def find_all(self):
         raise NotImplementedError
 
+    @abstractmethod
+    async def find_page(self, limit: int, after_id: int | None = None):
+        raise NotImplementedError
+
     @abstractmethod
     async def find_all_by_ids(self, ids: list[int]):
         raise NotImplementedError
@@ -41,68 +62,133 @@ class AbstractRepository(ABC):
     async def count(self):
         raise NotImplementedError
 
+    @abstractmethod
+    def on_commit(self, callback: Callable[[], Awaitable[None] | None]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def on_rollback(self, callback: Callable[[], Awaitable[None] | None]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def stream(self, stmt: Select, batch_size: int):
+        raise NotImplementedError
+
 
 class SQLAlchemyRepository(AbstractRepository):
     model: Optional[DeclarativeBase] = None
 
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    def on_commit(
+        self, callback: Callable[[], Awaitable[None] | None]
+    ) -> None:
+        """
+        Метод регистрирует функцию, которая будет вызвана после
+        фиксации текущей транзакции (при откате не вызывается)
+        :param callback: функция без аргументов (может вернуть
+        awaitable, который дожидается при фиксации)
+        :return:
+        """
+        self.session.info.setdefault("on_commit", []).append(callback)
+
+    def on_rollback(
+        self, callback: Callable[[], Awaitable[None] | None]
+    ) -> None:
+        """
+        Метод регистрирует функцию, которая будет вызвана после
+        отката текущей транзакции (при фиксации не вызывается)
+        :param callback: функция без аргументов (может вернуть
+        awaitable, который дожидается при откате)
+        :return:
+        """
+        self.session.info.setdefault("on_rollback", []).append(callback)
+
+    async def stream(
+        self, stmt: Select, batch_size: int
+    ) -> AsyncIterator[dict]:
+        """
+        Метод читает результат запроса через курсор на стороне БД
+        пачками по batch_size строк, поэтому результат не загружается
+        в память целиком (сессия и транзакция заняты до конца чтения)
+        :param stmt: запрос
+        :param batch_size: кол-во строк в пачке
+        :return: асинхронный итератор объектов с данными строк
+        """
+        res = await self.session.stream(
+            stmt.execution_options(yield_per=batch_size)
+        )
+        async for row in res.mappings():
+            yield dict(row)
+
     async def add_one(self, data: dict) -> int | None:
-        async with async_session_maker() as session:
-            stmt = insert(self.model).values(**data).returning(self.model.id)
-            res = await session.execute(stmt)
-            await session.commit()
-            return res.scalar_one()
+        stmt = insert(self.model).values(**data).returning(self.model.id)
+        res = await self.session.execute(stmt)
+        return res.scalar_one()
+
+    async def add_one_or_ignore(
+        self, data: dict, constraint: str
+    ) -> int | None:
+        stmt = (
+            pg_insert(self.model)
+            .values(**data)
+            .on_conflict_do_nothing(constraint=constraint)
+            .returning(self.model.id)
+        )
+        res = await self.session.execute(stmt)
+        return res.scalar_one_or_none()
 
     async def find_all(self, **kwargs) -> list[BaseModel]:
-        async with async_session_maker() as session:
-            stmt = select(self.model).filter_by(**kwargs)
-            res = await session.execute(stmt)
-            rows = res.scalars().all()
-            return [row for row in rows]
+        stmt = select(self.model).filter_by(**kwargs)
+        res = await self.session.execute(stmt)
+        rows = res.scalars().all()
+        return [row for row in rows]
 
     async def update_all_by_ids(self, ids: int, **kwargs):
-        async with async_session_maker() as session:
-            stmt = (
-                update(self.model)
-                .filter(self.model.id.in_(ids))
-                .values(**kwargs)
-            )
-            res = await session.execute(stmt)
-            await session.commit()
-            return res.rowcount > 0
+        stmt = (
+            update(self.model).filter(self.model.id.in_(ids)).values(**kwargs)
+        )
+        res = await self.session.execute(stmt)
+        return res.rowcount > 0
+
+    async def find_page(
+        self, limit: int, after_id: int | None = None, **kwargs
+    ) -> list[BaseModel]:
+        stmt = select(self.model).filter_by(**kwargs)
+        if after_id is not None:
+            stmt = stmt.filter(self.model.id < after_id)
+        stmt = stmt.order_by(self.model.id.desc()).limit(limit)
+        res = await self.session.execute(stmt)
+        rows = res.scalars().all()
+        return [row for row in rows]
 
     async def find_all_by_ids(self, ids: list[int]) -> list[BaseModel]:
-        async with async_session_maker() as session:
-            stmt = select(self.model).filter(self.model.id.in_(ids))
-            res = await session.execute(stmt)
-            rows = res.scalars().all()
-            return [row for row in rows]
+        stmt = select(self.model).filter(self.model.id.in_(ids))
+        res = await self.session.execute(stmt)
+        rows = res.scalars().all()
+        return [row for row in rows]
 
     async def delete_all(self, **kwargs) -> bool:
-        async with async_session_maker() as session:
-            stmt = delete(self.model).filter_by(**kwargs)
-            res = await session.execute(stmt)
-            await session.commit()
-            return res.rowcount > 0
+        stmt = delete(self.model).filter_by(**kwargs)
+        res = await self.session.execute(stmt)
+        return res.rowcount > 0
 
     async def find_one_or_none(self, **kwargs) -> BaseModel | None:
         try:
-            async with async_session_maker() as session:
-                stmt = select(self.model).filter_by(**kwargs)
-                res = await session.execute(stmt)
-                row = res.scalars().one_or_none()
-                if row:
-                    return row
+            stmt = select(self.model).filter_by(**kwargs)
+            res = await self.session.execute(stmt)
+            row = res.scalars().one_or_none()
+            if row:
+                return row
         except Exception:  # noqa
             pass
 
     async def add_all(self, items: list[dict[str, any]]):
-        async with async_session_maker() as session:
-            stmt = insert(self.model).values(items)
-            await session.execute(stmt)
-            await session.commit()
+        stmt = insert(self.model).values(items)
+        await self.session.execute(stmt)
 
     async def count(self):
-        async with async_session_maker() as session:
-            stmt = select(func.count(self.model.id))
-            res = await session.execute(stmt)
-            return res.scalar_one()
+        stmt = select(func.count(self.model.id))
+        res = await self.session.execute(stmt)
+        return res.scalar_one()
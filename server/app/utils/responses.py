@@ -0,0 +1,266 @@
+import asyncio
+import os
+from typing import Any, AsyncIterator, Mapping
+
+import anyio
+import orjson
+from config import setting
+from fastapi import Response, status
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class FileRangeResponse(FileResponse):
+    """
+    Класс ответа с частью файла (206 Partial Content),
+    часть файла читается с диска по частям
+    """
+
+    def __init__(
+        self,
+        path: str,
+        start: int,
+        end: int,
+        stat_result: os.stat_result,
+        headers: Mapping[str, str] | None = None,
+        media_type: str | None = None,
+    ):
+        """
+        :param path: путь к файлу
+        :param start: первый байт части файла
+        :param end: последний байт части файла (включительно)
+        :param stat_result: информация о файле
+        :param headers: заголовки ответа
+        :param media_type: тип содержимого
+        """
+        headers = {
+            **(headers or {}),
+            "Content-Range": f"bytes {start}-{end}/{stat_result.st_size}",
+            "Content-Length": str(end - start + 1),
+        }
+        super().__init__(
+            path,
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+        )
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.end - self.start + 1
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                # файл оказался короче ожидаемого
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b""})
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Класс JSON ответа, сериализуемого orjson. Данные в нем отдаются
+    как есть, без проверки по модели ответа эндпоинта (модель ответа
+    эндпоинта по-прежнему описывает ответ в схеме OpenAPI)
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+def json_response(content: dict[str, Any]) -> FastJSONResponse | dict:
+    """
+    Функция формирует JSON ответ из уже подготовленных данных
+    (их структура должна совпадать с моделью ответа эндпоинта).
+    Если быстрая сериализация выключена, то данные возвращаются как
+    есть и FastAPI проверяет и сериализует их по модели ответа
+    :param content: данные ответа
+    :return: ответ или данные ответа
+    """
+    if setting.FAST_JSON_ENABLED:
+        return FastJSONResponse(content)
+    return content
+
+
+# описание потокового ответа для схемы OpenAPI
+NDJSON_RESPONSES = {
+    200: {
+        "content": {"application/x-ndjson": {}},
+        "description": "Потоковый ответ (stream=true): "
+        "по JSON объекту в строке",
+    }
+}
+
+
+async def iter_ndjson(items: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+    """
+    Функция сериализует объекты в строки NDJSON по мере их чтения
+    :param items: асинхронный итератор объектов
+    :return: асинхронный итератор строк
+    """
+    async for item in items:
+        yield orjson.dumps(item) + b"\n"
+
+
+def ndjson_response(items: AsyncIterator[Any]) -> StreamingResponse:
+    """
+    Функция формирует потоковый ответ NDJSON (по объекту в строке),
+    объекты отправляются клиенту по мере чтения из БД
+    :param items: асинхронный итератор объектов
+    :return: ответ
+    """
+    return StreamingResponse(
+        iter_ndjson(items), media_type="application/x-ndjson"
+    )
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Функция проверяет совпадение ETag со значением
+    заголовка запроса If-None-Match
+    :param if_none_match: значение заголовка If-None-Match
+    :param etag: ETag ресурса
+    :return: True если ресурс у клиента не изменился
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def parse_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """
+    Функция разбирает заголовок запроса Range (поддерживается
+    один диапазон байт, в остальных случаях заголовок игнорируется)
+    :param range_header: значение заголовка Range
+    :param size: размер файла в байтах
+    :return: пара (первый байт, последний байт) или None если
+    заголовок игнорируется, (-1, -1) если диапазон недостижим
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    try:
+        if not sep:
+            return None
+        # последние N байт файла
+        if not first:
+            length = int(last)
+            if length <= 0 or size == 0:
+                return -1, -1
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if end is not None and start > end:
+        return None
+    if start >= size:
+        return -1, -1
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+async def file_response(
+    path: str,
+    headers: dict[str, str],
+    media_type: str | None = None,
+    range_header: str | None = None,
+) -> Response:
+    """
+    Функция формирует ответ с файлом с диска,
+    целиком или частью по заголовку Range
+    :param path: путь к файлу
+    :param headers: заголовки ответа
+    :param media_type: тип содержимого
+    :param range_header: значение заголовка запроса Range
+    :return: ответ
+    """
+    stat_result = await asyncio.to_thread(os.stat, path)
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    byte_range = (
+        parse_range(range_header, stat_result.st_size)
+        if range_header
+        else None
+    )
+    if byte_range == (-1, -1):
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={
+                **headers,
+                "Content-Range": f"bytes */{stat_result.st_size}",
+            },
+        )
+    if byte_range is not None:
+        start, end = byte_range
+        return FileRangeResponse(
+            path,
+            start,
+            end,
+            stat_result=stat_result,
+            headers=headers,
+            media_type=media_type,
+        )
+    return FileResponse(
+        path, headers=headers, media_type=media_type, stat_result=stat_result
+    )
+
+
+def bytes_response(
+    body: bytes,
+    headers: dict[str, str],
+    media_type: str | None = None,
+    range_header: str | None = None,
+) -> Response:
+    """
+    Функция формирует ответ с телом файла из памяти,
+    целиком или частью по заголовку Range
+    :param body: тело файла
+    :param headers: заголовки ответа
+    :param media_type: тип содержимого
+    :param range_header: значение заголовка запроса Range
+    :return: ответ
+    """
+    size = len(body)
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    byte_range = parse_range(range_header, size) if range_header else None
+    if byte_range == (-1, -1):
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{size}"},
+        )
+    if byte_range is not None:
+        start, end = byte_range
+        part = body[start : end + 1]  # noqa: E203
+        return Response(
+            content=part,
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            headers={
+                **headers,
+                "Content-Range": f"bytes {start}-{end}/{size}",
+            },
+            media_type=media_type,
+        )
+    return Response(content=body, headers=headers, media_type=media_type)
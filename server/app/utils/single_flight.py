@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+from config import setting
+from utils.cache import TTLCache
+from utils.metrics import metrics
+
+
+class WriteClock:
+    """
+    Время последней зафиксированной записи по ключам (пользователь,
+    профиль и т.п.) в памяти процесса: запрос на чтение после записи
+    не присоединяется к вычислению, начатому до нее (см. SingleFlight)
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        :param maxsize: максимальное кол-во ключей
+        :param ttl: время хранения времени записи в секундах
+        (дольше вычисления не выполняются)
+        """
+        self._times = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def touch(self, *keys: Hashable) -> None:
+        """
+        Метод отмечает запись по ключам (вызывается после фиксации)
+        :param keys: ключи
+        :return:
+        """
+        now = time.monotonic()
+        for key in keys:
+            self._times.set(key, now)
+
+    def last(self, *keys: Hashable) -> float | None:
+        """
+        Метод возвращает время последней записи по любому из ключей
+        :param keys: ключи
+        :return: время записи или None если записей не было
+        """
+        times = [self._times.get(key) for key in keys]
+        return max((t for t in times if t is not None), default=None)
+
+
+write_clock = WriteClock(
+    maxsize=setting.WRITE_CLOCK_MAXSIZE, ttl=setting.WRITE_CLOCK_TTL
+)
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых параллельных запросов на чтение:
+    пока для ключа выполняется вычисление (запрос к БД), остальные
+    запросы с тем же ключом не идут в БД, а ждут и получают
+    его результат (или его исключение)
+    """
+
+    def __init__(self, name: str | None = None):
+        """
+        :param name: префикс имен метрик (None - без метрик)
+        """
+        # выполняемые вычисления и время их начала
+        self._calls: dict[Hashable, tuple[asyncio.Future, float]] = {}
+        self.leaders = self.coalesced = None
+        if name is not None:
+            self.leaders = metrics.counter(
+                f"{name}_leaders_total", "Кол-во выполненных вычислений"
+            )
+            self.coalesced = metrics.counter(
+                f"{name}_coalesced_total",
+                "Кол-во запросов, получивших результат чужого вычисления",
+            )
+
+    async def run(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]],
+        after: float | None = None,
+    ) -> Any:
+        """
+        Метод выполняет вычисление для ключа или присоединяется
+        к уже выполняемому вычислению с тем же ключом.
+        Результат общий для всех присоединившихся запросов,
+        поэтому изменять его нельзя
+        :param key: ключ вычисления
+        :param func: функция вычисления
+        :param after: время записи, которую должен увидеть запрос
+        (WriteClock): к вычислению, начатому не позже нее, запрос
+        не присоединяется и выполняет вычисление сам
+        :return: результат вычисления
+        """
+        while key in self._calls:
+            future, started = self._calls[key]
+            if after is not None and started <= after:
+                if self.leaders is not None:
+                    self.leaders.inc()
+                return await func()
+            # wait не отменяет вычисление при отмене ждущего запроса
+            # и выдает CancelledError только при отмене самого ждущего
+            await asyncio.wait((future,))
+            if future.cancelled():
+                # если отменен запрос, выполнявший вычисление,
+                # ждущие запросы повторяют попытку сами
+                continue
+            result = future.result()
+            if self.coalesced is not None:
+                self.coalesced.inc()
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        # исключение вычисления без ждущих запросов считаем полученным
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = future, time.monotonic()
+        if self.leaders is not None:
+            self.leaders.inc()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,330 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterable, AsyncIterator, NamedTuple
+
+from config import setting
+
+
+class StagedFile(NamedTuple):
+    # ключ файла (SHA-256 тела файла)
+    key: str
+    # размер файла в байтах
+    size: int
+    # путь к временному файлу до его переноса в хранилище
+    path: str
+
+
+def get_variant_key(key: str, variant: str) -> str:
+    """
+    Функция возвращает ключ производного варианта файла
+    (миниатюры и т.п.), который хранится рядом с исходным файлом
+    :param key: ключ исходного файла
+    :param variant: название варианта
+    :return: ключ варианта файла
+    """
+    return f"{key}.{variant}"
+
+
+class AbstractMediaStorage(ABC):
+
+    @abstractmethod
+    async def save(self, data: bytes) -> tuple[str, int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_stream(
+        self, chunks: AsyncIterable[bytes]
+    ) -> tuple[str, int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stage(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[StagedFile]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def commit_staged(self, staged: StagedFile) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def discard_staged(self, staged: StagedFile) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find_stale_staged(self, ttl: float) -> list[StagedFile]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_variant(self, key: str, variant: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def read(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_size(self, key: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_path(self, key: str) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_internal_uri(self, key: str) -> str | None:
+        raise NotImplementedError
+
+
+class LocalMediaStorage(AbstractMediaStorage):
+    """
+    Класс хранилища медиафайлов в локальной файловой системе,
+    файлы адресуются по содержимому (ключ - SHA-256 тела файла),
+    поэтому одинаковые файлы хранятся на диске один раз
+    """
+
+    def __init__(self, root: str, accel_redirect: str | None = None):
+        """
+        :param root: корневая папка хранилища
+        :param accel_redirect: префикс внутреннего location nginx
+        для отдачи файлов через X-Accel-Redirect (None - отдает приложение)
+        """
+        self.root = root
+        self.accel_redirect = accel_redirect
+
+    @staticmethod
+    def _get_relpath(key: str) -> str:
+        # раскладываем файлы по подпапкам, чтобы
+        # в одной папке не скапливались тысячи файлов
+        return os.path.join(key[:2], key[2:4], key)
+
+    def get_path(self, key: str) -> str:
+        """
+        Метод возвращает путь к файлу в хранилище по ключу
+        :param key: ключ файла
+        :return: путь к файлу
+        """
+        return os.path.join(self.root, self._get_relpath(key))
+
+    def get_internal_uri(self, key: str) -> str | None:
+        """
+        Метод возвращает внутренний URI nginx для отдачи
+        файла через X-Accel-Redirect
+        :param key: ключ файла
+        :return: URI или None если отдача через nginx не настроена
+        """
+        if self.accel_redirect is None:
+            return None
+        return "/".join(
+            (self.accel_redirect.rstrip("/"), key[:2], key[2:4], key)
+        )
+
+    def _commit(self, tmp_path: str, key: str) -> None:
+        path = self.get_path(key)
+        # файл с таким содержимым уже есть в хранилище
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # атомарно переименовываем дописанный временный файл,
+        # чтобы читатели никогда не увидели недописанный файл
+        os.replace(tmp_path, path)
+
+    def _create_tmp_file(self) -> tuple[int, str]:
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkstemp(dir=self.root, prefix=".tmp")
+
+    @staticmethod
+    def _write_chunk(tmp_file, file_hash, chunk: bytes) -> None:
+        file_hash.update(chunk)
+        tmp_file.write(chunk)
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    async def save(self, data: bytes) -> tuple[str, int]:
+        """
+        Метод сохраняет файл в хранилище
+        :param data: тело файла
+        :return: пара (ключ файла, размер файла в байтах)
+        """
+
+        async def chunks():
+            yield data
+
+        return await self.save_stream(chunks())
+
+    async def save_stream(
+        self, chunks: AsyncIterable[bytes]
+    ) -> tuple[str, int]:
+        """
+        Метод сохраняет файл в хранилище по частям
+        :param chunks: асинхронный итератор частей тела файла
+        :return: пара (ключ файла, размер файла в байтах)
+        """
+        async with self.stage(chunks) as staged:
+            pass
+        await asyncio.to_thread(self.commit_staged, staged)
+        return staged.key, staged.size
+
+    @asynccontextmanager
+    async def stage(
+        self, chunks: AsyncIterable[bytes]
+    ) -> AsyncIterator[StagedFile]:
+        """
+        Контекстный менеджер записывает файл по частям во временный
+        файл с подсчетом хеша (блокирующие операции с диском выполняются
+        в отдельном потоке и не блокируют цикл событий), при ошибке
+        временный файл удаляется.
+        Ключ файла известен только после записи, а переносится файл
+        в хранилище (commit_staged) или удаляется (discard_staged)
+        вызывающим кодом, например после фиксации или отката
+        транзакции с записью о файле в БД
+        :param chunks: асинхронный итератор частей тела файла
+        :return: записанный временный файл
+        """
+        fd, tmp_path = await asyncio.to_thread(self._create_tmp_file)
+        file_hash = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                async for chunk in chunks:
+                    await asyncio.to_thread(
+                        self._write_chunk, tmp_file, file_hash, chunk
+                    )
+                    size += len(chunk)
+            key = file_hash.hexdigest()
+            yield StagedFile(key=key, size=size, path=tmp_path)
+        except BaseException:
+            # при ошибке (в т.ч. превышении размера файла)
+            # недописанный временный файл удаляем
+            await asyncio.to_thread(self._unlink, tmp_path)
+            raise
+
+    def commit_staged(self, staged: StagedFile) -> None:
+        """
+        Метод переносит записанный временный файл в хранилище
+        :param staged: записанный временный файл
+        :return:
+        """
+        self._commit(staged.path, staged.key)
+
+    def discard_staged(self, staged: StagedFile) -> None:
+        """
+        Метод удаляет записанный временный файл
+        (если он еще не перенесен в хранилище)
+        :param staged: записанный временный файл
+        :return:
+        """
+        self._unlink(staged.path)
+
+    def _find_stale_staged(self, ttl: float) -> list[StagedFile]:
+        if not os.path.isdir(self.root):
+            return []
+        deadline = time.time() - ttl
+        staged = []
+        for entry in os.scandir(self.root):
+            if not entry.name.startswith(".tmp") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            if stat.st_mtime > deadline:
+                continue
+            file_hash = hashlib.sha256()
+            with open(entry.path, "rb") as tmp_file:
+                while chunk := tmp_file.read(setting.MEDIA_CHUNK_SIZE):
+                    file_hash.update(chunk)
+            staged.append(
+                StagedFile(
+                    key=file_hash.hexdigest(),
+                    size=stat.st_size,
+                    path=entry.path,
+                )
+            )
+        return staged
+
+    async def find_stale_staged(self, ttl: float) -> list[StagedFile]:
+        """
+        Метод находит временные файлы, которые не переносились
+        в хранилище и не удалялись дольше TTL (например, процесс упал
+        между фиксацией транзакции и переносом файла), и вычисляет
+        их ключи
+        :param ttl: время в секундах с последнего изменения файла
+        :return: список временных файлов
+        """
+        return await asyncio.to_thread(self._find_stale_staged, ttl)
+
+    async def save_variant(self, key: str, variant: str, data: bytes) -> None:
+        """
+        Метод сохраняет производный вариант файла (миниатюру и т.п.)
+        :param key: ключ исходного файла
+        :param variant: название варианта
+        :param data: тело варианта файла
+        :return:
+        """
+        fd, tmp_path = await asyncio.to_thread(self._create_tmp_file)
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                await asyncio.to_thread(tmp_file.write, data)
+            await asyncio.to_thread(
+                self._commit, tmp_path, get_variant_key(key, variant)
+            )
+        except BaseException:
+            await asyncio.to_thread(self._unlink, tmp_path)
+            raise
+
+    async def exists(self, key: str) -> bool:
+        """
+        Метод проверяет наличие файла в хранилище
+        :param key: ключ файла
+        :return: True если файл есть в хранилище
+        """
+        return await asyncio.to_thread(os.path.exists, self.get_path(key))
+
+    async def delete(self, key: str) -> None:
+        """
+        Метод удаляет файл из хранилища
+        :param key: ключ файла
+        :return:
+        """
+        await asyncio.to_thread(self._unlink, self.get_path(key))
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as file:
+            return file.read()
+
+    async def read(self, key: str) -> bytes:
+        """
+        Метод читает файл из хранилища целиком
+        :param key: ключ файла
+        :return: тело файла
+        """
+        return await asyncio.to_thread(self._read_file, self.get_path(key))
+
+    async def get_size(self, key: str) -> int:
+        """
+        Метод возвращает размер файла в хранилище
+        :param key: ключ файла
+        :return: размер файла в байтах
+        """
+        return await asyncio.to_thread(os.path.getsize, self.get_path(key))
+
+
+media_storage = LocalMediaStorage(
+    root=setting.MEDIA_ROOT, accel_redirect=setting.MEDIA_ACCEL_REDIRECT
+)
@@ -0,0 +1,87 @@
+import inspect
+from abc import ABC, abstractmethod
+
+from db.db import async_session_maker
+from repositories.followers import FollowerRepository
+from repositories.likes import LikeRepository
+from repositories.medias import MediaRepository
+from repositories.timelines import TimelineRepository
+from repositories.tweets import TweetRepository
+from repositories.users import UserRepository
+
+
+class IUnitOfWork(ABC):
+    users: UserRepository
+    tweets: TweetRepository
+    medias: MediaRepository
+    likes: LikeRepository
+    followers: FollowerRepository
+    timelines: TimelineRepository
+
+    @abstractmethod
+    def __init__(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def __aenter__(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def __aexit__(self, *args):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def commit(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def rollback(self):
+        raise NotImplementedError
+
+
+class UnitOfWork(IUnitOfWork):
+    """
+    Единица работы с БД: одна сессия (и одна транзакция) БД,
+    общая для всех репозиториев.
+    При выходе из контекста незафиксированные изменения откатываются
+    """
+
+    def __init__(self):
+        self.session_factory = async_session_maker
+
+    async def __aenter__(self):
+        self.session = self.session_factory()
+
+        self.users = UserRepository(self.session)
+        self.tweets = TweetRepository(self.session)
+        self.medias = MediaRepository(self.session)
+        self.likes = LikeRepository(self.session)
+        self.followers = FollowerRepository(self.session)
+        self.timelines = TimelineRepository(self.session)
+
+        return self
+
+    async def __aexit__(self, *args):
+        await self.rollback()
+        await self.session.close()
+
+    async def commit(self):
+        await self.session.commit()
+        # функции, зарегистрированные репозиториями до фиксации
+        self.session.info.pop("on_rollback", None)
+        await self._run_callbacks(self.session.info.pop("on_commit", []))
+
+    async def rollback(self):
+        await self.session.rollback()
+        self.session.info.pop("on_commit", None)
+        # функции, зарегистрированные репозиториями до отката
+        await self._run_callbacks(self.session.info.pop("on_rollback", []))
+
+    @staticmethod
+    async def _run_callbacks(callbacks: list) -> None:
+        for callback in callbacks:
+            result = callback()
+            # асинхронные функции (например, блокирующие операции
+            # с диском в отдельном потоке) дожидаемся
+            if inspect.isawaitable(result):
+                await result
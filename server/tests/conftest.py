@@ -1,12 +1,12 @@
 import asyncio
 import os
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Generator
 
 import pytest
 from config import setting
 from fastapi.testclient import TestClient
 from httpx import ASGITransport, AsyncClient
-from sqlalchemy import func, insert, select, text
+from sqlalchemy import event, func, insert, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 os.environ["ENV"] = "test"  # noqa
@@ -16,6 +16,10 @@ from models.likes import Like  # noqa
 from models.medias import Media  # noqa
 from models.tweets import Tweet  # noqa
 from models.users import User  # noqa
+from services.medias import MediaService  # noqa
+from services.tweets import TweetService  # noqa
+from services.users import UserService  # noqa
+from utils.storage import media_storage  # noqa
 
 from app.main import app  # noqa
 from app.models.base import metadata  # noqa
@@ -60,6 +64,21 @@ async def async_db():
             await session.execute(stmt)
             await session.commit()
 
+    UserService.invalidate_api_key()
+    MediaService.invalidate_cache()
+    TweetService.invalidate_cache()
+
+
+@pytest.fixture(autouse=True, scope="function")
+def media_root(tmp_path, monkeypatch) -> str:
+    """
+    Фикстура подменяет корневую папку хранилища
+    медиафайлов на временную папку теста
+    :return: путь к корневой папке хранилища
+    """
+    monkeypatch.setattr(media_storage, "root", str(tmp_path))
+    return str(tmp_path)
+
 
 async def add_items_table_db(
     session: AsyncSession, model: Base, items: list[dict[str, any]]
@@ -125,7 +144,11 @@ async def gen_medias_db(async_db: AsyncSession):
     for i in range(3):
         stmt = (
             insert(Media)
-            .values(file_name=f"img_{i}", file_body=mock_image(rand_image))
+            .values(
+                file_name=f"img_{i}",
+                file_body=mock_image(rand_image),
+                user_id=1,
+            )
             .returning(Media)
         )
         res = await async_db.execute(stmt)
@@ -134,6 +157,45 @@ async def gen_medias_db(async_db: AsyncSession):
     return medias
 
 
+@pytest.fixture
+def sql_statements() -> Generator[list[str], None, None]:
+    """
+    Фикстура собирает тексты всех SQL-запросов, выполненных к БД
+    за время теста
+    :return: список текстов SQL-запросов
+    """
+    statements = []
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        statements.append(statement)
+
+    event.listen(
+        engine.sync_engine, "before_cursor_execute", before_cursor_execute
+    )
+    yield statements
+    event.remove(
+        engine.sync_engine, "before_cursor_execute", before_cursor_execute
+    )
+
+
+@pytest.fixture
+def pool_checkouts() -> Generator[list[int], None, None]:
+    """
+    Фикстура собирает все выдачи соединений из пула БД за время теста
+    :return: список id выданных соединений
+    """
+    checkouts = []
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checkouts.append(id(dbapi_connection))
+
+    event.listen(engine.sync_engine, "checkout", on_checkout)
+    yield checkouts
+    event.remove(engine.sync_engine, "checkout", on_checkout)
+
+
 async def get_last_row_id_db(session: AsyncSession, model: Base) -> int | None:
     stmt = select(model).order_by(model.id.desc()).limit(1)
     result = await session.execute(stmt)
@@ -1,8 +1,23 @@
+import hashlib
+import io
+import os
+
 import pytest
+from config import setting
+from fastapi import UploadFile
 from httpx import AsyncClient
+from models.media_blobs import MediaBlob
 from models.medias import Media
+from models.tweets import Tweet
+from PIL import Image
+from services.medias import MediaService, media_body_cache
+from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.fake_data import mock_image, rand_image, static_image
+from utils.media_gc import collect_orphaned_media, media_gc_deleted_medias
+from utils.migrate_media import migrate_media_bodies
+from utils.storage import media_storage
+from utils.unitofwork import UnitOfWork
 
 from tests.conftest import get_count_row_db
 
@@ -195,3 +210,513 @@ async def test_get_files_from_tweet_by_id(
 
     if type_response == "bytes":
         assert response.content == expected_response
+
+
+@pytest.mark.parametrize("accel_redirect", [None, "/protected_media"])
+async def test_media_storage(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    media_root: str,
+    monkeypatch: pytest.MonkeyPatch,
+    accel_redirect: str | None,
+):
+    """
+    Тест проверки хранения загруженного медиафайла в хранилище
+    (вне БД) и его отдачи приложением или через nginx
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param media_root: фикстура с корневой папкой хранилища медиафайлов
+    :param monkeypatch: фикстура для подмены атрибутов
+    :param accel_redirect: префикс внутреннего location nginx
+    :return:
+    """
+    monkeypatch.setattr(media_storage, "accel_redirect", accel_redirect)
+    image = mock_image(rand_image)
+    file_key = hashlib.sha256(image).hexdigest()
+
+    response = await ac.post("/medias", files={"file": image})
+    assert response.status_code == 200
+    media_id = response.json()["media_id"]
+
+    media = (
+        await async_db.execute(select(Media).filter_by(id=media_id))
+    ).scalar_one()
+    assert media.file_key == file_key
+    with open(
+        os.path.join(media_root, file_key[:2], file_key[2:4], file_key), "rb"
+    ) as f:
+        assert f.read() == image
+
+    response = await ac.get(f"/medias/{media_id}")
+    assert response.status_code == 200
+    if accel_redirect is None:
+        assert response.content == image
+    else:
+        assert response.content == b""
+        assert response.headers["X-Accel-Redirect"] == (
+            f"{accel_redirect}/{file_key[:2]}/{file_key[2:4]}/{file_key}"
+        )
+
+
+async def test_migrate_media_bodies(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+):
+    """
+    Тест проверки переноса тел медиафайлов из БД в хранилище
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :return:
+    """
+    assert await migrate_media_bodies(batch_size=2) == 3
+    assert await migrate_media_bodies() == 0
+
+    res = await async_db.execute(select(Media.file_key, Media.file_body))
+    assert all(
+        file_key is not None and file_body is None
+        for file_key, file_body in res.all()
+    )
+
+    response = await ac.get("/medias/3")
+    assert response.status_code == 200
+    assert response.content == mock_image(static_image)
+
+
+@pytest.mark.parametrize(
+    "file_body",
+    [mock_image(static_image), b"0" * 100 * 1024],
+)
+async def test_load_files_too_large(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    media_root: str,
+    monkeypatch: pytest.MonkeyPatch,
+    file_body: bytes,
+):
+    """
+    Тест проверки отклонения медиафайла больше максимально
+    допустимого размера (по заголовку запроса и при чтении файла)
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param media_root: фикстура с корневой папкой хранилища медиафайлов
+    :param monkeypatch: фикстура для подмены атрибутов
+    :param file_body: тело медиафайла
+    :return:
+    """
+    monkeypatch.setattr(setting, "MEDIA_MAX_SIZE", 10)
+
+    response = await ac.post("/medias", files={"file": file_body})
+
+    assert response.status_code == 413
+    assert response.json() == {
+        "result": False,
+        "error_type": "ClientHTTPException",
+        "error_message": "Размер медиафайла превышает 10 байт.",
+    }
+    assert await get_count_row_db(async_db, Media) == 3
+    assert not os.listdir(media_root)
+
+
+@pytest.mark.parametrize("commit", [True, False])
+async def test_add_media_transaction(
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    media_root: str,
+    commit: bool,
+):
+    """
+    Тест проверки переноса тела медиафайла в хранилище только после
+    фиксации транзакции (при откате файл в хранилище не остается)
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param media_root: фикстура с корневой папкой хранилища медиафайлов
+    :param commit: фиксировать ли транзакцию
+    :return:
+    """
+    file_body = mock_image(rand_image)
+    file_key = hashlib.sha256(file_body).hexdigest()
+
+    async with UnitOfWork() as uow:
+        await MediaService(uow.medias).add_media(
+            UploadFile(io.BytesIO(file_body), filename="image.png")
+        )
+        assert not os.path.exists(media_storage.get_path(file_key))
+        if commit:
+            await uow.commit()
+
+    assert os.path.exists(media_storage.get_path(file_key)) is commit
+    assert await get_count_row_db(async_db, Media) == 3 + commit
+    if not commit:
+        assert not os.listdir(media_root)
+
+
+async def test_media_deduplication(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    media_root: str,
+):
+    """
+    Тест проверки того, что одинаковые медиафайлы хранятся один раз,
+    а счетчик ссылок на тело медиафайла учитывает все медиафайлы
+    (в т.ч. удаленные каскадно вместе с твиттом)
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param media_root: фикстура с корневой папкой хранилища медиафайлов
+    :return:
+    """
+    image = mock_image(rand_image)
+    file_key = hashlib.sha256(image).hexdigest()
+
+    media_ids = []
+    for _ in range(2):
+        response = await ac.post("/medias", files={"file": image})
+        assert response.status_code == 200
+        media_ids.append(response.json()["media_id"])
+    assert media_ids == [4, 5]
+
+    blob = (
+        await async_db.execute(select(MediaBlob).filter_by(key=file_key))
+    ).scalar_one()
+    assert (blob.size, blob.ref_count) == (len(image), 2)
+    # рядом с исходным файлом хранятся его варианты (миниатюры),
+    # ключ варианта - ключ исходного файла с суффиксом через точку
+    names = os.listdir(os.path.join(media_root, file_key[:2], file_key[2:4]))
+    assert [name for name in names if "." not in name] == [file_key]
+
+    for media_id in media_ids:
+        response = await ac.get(f"/medias/{media_id}")
+        assert response.content == image
+
+    await async_db.execute(
+        update(Media).where(Media.id == 4).values(tweet_id=1)
+    )
+    await async_db.execute(delete(Tweet).where(Tweet.id == 1))
+    await async_db.commit()
+    await async_db.refresh(blob)
+    assert blob.ref_count == 1
+
+
+FILE_BODY = b"0123456789"
+FILE_ETAG = f'"{hashlib.sha256(FILE_BODY).hexdigest()}"'
+
+params_test_media_http_cache = [
+    ({}, 200, FILE_BODY, None),
+    ({"If-None-Match": FILE_ETAG}, 304, b"", None),
+    ({"If-None-Match": '"other"'}, 200, FILE_BODY, None),
+    ({"Range": "bytes=2-4"}, 206, b"234", "bytes 2-4/10"),
+    ({"Range": "bytes=-3"}, 206, b"789", "bytes 7-9/10"),
+    ({"Range": "bytes=20-"}, 416, b"", "bytes */10"),
+    ({"Range": "bytes=2-4", "If-Range": FILE_ETAG}, 206, b"234", None),
+    ({"Range": "bytes=2-4", "If-Range": '"other"'}, 200, FILE_BODY, None),
+]
+
+
+@pytest.mark.parametrize(
+    "endpoint_headers, expected_status_code, expected_content, "
+    "expected_content_range",
+    params_test_media_http_cache,
+)
+async def test_media_http_cache(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    endpoint_headers: dict[str, str],
+    expected_status_code: int,
+    expected_content: bytes,
+    expected_content_range: str | None,
+):
+    """
+    Тест проверки заголовков кеширования (ETag, Cache-Control),
+    ответа 304 и отдачи диапазонов байт медиафайла
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param endpoint_headers: заголовки запроса
+    :param expected_status_code: ожидаемый статус выполнения запроса
+    :param expected_content: ожидаемое тело ответа
+    :param expected_content_range: ожидаемый заголовок Content-Range
+    :return:
+    """
+    response = await ac.post(
+        "/medias", files={"file": ("image.png", FILE_BODY)}
+    )
+    media_id = response.json()["media_id"]
+
+    response = await ac.get(f"/medias/{media_id}", headers=endpoint_headers)
+
+    assert response.status_code == expected_status_code
+    assert response.content == expected_content
+    if expected_status_code != 416:
+        assert response.headers["ETag"] == FILE_ETAG
+        assert "immutable" in response.headers["Cache-Control"]
+        assert "Last-Modified" in response.headers
+    if expected_content_range is not None:
+        assert response.headers["Content-Range"] == expected_content_range
+
+
+params_test_media_cache = [
+    (1024, True),
+    (4, False),
+]
+
+
+@pytest.mark.parametrize(
+    "max_item_size, expected_cached",
+    params_test_media_cache,
+)
+async def test_media_cache(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+    max_item_size: int,
+    expected_cached: bool,
+):
+    """
+    Тест проверки отдачи небольших медиафайлов из кэша в памяти
+    и счетчиков попаданий и промахов кэша
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура подмены атрибутов
+    :param max_item_size: максимальный размер файла в кэше
+    :param expected_cached: ожидается ли что файл попадет в кэш
+    :return:
+    """
+    monkeypatch.setattr(media_body_cache, "max_item_size", max_item_size)
+    response = await ac.post(
+        "/medias", files={"file": ("image.png", FILE_BODY)}
+    )
+    media_id = response.json()["media_id"]
+    file_key = hashlib.sha256(FILE_BODY).hexdigest()
+    hits = media_body_cache.hits.value
+    misses = media_body_cache.misses.value
+
+    response = await ac.get(f"/medias/{media_id}")
+    assert response.content == FILE_BODY
+    assert (file_key in media_body_cache._data) == expected_cached
+
+    # после удаления файла с диска он отдается только из кэша
+    await media_storage.delete(file_key)
+    response = await ac.get(f"/medias/{media_id}")
+    if expected_cached:
+        assert response.status_code == 200
+        assert response.content == FILE_BODY
+        assert media_body_cache.hits.value == hits + 1
+    else:
+        assert response.status_code == 404
+    assert media_body_cache.misses.value == misses + 2 - expected_cached
+
+    response = await ac.get("/metrics")
+    assert "media_cache_hits_total" in response.text
+    assert "media_cache_evictions_total" in response.text
+
+
+async def test_media_cache_tweet_deleted(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+):
+    """
+    Тест проверки удаления из кэша данных медиафайлов твитта,
+    удаленных каскадно вместе с твиттом
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :return:
+    """
+    response = await ac.post(
+        "/medias", files={"file": ("image.png", FILE_BODY)}
+    )
+    media_id = response.json()["media_id"]
+    response = await ac.post(
+        "/tweets",
+        json={"tweet_data": "Тест", "tweet_media_ids": [media_id]},
+    )
+    tweet_id = response.json()["tweet_id"]
+    response = await ac.get(f"/medias/{media_id}")
+    assert response.status_code == 200
+
+    response = await ac.delete(f"/tweets/{tweet_id}")
+    assert response.json() == {"result": True}
+
+    response = await ac.get(f"/medias/{media_id}")
+    assert response.status_code == 404
+
+
+params_test_media_variants = [
+    ("original", "image/png", (900, 600)),
+    ("thumb", "image/webp", (320, 213)),
+    ("medium", "image/webp", (900, 600)),
+]
+
+
+@pytest.mark.parametrize(
+    "size, expected_media_type, expected_image_size",
+    params_test_media_variants,
+)
+async def test_media_variants(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    size: str,
+    expected_media_type: str,
+    expected_image_size: tuple[int, int],
+):
+    """
+    Тест проверки отдачи уменьшенных копий изображения,
+    созданных в фоне после загрузки
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param size: размер медиафайла в параметрах запроса
+    :param expected_media_type: ожидаемый тип содержимого
+    :param expected_image_size: ожидаемый размер изображения
+    :return:
+    """
+    image = mock_image({"mode": "RGB", "size": (900, 600), "color": "red"})
+    response = await ac.post("/medias", files={"file": ("img.png", image)})
+    media_id = response.json()["media_id"]
+
+    response = await ac.get(f"/medias/{media_id}", params={"size": size})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == expected_media_type
+    with Image.open(io.BytesIO(response.content)) as variant:
+        assert variant.size == expected_image_size
+
+
+async def test_media_meta_in_tweets(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+):
+    """
+    Тест проверки вычисления метаданных изображения при загрузке
+    и их выдачи вместе с медиафайлами твитта в ленте
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :return:
+    """
+    image = mock_image({"mode": "RGB", "size": (900, 600), "color": "red"})
+    response = await ac.post("/medias", files={"file": ("img.png", image)})
+    media_id = response.json()["media_id"]
+    response = await ac.post(
+        "/tweets", json={"tweet_data": "Тест", "tweet_media_ids": [media_id]}
+    )
+    tweet_id = response.json()["tweet_id"]
+
+    response = await ac.get("/tweets")
+
+    tweet = next(
+        tweet for tweet in response.json()["tweets"] if tweet["id"] == tweet_id
+    )
+    assert tweet["attachments"] == [f"/api/medias/{media_id}"]
+    (meta,) = tweet["attachments_meta"]
+    assert meta["url"] == f"/api/medias/{media_id}"
+    assert meta["thumb_url"] == f"/api/medias/{media_id}?size=thumb"
+    assert (meta["width"], meta["height"]) == (900, 600)
+    assert meta["mime_type"] == "image/png"
+    assert meta["placeholder"].startswith("data:image/webp;base64,")
+
+
+async def test_collect_orphaned_media(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    media_root: str,
+):
+    """
+    Тест проверки удаления сборщиком медиафайлов, не прикрепленных
+    к твиттам, вместе с телами медиафайлов в хранилище
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param media_root: фикстура с корневой папкой хранилища медиафайлов
+    :return:
+    """
+    images = [mock_image(rand_image), b"orphan"]
+    media_ids = []
+    for image in images:
+        response = await ac.post("/medias", files={"file": image})
+        media_ids.append(response.json()["media_id"])
+    await ac.post(
+        "/tweets",
+        json={"tweet_data": "Тест", "tweet_media_ids": media_ids[:1]},
+    )
+    deleted_medias = media_gc_deleted_medias.value
+
+    # неприкрепленный медиафайл еще не устарел
+    assert await collect_orphaned_media(ttl=3600) == 0
+    assert await get_count_row_db(async_db, Media) == 5
+
+    assert await collect_orphaned_media(ttl=0, batch_size=1) == len(b"orphan")
+    assert media_gc_deleted_medias.value == deleted_medias + 1
+    assert await get_count_row_db(async_db, Media) == 4
+    assert await get_count_row_db(async_db, MediaBlob) == 1
+    orphan_key = hashlib.sha256(b"orphan").hexdigest()
+    assert not os.path.exists(media_storage.get_path(orphan_key))
+    assert os.path.exists(
+        media_storage.get_path(hashlib.sha256(images[0]).hexdigest())
+    )
+
+    response = await ac.get("/metrics")
+    assert "media_gc_reclaimed_bytes_total" in response.text
+
+
+async def test_collect_orphaned_media_staged(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    media_root: str,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Тест проверки сверки сборщиком временных файлов хранилища:
+    файл, перенос которого прервался после фиксации транзакции,
+    переносится в хранилище, остальные временные файлы удаляются
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param media_root: фикстура с корневой папкой хранилища медиафайлов
+    :param monkeypatch: фикстура подмены переноса файла в хранилище
+    :return:
+    """
+    file_body = mock_image(rand_image)
+    file_key = hashlib.sha256(file_body).hexdigest()
+    # процесс "упал" между фиксацией транзакции и переносом файла
+    with monkeypatch.context() as m:
+        m.setattr(media_storage, "commit_staged", lambda staged: None)
+        response = await ac.post("/medias", files={"file": file_body})
+    await ac.post(
+        "/tweets",
+        json={
+            "tweet_data": "Тест",
+            "tweet_media_ids": [response.json()["media_id"]],
+        },
+    )
+    with open(os.path.join(media_root, ".tmpstray"), "wb") as tmp_file:
+        tmp_file.write(b"stray")
+    assert not os.path.exists(media_storage.get_path(file_key))
+
+    # временные файлы еще не устарели
+    await collect_orphaned_media(ttl=3600)
+    assert len(os.listdir(media_root)) == 2
+
+    await collect_orphaned_media(ttl=0)
+    assert os.path.exists(media_storage.get_path(file_key))
+    assert not [
+        name for name in os.listdir(media_root) if name.startswith(".tmp")
+    ]
+    response = await ac.get(f"/medias/{response.json()['media_id']}")
+    assert response.status_code == 200
+    assert response.content == file_body
@@ -1,9 +1,25 @@
+import json
+
 import pytest
+from config import setting
 from httpx import AsyncClient
 from models.likes import Like
 from models.medias import Media
+from models.timelines import Timeline
 from models.tweets import Tweet
+from models.users import User
+from repositories.likes import LikeRepository
+from repositories.tweets import TweetRepository
+from schemas.tweets import TweetFeedMode, TweetSchemaAddModel
+from services.tweets import TweetService, feed_cache
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
+from utils.backfill_timelines import backfill_timelines
+from utils.like_batcher import like_batcher, likes_batch_size
+from utils.pagination import encode_cursor
+from utils.reconcile_counters import reconcile_counters
+from utils.unitofwork import UnitOfWork
 
 from tests.conftest import (
     check_is_set_tweet_id_medias_db,
@@ -131,6 +147,113 @@ async def test_create_tweet(
     assert response.json() == expected_response
 
 
+async def test_create_tweet_attaches_own_medias(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    gen_medias_db: list[Media],
+    sql_statements: list[str],
+):
+    """
+    Тест проверки того, что твитт создается вместе с прикреплением
+    медиафайлов одним запросом к БД, а прикрепляются только
+    медиафайлы автора твитта, еще не прикрепленные к другим твиттам
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param gen_medias_db: фикстура создает в БД записи медиафайлов твитта
+    :param sql_statements: фикстура со списком выполненных SQL-запросов
+    :return:
+    """
+    own_id, foreign_id, attached_id = [media.id for media in gen_medias_db]
+    await async_db.execute(
+        update(Media).where(Media.id == foreign_id).values(user_id=3)
+    )
+    await async_db.execute(
+        update(Media).where(Media.id == attached_id).values(tweet_id=1)
+    )
+    await async_db.commit()
+    sql_statements.clear()
+
+    response = await ac.post(
+        "/tweets",
+        json={
+            "tweet_data": "Тест",
+            "tweet_media_ids": [own_id, foreign_id, attached_id],
+        },
+    )
+
+    assert response.status_code == 201
+    assert (
+        len(
+            [
+                statement
+                for statement in sql_statements
+                if "medias" in statement
+            ]
+        )
+        == 1
+    )
+    tweet_id = response.json()["tweet_id"]
+    assert await check_is_set_tweet_id_medias_db(async_db, [own_id], tweet_id)
+    assert await check_is_set_tweet_id_medias_db(async_db, [foreign_id], None)
+    assert await check_is_set_tweet_id_medias_db(async_db, [attached_id], 1)
+
+
+async def test_create_tweet_attaches_legacy_medias(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    gen_medias_db: list[Media],
+):
+    """
+    Тест проверки прикрепления к твитту медиафайла, загруженного
+    до появления владельца медиафайлов: автор твитта становится
+    его владельцем
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param gen_medias_db: фикстура создает в БД записи медиафайлов твитта
+    :return:
+    """
+    legacy_id = gen_medias_db[0].id
+    await async_db.execute(
+        update(Media).where(Media.id == legacy_id).values(user_id=None)
+    )
+    await async_db.commit()
+
+    response = await ac.post(
+        "/tweets",
+        json={"tweet_data": "Тест", "tweet_media_ids": [legacy_id]},
+    )
+
+    assert response.status_code == 201
+    tweet_id = response.json()["tweet_id"]
+    assert await check_is_set_tweet_id_medias_db(
+        async_db, [legacy_id], tweet_id
+    )
+    assert await check_row_table_db(async_db, Media, id=legacy_id, user_id=1)
+
+
+def attachment_meta(media_id: int) -> dict[str, any]:
+    """
+    Функция возвращает ожидаемые метаданные медиафайла твитта
+    (у медиафайлов фикстуры тела хранятся в БД, метаданных нет)
+    :param media_id: id медиафайла
+    :return: словарь с метаданными медиафайла
+    """
+    return {
+        "url": f"/api/medias/{media_id}",
+        "thumb_url": f"/api/medias/{media_id}?size=thumb",
+        "width": None,
+        "height": None,
+        "mime_type": None,
+        "placeholder": None,
+    }
+
+
 params_test_get_tweets = [
     (
         None,
@@ -138,48 +261,58 @@ params_test_get_tweets = [
             "result": True,
             "tweets": [
                 {
-                    "id": 1,
+                    "id": 6,
                     "content": "Hello",
                     "attachments": [],
-                    "author": {"id": 2, "name": "Danil Baybakov"},
-                    "likes": [],
+                    "attachments_meta": [],
+                    "author": {"id": 4, "name": "Sergey Sergeev"},
+                    "likes": [{"user_id": 3, "name": "Egor Egorov"}],
                 },
                 {
-                    "id": 2,
-                    "content": "Hello",
-                    "attachments": [],
+                    "id": 5,
+                    "content": "Test2",
+                    "attachments": ["/api/medias/3"],
+                    "attachments_meta": [attachment_meta(3)],
                     "author": {"id": 3, "name": "Egor Egorov"},
                     "likes": [],
                 },
-                {
-                    "id": 3,
-                    "content": "Hello",
-                    "attachments": [],
-                    "author": {"id": 4, "name": "Sergey Sergeev"},
-                    "likes": [],
-                },
                 {
                     "id": 4,
                     "content": "Test",
                     "attachments": ["/api/medias/1", "/api/medias/2"],
+                    "attachments_meta": [
+                        attachment_meta(1),
+                        attachment_meta(2),
+                    ],
                     "author": {"id": 2, "name": "Danil Baybakov"},
                     "likes": [{"user_id": 3, "name": "Egor Egorov"}],
                 },
                 {
-                    "id": 5,
-                    "content": "Test2",
-                    "attachments": ["/api/medias/3"],
+                    "id": 3,
+                    "content": "Hello",
+                    "attachments": [],
+                    "attachments_meta": [],
+                    "author": {"id": 4, "name": "Sergey Sergeev"},
+                    "likes": [],
+                },
+                {
+                    "id": 2,
+                    "content": "Hello",
+                    "attachments": [],
+                    "attachments_meta": [],
                     "author": {"id": 3, "name": "Egor Egorov"},
                     "likes": [],
                 },
                 {
-                    "id": 6,
+                    "id": 1,
                     "content": "Hello",
                     "attachments": [],
-                    "author": {"id": 4, "name": "Sergey Sergeev"},
-                    "likes": [{"user_id": 3, "name": "Egor Egorov"}],
+                    "attachments_meta": [],
+                    "author": {"id": 2, "name": "Danil Baybakov"},
+                    "likes": [],
                 },
             ],
+            "next_cursor": None,
         },
         200,
     ),
@@ -226,6 +359,724 @@ async def test_get_tweets(
     assert response.json() == expected_response
 
 
+async def test_get_tweets_fast_json(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Тест проверки быстрой сериализации ленты твиттов: ответ совпадает
+    с ответом, проверенным по модели, а схема OpenAPI не меняется
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура подмены атрибутов
+    :return:
+    """
+    responses = []
+    for fast_json_enabled in (True, False):
+        monkeypatch.setattr(setting, "FAST_JSON_ENABLED", fast_json_enabled)
+        for mode in TweetFeedMode:
+            response = await ac.get(
+                "/tweets", params={"mode": mode.value, "limit": 4}
+            )
+            assert response.status_code == 200
+            responses.append(response.json())
+    pages = len(TweetFeedMode)
+    assert responses[:pages] == responses[pages:]
+
+    response = await ac.get(
+        f"http://{setting.HOST}:{setting.PORT}/openapi.json"
+    )
+    schema = response.json()["paths"][f"{setting.BASE_URI}/tweets"]["get"]
+    assert schema["responses"]["200"]["content"]["application/json"][
+        "schema"
+    ] == {"$ref": "#/components/schemas/TweetSchemaResponse"}
+
+
+params_test_get_tweets_stream = [
+    ("all", None, [6, 5, 4, 3, 2, 1]),
+    ("all", 2, [4, 3, 2, 1]),
+    ("popular", None, [5, 2]),
+    ("timeline", 1, [5, 3, 2]),
+]
+
+
+@pytest.mark.parametrize(
+    "mode, first_page_limit, expected_ids",
+    params_test_get_tweets_stream,
+)
+async def test_get_tweets_stream(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    mode: str,
+    first_page_limit: int | None,
+    expected_ids: list[int],
+):
+    """
+    Тест проверки потоковой выдачи ленты твиттов в формате NDJSON
+    (целиком или начиная с позиции курсора)
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param mode: режим ленты
+    :param first_page_limit: размер первой страницы, с курсора которой
+    начинается поток (None - поток с начала ленты)
+    :param expected_ids: ожидаемый список id твиттов в потоке
+    :return:
+    """
+    headers = {"api-key": "sergey"}
+    params = {"mode": mode}
+    if first_page_limit is not None:
+        response = await ac.get(
+            "/tweets",
+            params={**params, "limit": first_page_limit},
+            headers=headers,
+        )
+        params["cursor"] = response.json()["next_cursor"]
+
+    response = await ac.get(
+        "/tweets", params={**params, "stream": True}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    tweets = [json.loads(line) for line in response.text.splitlines()]
+    assert [tweet["id"] for tweet in tweets] == expected_ids
+
+    # твитты в потоке совпадают с твиттами страницы ленты
+    response = await ac.get(
+        "/tweets", params={**params, "limit": 100}, headers=headers
+    )
+    assert tweets == response.json()["tweets"]
+
+
+async def test_get_tweets_compact(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Тест проверки компактного режима ленты: вместо полного списка
+    лайкнувших пользователей выводятся кол-во лайков, признак лайка
+    текущего пользователя и первые лайкнувшие пользователи
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура подмены атрибутов
+    :return:
+    """
+    monkeypatch.setattr(setting, "TWEET_LIKES_PREVIEW_LIMIT", 1)
+    await ac.post("/tweets/4/likes", headers={"api-key": "test"})
+
+    async def get_likes(api_key: str) -> dict[int, tuple]:
+        response = await ac.get(
+            "/tweets", params={"compact": True}, headers={"api-key": api_key}
+        )
+        assert response.status_code == 200
+        return {
+            tweet["id"]: (
+                tweet["likes_count"],
+                tweet["liked_by_me"],
+                [user["user_id"] for user in tweet["likes"]],
+            )
+            for tweet in response.json()["tweets"]
+        }
+
+    assert await get_likes("egor") == {
+        6: (1, True, [3]),
+        5: (0, False, []),
+        4: (2, True, [1]),
+        3: (0, False, []),
+        2: (0, False, []),
+        1: (0, False, []),
+    }
+    assert (await get_likes("sergey"))[4] == (2, False, [1])
+
+    # в полном режиме полей компактного режима нет
+    response = await ac.get("/tweets")
+    assert "likes_count" not in response.json()["tweets"][0]
+
+
+params_test_get_likes_by_tweet_id = [
+    (4, 20, [[1, 3, 4]]),
+    (4, 2, [[1, 3], [4]]),
+    (1, 20, [[]]),
+]
+
+
+@pytest.mark.parametrize(
+    "tweet_id, limit, expected_pages",
+    params_test_get_likes_by_tweet_id,
+)
+async def test_get_likes_by_tweet_id(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    tweet_id: int,
+    limit: int,
+    expected_pages: list[list[int]],
+):
+    """
+    Тест проверки постраничного получения списка
+    лайкнувших твитт пользователей
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param tweet_id: id твитта
+    :param limit: кол-во пользователей на странице
+    :param expected_pages: ожидаемые id пользователей по страницам
+    :return:
+    """
+    await ac.post("/tweets/4/likes", headers={"api-key": "test"})
+    await ac.post("/tweets/4/likes", headers={"api-key": "sergey"})
+
+    pages = []
+    params = {"limit": limit}
+    while True:
+        response = await ac.get(f"/tweets/{tweet_id}/likes", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        pages.append([user["user_id"] for user in data["likes"]])
+        if data["next_cursor"] is None:
+            break
+        params["cursor"] = data["next_cursor"]
+
+    assert pages == expected_pages
+
+    response = await ac.get("/tweets/10/likes")
+    assert response.status_code == 404
+
+
+async def test_get_likes_by_tweet_id_unauthorized(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+):
+    """
+    Тест проверки запрета получения списка лайкнувших твитт
+    пользователей без авторизации
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :return:
+    """
+    response = await ac.get(
+        "/tweets/4/likes", headers={"api-key": "unauthorized_user"}
+    )
+
+    assert response.status_code == 401
+    assert response.json() == {
+        "result": False,
+        "error_type": "ClientHTTPException",
+        "error_message": "Не авторизированный пользователь.",
+    }
+
+
+params_test_get_tweets_pages = [
+    (4, [[6, 5, 4, 3], [2, 1]]),
+    (6, [[6, 5, 4, 3, 2, 1]]),
+    (2, [[6, 5], [4, 3], [2, 1]]),
+]
+
+
+@pytest.mark.parametrize(
+    "limit, expected_pages_ids",
+    params_test_get_tweets_pages,
+)
+async def test_get_tweets_pages(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    limit: int,
+    expected_pages_ids: list[list[int]],
+):
+    """
+    Тест проверки постраничного получения списка твиттов по курсору
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param limit: кол-во твиттов на странице
+    :param expected_pages_ids: ожидаемые списки id твиттов по страницам
+    :return:
+    """
+    pages_ids = []
+    params = {"limit": limit}
+    while True:
+        response = await ac.get("/tweets", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        pages_ids.append([tweet["id"] for tweet in data["tweets"]])
+        if data["next_cursor"] is None:
+            break
+        params = {"limit": limit, "cursor": data["next_cursor"]}
+
+    assert pages_ids == expected_pages_ids
+
+
+params_test_get_tweets_popular = [
+    ({"api-key": "egor"}, 10, [[4, 1]]),
+    ({"api-key": "egor"}, 1, [[4], [1]]),
+    ({"api-key": "danil"}, 10, [[5, 2]]),
+    (None, 10, [[]]),
+]
+
+
+@pytest.mark.parametrize(
+    "endpoint_headers, limit, expected_pages_ids",
+    params_test_get_tweets_popular,
+)
+async def test_get_tweets_popular(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    endpoint_headers: dict[str, any] | None,
+    limit: int,
+    expected_pages_ids: list[list[int]],
+):
+    """
+    Тест проверки ленты твиттов читаемых пользователей,
+    отсортированной по убыванию кол-ва лайков
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param endpoint_headers: заголовок запроса
+    :param limit: кол-во твиттов на странице
+    :param expected_pages_ids: ожидаемые списки id твиттов по страницам
+    :return:
+    """
+    pages_ids = []
+    params = {"mode": "popular", "limit": limit}
+    while True:
+        response = await ac.get(
+            "/tweets", params=params, headers=endpoint_headers
+        )
+        assert response.status_code == 200
+        data = response.json()
+        pages_ids.append([tweet["id"] for tweet in data["tweets"]])
+        if data["next_cursor"] is None:
+            break
+        params = {**params, "cursor": data["next_cursor"]}
+
+    assert pages_ids == expected_pages_ids
+
+
+params_test_get_tweets_timeline = [
+    (False, 10, [7, 5, 4, 2, 1], 0),
+    (True, 10, [7, 5, 4, 2, 1], 14),
+    (True, 0, [7, 5, 4, 2, 1], 13),
+]
+
+
+@pytest.mark.parametrize(
+    "fan_out_enabled, fan_out_max_followers, expected_ids, "
+    "expected_count_timelines_db",
+    params_test_get_tweets_timeline,
+)
+async def test_get_tweets_timeline(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+    fan_out_enabled: bool,
+    fan_out_max_followers: int,
+    expected_ids: list[int],
+    expected_count_timelines_db: int,
+):
+    """
+    Тест проверки хронологической ленты пользователя
+    (материализованной при записи и собираемой при чтении).
+    Материализованные ленты заполняются для существующих твиттов
+    командой backfill_timelines
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура изменения настроек приложения
+    :param fan_out_enabled: флаг включения материализованных лент
+    :param fan_out_max_followers: максимальное кол-во подписчиков
+    автора, твитты которого рассылаются в ленты при записи
+    :param expected_ids: ожидаемый список id твиттов в ленте
+    :param expected_count_timelines_db: ожидаемое кол-во записей
+    в таблице лент БД после создания твитта
+    :return:
+    """
+    monkeypatch.setattr(setting, "TIMELINE_FANOUT_ENABLED", fan_out_enabled)
+    monkeypatch.setattr(
+        setting, "TIMELINE_FANOUT_MAX_FOLLOWERS", fan_out_max_followers
+    )
+    if fan_out_enabled:
+        added = await backfill_timelines(batch_size=3)
+        # повторный запуск не добавляет дублей
+        assert await backfill_timelines() == 0
+        assert added == await get_count_row_db(async_db, Timeline)
+
+    response = await ac.post(
+        "/tweets",
+        json={"tweet_data": "Тест", "tweet_media_ids": []},
+        headers={"api-key": "danil"},
+    )
+    assert response.status_code == 201
+
+    assert (
+        await get_count_row_db(async_db, Timeline)
+        == expected_count_timelines_db
+    )
+
+    response = await ac.get(
+        "/tweets", params={"mode": "timeline"}, headers={"api-key": "egor"}
+    )
+    assert response.status_code == 200
+    assert [tweet["id"] for tweet in response.json()["tweets"]] == (
+        expected_ids
+    )
+
+
+async def test_get_tweets_timeline_fan_out_threshold(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Тест проверки материализованной ленты при переходе кол-ва
+    подписчиков автора через порог рассылки: твитт, опубликованный
+    без рассылки, остается в ленте подписчиков, а при подписке на
+    автора в ленту добавляются его разосланные твитты
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура изменения настроек приложения
+    :return:
+    """
+
+    async def get_timeline(api_key: str) -> list[int]:
+        response = await ac.get(
+            "/tweets",
+            params={"mode": "timeline"},
+            headers={"api-key": api_key},
+        )
+        assert response.status_code == 200
+        return [tweet["id"] for tweet in response.json()["tweets"]]
+
+    monkeypatch.setattr(setting, "TIMELINE_FANOUT_ENABLED", True)
+    await backfill_timelines()
+
+    # автор выше порога: твитт 7 не рассылается
+    monkeypatch.setattr(setting, "TIMELINE_FANOUT_MAX_FOLLOWERS", 0)
+    response = await ac.post(
+        "/tweets",
+        json={"tweet_data": "Тест", "tweet_media_ids": []},
+        headers={"api-key": "danil"},
+    )
+    assert response.status_code == 201
+
+    # автор ниже порога: твитт 8 рассылается, твитт 7 остается в ленте
+    monkeypatch.setattr(setting, "TIMELINE_FANOUT_MAX_FOLLOWERS", 10)
+    response = await ac.post(
+        "/tweets",
+        json={"tweet_data": "Тест", "tweet_media_ids": []},
+        headers={"api-key": "danil"},
+    )
+    assert response.status_code == 201
+    assert await get_timeline("egor") == [8, 7, 5, 4, 2, 1]
+
+    # новый подписчик получает и разосланные, и неразосланные твитты
+    response = await ac.post("/users/2/follow", headers={"api-key": "sergey"})
+    assert response.status_code == 200
+    assert await get_timeline("sergey") == [8, 7, 6, 5, 4, 3, 2, 1]
+
+
+async def test_feed_cache(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+):
+    """
+    Тест проверки кэша страниц лент: повторное чтение страницы берется
+    из кэша, а лайки, подписки и новые твитты сбрасывают страницы,
+    которые они меняют
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :return:
+    """
+
+    async def get_feed(mode: str, api_key: str = "test") -> list[dict]:
+        response = await ac.get(
+            "/tweets", params={"mode": mode}, headers={"api-key": api_key}
+        )
+        assert response.status_code == 200
+        return response.json()["tweets"]
+
+    tweets = await get_feed("all")
+    hits = feed_cache.hits.value
+    assert await get_feed("all") == tweets
+    assert feed_cache.hits.value == hits + 1
+
+    # лайк меняет страницы с твиттом и порядок популярных твиттов
+    assert [tweet["id"] for tweet in await get_feed("popular", "danil")] == (
+        [5, 2]
+    )
+    await ac.post("/tweets/2/likes", headers={"api-key": "test"})
+    tweets = await get_feed("all")
+    assert [user["user_id"] for user in tweets[-2]["likes"]] == [1]
+    assert [tweet["id"] for tweet in await get_feed("popular", "danil")] == (
+        [2, 5]
+    )
+
+    # новый твитт попадает в общую ленту и ленту подписчиков автора
+    assert [tweet["id"] for tweet in await get_feed("timeline", "danil")] == (
+        [5, 4, 2, 1]
+    )
+    response = await ac.post(
+        "/tweets",
+        json={"tweet_data": "Тест", "tweet_media_ids": []},
+        headers={"api-key": "egor"},
+    )
+    tweet_id = response.json()["tweet_id"]
+    assert (await get_feed("all"))[0]["id"] == tweet_id
+    assert (await get_feed("timeline", "danil"))[0]["id"] == tweet_id
+
+    # подписка меняет ленту подписчика
+    assert await get_feed("timeline") == []
+    await ac.post("/users/2/follow", headers={"api-key": "test"})
+    assert [tweet["id"] for tweet in await get_feed("timeline")] == [4, 1]
+
+
+async def test_feed_cache_concurrent_write(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Тест проверки того, что страница ленты, прочитанная до фиксации
+    параллельного изменения (лайка), не сохраняется в кэш
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура подмены атрибутов
+    :return:
+    """
+    find_feed = TweetRepository.find_feed
+
+    async def find_feed_with_like(self, *args, **kwargs):
+        tweets = await find_feed(self, *args, **kwargs)
+        # лайк фиксируется, пока страница читается из БД
+        monkeypatch.setattr(TweetRepository, "find_feed", find_feed)
+        await ac.post("/tweets/2/likes", headers={"api-key": "test"})
+        return tweets
+
+    async def get_tweet_2_likes() -> list[int]:
+        response = await ac.get("/tweets")
+        assert response.status_code == 200
+        tweet = response.json()["tweets"][-2]
+        assert tweet["id"] == 2
+        return [user["user_id"] for user in tweet["likes"]]
+
+    monkeypatch.setattr(TweetRepository, "find_feed", find_feed_with_like)
+
+    assert await get_tweet_2_likes() == []
+    assert await get_tweet_2_likes() == [1]
+
+
+async def test_feed_cache_uncommitted_tweet(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+):
+    """
+    Тест проверки сброса страниц лент, попавших в кэш после добавления
+    твитта, но до фиксации транзакции (страница прочитана без твитта)
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :return:
+    """
+
+    async def get_feed_ids() -> list[int]:
+        response = await ac.get(
+            "/tweets",
+            params={"mode": "timeline"},
+            headers={"api-key": "danil"},
+        )
+        assert response.status_code == 200
+        return [tweet["id"] for tweet in response.json()["tweets"]]
+
+    async with UnitOfWork() as uow:
+        tweet_id = await TweetService(uow.tweets).add_tweet(
+            TweetSchemaAddModel(content="Тест", user_id=3)
+        )
+        # лента подписчика автора попадает в кэш без нового твитта
+        assert tweet_id not in await get_feed_ids()
+        await uow.commit()
+
+    assert (await get_feed_ids())[0] == tweet_id
+
+
+params_test_get_tweets_invalid_params = [
+    (
+        {"cursor": "test"},
+        {
+            "result": False,
+            "error_type": "ClientHTTPException",
+            "error_message": "Некорректный курсор пагинации.",
+        },
+        400,
+    ),
+    (
+        {"cursor": encode_cursor({"id": 2**63})},
+        {
+            "result": False,
+            "error_type": "ClientHTTPException",
+            "error_message": "Некорректный курсор пагинации.",
+        },
+        400,
+    ),
+    (
+        {"cursor": encode_cursor({"id": -1})},
+        {
+            "result": False,
+            "error_type": "ClientHTTPException",
+            "error_message": "Некорректный курсор пагинации.",
+        },
+        400,
+    ),
+    (
+        {"limit": 0},
+        {
+            "result": False,
+            "error_type": "RequestValidationError",
+            "error_message": [
+                {
+                    "type": "greater_than",
+                    "loc": ["query", "limit"],
+                    "msg": "Input should be greater than 0",
+                    "input": "0",
+                    "ctx": {"gt": 0},
+                }
+            ],
+        },
+        422,
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "params, expected_response, expected_status_code",
+    params_test_get_tweets_invalid_params,
+)
+async def test_get_tweets_invalid_params(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    params: dict[str, any],
+    expected_response: dict[str, any],
+    expected_status_code: int,
+):
+    """
+    Тест проверки эндпоинта получения списка твиттов
+    с некорректными параметрами пагинации
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param params: параметры запроса
+    :param expected_status_code: ожидаемый статус выполнения запроса
+    :param expected_response: ожидаемый ответ запроса
+    :return:
+    """
+    response = await ac.get("/tweets", params=params)
+
+    assert response.status_code == expected_status_code
+
+    assert response.json() == expected_response
+
+
+async def test_tweets_not_load_media_body(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    sql_statements: list[str],
+):
+    """
+    Тест проверки того, что операции с твиттами не загружают
+    из БД тела медиафайлов (загружает только скачивание медиафайла)
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param sql_statements: фикстура со списком выполненных SQL-запросов
+    :return:
+    """
+    sql_statements.clear()
+
+    response = await ac.get("/tweets")
+    assert response.status_code == 200
+    response = await ac.post("/tweets/4/likes")
+    assert response.status_code == 200
+    response = await ac.delete("/tweets/4/likes")
+    assert response.status_code == 200
+    response = await ac.delete("/tweets/4", headers={"api-key": "danil"})
+    assert response.status_code == 200
+
+    assert sql_statements
+    assert not any("file_body" in statement for statement in sql_statements)
+
+    response = await ac.get("/medias/3")
+    assert response.status_code == 200
+    assert any("file_body" in statement for statement in sql_statements)
+
+
+@pytest.mark.parametrize("mode", list(TweetFeedMode))
+async def test_get_tweets_one_statement(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    sql_statements: list[str],
+    mode: TweetFeedMode,
+):
+    """
+    Тест проверки того, что страница ленты собирается в БД одним
+    запросом, без отдельных запросов медиафайлов, авторов и лайков
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param sql_statements: фикстура со списком выполненных SQL-запросов
+    :param mode: режим ленты
+    :return:
+    """
+    # аутентификация кэшируется, поэтому прогреваем ее заранее
+    response = await ac.get("/users/me", headers={"api-key": "egor"})
+    assert response.status_code == 200
+    sql_statements.clear()
+
+    response = await ac.get(
+        "/tweets",
+        params={"mode": mode.value, "limit": 6},
+        headers={"api-key": "egor"},
+    )
+    assert response.status_code == 200
+    assert response.json()["tweets"]
+
+    selects = [
+        statement
+        for statement in sql_statements
+        if statement.lstrip().upper().startswith("SELECT")
+    ]
+    assert len(selects) == 1
+    assert "json_agg" in selects[0]
+    # отдельные загрузки связей (selectin) выбирают строки по списку id
+    assert not any(
+        loader in " ".join(statement.split())
+        for statement in sql_statements
+        for loader in (
+            "medias.tweet_id IN",
+            "likes.tweet_id IN",
+            "users.id IN",
+        )
+    )
+
+
 params_test_delete_tweet_by_id = [
     (
         4,
@@ -529,6 +1380,65 @@ async def test_like_tweet_by_id(
     assert response.json() == expected_response
 
 
+async def test_like_tweet_by_id_one_connection(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    pool_checkouts: list[int],
+):
+    """
+    Тест проверки того, что все запросы к БД эндпоинта добавления
+    лайка выполняются в одной сессии (одно соединение из пула)
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param pool_checkouts: фикстура со списком выдач соединений из пула
+    :return:
+    """
+    pool_checkouts.clear()
+
+    response = await ac.post("/tweets/1/likes")
+
+    assert response.status_code == 200
+    assert len(pool_checkouts) == 1
+    assert await check_row_table_db(async_db, Like, tweet_id=1, user_id=1)
+
+
+@pytest.mark.parametrize("method", ["post", "delete"])
+async def test_like_tweet_by_id_one_statement(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    sql_statements: list[str],
+    method: str,
+):
+    """
+    Тест проверки того, что добавление/удаление лайка вместе с проверкой
+    существования твитта выполняется одним запросом к БД
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param sql_statements: фикстура со списком выполненных SQL-запросов
+    :param method: HTTP-метод запроса
+    :return:
+    """
+    sql_statements.clear()
+
+    response = await ac.request(method, "/tweets/4/likes")
+
+    assert response.status_code == 200
+    assert (
+        len(
+            [
+                statement
+                for statement in sql_statements
+                if "tweets" in statement
+            ]
+        )
+        == 1
+    )
+
+
 params_test_unlike_tweet_by_id = [
     (
         4,
@@ -676,3 +1586,125 @@ async def test_unlike_tweet_by_id(
     assert response.status_code == expected_status_code
 
     assert response.json() == expected_response
+
+
+async def test_likes_count(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+):
+    """
+    Тест проверки счетчиков лайков твиттов и подписок пользователей:
+    счетчики меняются вместе с лайками, а сверка исправляет расхождения
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :return:
+    """
+
+    async def get_likes_count(tweet_id: int) -> int:
+        res = await async_db.execute(
+            select(Tweet.likes_count).where(Tweet.id == tweet_id)
+        )
+        return res.scalar_one()
+
+    assert await get_likes_count(4) == 1
+    await ac.post("/tweets/4/likes", headers={"api-key": "test"})
+    assert await get_likes_count(4) == 2
+    await ac.delete("/tweets/4/likes", headers={"api-key": "egor"})
+    assert await get_likes_count(4) == 1
+
+    # портим счетчики и проверяем что сверка их исправляет
+    await async_db.execute(update(Tweet).values(likes_count=10))
+    await async_db.execute(
+        update(User).where(User.id == 3).values(followers_count=0)
+    )
+    await async_db.commit()
+
+    assert await reconcile_counters(batch_size=2) == 7
+    assert [await get_likes_count(tweet_id) for tweet_id in range(1, 7)] == [
+        0,
+        0,
+        0,
+        1,
+        0,
+        1,
+    ]
+    res = await async_db.execute(
+        select(User.followers_count, User.following_count).where(User.id == 3)
+    )
+    assert res.one() == (2, 1)
+
+
+async def test_like_tweet_batched(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Тест проверки отложенной записи лайков пачками: лайки попадают
+    в БД только при записи пачки, повторные намерения схлопываются
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура подмены атрибутов
+    :return:
+    """
+    monkeypatch.setattr(setting, "LIKES_BATCH_ENABLED", True)
+    batches = likes_batch_size.count
+
+    response = await ac.post("/tweets/1/likes", headers={"api-key": "test"})
+    assert response.json() == {"result": True}
+    await ac.post("/tweets/2/likes", headers={"api-key": "test"})
+    await ac.delete("/tweets/2/likes", headers={"api-key": "test"})
+    await ac.delete("/tweets/4/likes", headers={"api-key": "egor"})
+    response = await ac.post("/tweets/10/likes", headers={"api-key": "test"})
+    assert response.status_code == 404
+
+    # до записи пачки лайки в БД не меняются
+    assert await get_count_row_db(async_db, Like) == 2
+
+    assert await like_batcher.flush() == 3
+    assert likes_batch_size.count == batches + 1
+    assert await check_row_table_db(async_db, Like, tweet_id=1, user_id=1)
+    assert not await check_row_table_db(async_db, Like, tweet_id=2, user_id=1)
+    assert not await check_row_table_db(async_db, Like, tweet_id=4, user_id=3)
+
+
+async def test_like_tweet_batch_error(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Тест проверки возврата пачки лайков в очередь при ошибке записи:
+    пачка записывается следующей попыткой, а более новые намерения
+    для тех же пар не затираются
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура подмены атрибутов
+    :return:
+    """
+    monkeypatch.setattr(setting, "LIKES_BATCH_ENABLED", True)
+
+    async def apply_likes_batch(*args):
+        raise SQLAlchemyError
+
+    await ac.post("/tweets/1/likes", headers={"api-key": "test"})
+    await ac.post("/tweets/2/likes", headers={"api-key": "test"})
+    with monkeypatch.context() as m:
+        m.setattr(LikeRepository, "apply_likes_batch", apply_likes_batch)
+        with pytest.raises(SQLAlchemyError):
+            await like_batcher.flush()
+    await ac.delete("/tweets/2/likes", headers={"api-key": "test"})
+
+    assert await get_count_row_db(async_db, Like) == 2
+    assert await like_batcher.flush() == 2
+    assert await check_row_table_db(async_db, Like, tweet_id=1, user_id=1)
+    assert not await check_row_table_db(async_db, Like, tweet_id=2, user_id=1)
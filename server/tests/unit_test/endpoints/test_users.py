@@ -1,6 +1,11 @@
+import asyncio
+import json
+
 import pytest
 from httpx import AsyncClient
 from models.followers import Follower
+from repositories.users import UserRepository
+from services.users import profile_flight
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from tests.conftest import check_row_table_db, get_count_row_db
@@ -15,6 +20,10 @@ user_data = {
             {"id": 4, "name": "Sergey Sergeev"},
         ],
         "following": [{"id": 2, "name": "Danil Baybakov"}],
+        "followers_count": 2,
+        "following_count": 1,
+        "followers_next_cursor": None,
+        "following_next_cursor": None,
     },
 }
 
@@ -113,6 +122,217 @@ async def test_get_info_about_profile(
     assert response.json() == expected_response
 
 
+async def test_get_info_about_profile_coalesced(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Тест проверки объединения одинаковых параллельных запросов
+    профиля пользователя в один запрос к БД
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура подмены атрибутов
+    :return:
+    """
+    find_profile = UserRepository.find_profile
+    calls = 0
+
+    async def slow_find_profile(self, *args, **kwargs):
+        nonlocal calls
+        calls += 1
+        # замедляем запрос к БД чтобы остальные запросы успели прийти
+        await asyncio.sleep(0.1)
+        return await find_profile(self, *args, **kwargs)
+
+    monkeypatch.setattr(UserRepository, "find_profile", slow_find_profile)
+    coalesced = profile_flight.coalesced.value
+
+    responses = await asyncio.gather(*(ac.get("/users/3") for _ in range(5)))
+
+    assert [response.json() for response in responses] == [user_data] * 5
+    assert calls == 1
+    assert profile_flight.coalesced.value == coalesced + 4
+    assert len(profile_flight) == 0
+
+
+async def test_get_info_about_profile_after_write(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """
+    Тест проверки того, что запрос профиля после подписки
+    не присоединяется к запросу профиля, начатому до подписки
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param monkeypatch: фикстура подмены атрибутов
+    :return:
+    """
+    find_profile = UserRepository.find_profile
+    read = asyncio.Event()
+
+    async def slow_find_profile(self, *args, **kwargs):
+        user = await find_profile(self, *args, **kwargs)
+        read.set()
+        # замедляем ответ чтобы запрос после подписки успел прийти
+        await asyncio.sleep(0.1)
+        return user
+
+    def get_follower_ids(response) -> list[int]:
+        assert response.status_code == 200
+        return [user["id"] for user in response.json()["user"]["followers"]]
+
+    monkeypatch.setattr(UserRepository, "find_profile", slow_find_profile)
+
+    before = asyncio.create_task(ac.get("/users/3"))
+    await read.wait()
+    response = await ac.post("/users/3/follow", headers={"api-key": "test"})
+    assert response.status_code == 200
+    after = await ac.get("/users/3")
+
+    assert 1 not in get_follower_ids(await before)
+    assert 1 in get_follower_ids(after)
+
+
+async def test_auth_api_key_cache(
+    ac: AsyncClient,
+    async_db: AsyncSession,
+    prepare_gen_full_tables_db: None,
+    sql_statements: list[str],
+):
+    """
+    Тест проверки кэширования аутентификации по api_key:
+    повторные запросы пользователя не обращаются к БД за его id
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param async_db: фикстура cессии БД
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param sql_statements: фикстура со списком выполненных SQL-запросов
+    :return:
+    """
+    sql_statements.clear()
+
+    for _ in range(3):
+        response = await ac.get("/users/me", headers={"api-key": "egor"})
+        assert response.status_code == 200
+        assert response.json() == user_data
+
+    auth_statements = [
+        statement
+        for statement in sql_statements
+        if "WHERE users.api_key" in statement
+    ]
+    assert len(auth_statements) == 1
+    assert "followers" not in auth_statements[0]
+
+
+params_test_get_follow_list = [
+    ("followers", 3, 20, [[2, 4]]),
+    ("followers", 3, 1, [[2], [4]]),
+    ("following", 3, 20, [[2]]),
+    ("following", 1, 20, [[]]),
+]
+
+
+@pytest.mark.parametrize(
+    "follow_list, user_id, limit, expected_pages",
+    params_test_get_follow_list,
+)
+async def test_get_follow_list(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    follow_list: str,
+    user_id: int,
+    limit: int,
+    expected_pages: list[list[int]],
+):
+    """
+    Тест проверки постраничного получения списков
+    подписчиков и читаемых пользователей
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param follow_list: список подписчиков или читаемых пользователей
+    :param user_id: id пользователя
+    :param limit: кол-во пользователей на странице
+    :param expected_pages: ожидаемые id пользователей по страницам
+    :return:
+    """
+    pages = []
+    params = {"limit": limit}
+    while True:
+        response = await ac.get(
+            f"/users/{user_id}/{follow_list}", params=params
+        )
+        assert response.status_code == 200
+        data = response.json()
+        pages.append([user["id"] for user in data["users"]])
+        if data["next_cursor"] is None:
+            break
+        params["cursor"] = data["next_cursor"]
+
+    assert pages == expected_pages
+
+
+@pytest.mark.parametrize(
+    "follow_list, user_id, limit, expected_pages",
+    params_test_get_follow_list,
+)
+async def test_get_follow_list_stream(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    follow_list: str,
+    user_id: int,
+    limit: int,
+    expected_pages: list[list[int]],
+):
+    """
+    Тест проверки потоковой выдачи списков подписчиков и читаемых
+    пользователей в формате NDJSON (список целиком, limit не учитывается)
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param follow_list: список подписчиков или читаемых пользователей
+    :param user_id: id пользователя
+    :param limit: кол-во пользователей на странице
+    :param expected_pages: ожидаемые id пользователей по страницам
+    :return:
+    """
+    response = await ac.get(
+        f"/users/{user_id}/{follow_list}",
+        params={"limit": limit, "stream": True},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert [user["id"] for user in users] == sum(expected_pages, [])
+    assert all(set(user) == {"id", "name"} for user in users)
+
+    response = await ac.get(f"/users/5/{follow_list}", params={"stream": True})
+    assert response.status_code == 404
+
+
+async def test_get_follow_list_not_found(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+):
+    """
+    Тест проверки получения списка подписчиков
+    несуществующего пользователя
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :return:
+    """
+    response = await ac.get("/users/5/followers")
+
+    assert response.status_code == 404
+    assert response.json()["error_message"] == "Пользователь с id=5 не найден."
+
+
 params_test_follow_user_by_id = [
     (
         2,
@@ -269,6 +489,40 @@ async def test_follow_user_by_id(
     assert response.json() == expected_response
 
 
+@pytest.mark.parametrize("method", ["post", "delete"])
+async def test_follow_user_by_id_one_statement(
+    ac: AsyncClient,
+    prepare_gen_full_tables_db: None,
+    sql_statements: list[str],
+    method: str,
+):
+    """
+    Тест проверки того, что добавление/удаление подписки вместе с проверкой
+    существования пользователя выполняется одним запросом к БД
+    :param ac: фикстура асинхронного тестового клиента приложения
+    :param prepare_gen_full_tables_db: фикстура добавляет в БД фейковые
+    записи для всех таблиц
+    :param sql_statements: фикстура со списком выполненных SQL-запросов
+    :param method: HTTP-метод запроса
+    :return:
+    """
+    sql_statements.clear()
+
+    response = await ac.request(method, "/users/2/follow")
+
+    assert response.status_code == 200
+    assert (
+        len(
+            [
+                statement
+                for statement in sql_statements
+                if "followers" in statement
+            ]
+        )
+        == 1
+    )
+
+
 params_test_unfollow_user_by_id = [
     (
         3,